@@ -16,7 +16,6 @@ Exposed via CLI: `autodebug audio` (see cli.py).
 This module interacts directly with the SQLite DB schema managed by LineReportStore.
 """
 
-import json
 import os
 import queue
 import select
@@ -30,7 +29,7 @@ from dataclasses import dataclass
 from datetime import datetime, timezone
 from typing import Any, Dict, Iterable, List, Optional
 
-from .common import extract_function_context, summarize_delta
+from .common import decode_scopes, extract_function_context, next_state, session_db_path, summarize_delta
 from .db import DEFAULT_DB_PATH, LineReportStore
 from .nested_explorer import NestedValueExplorer, format_nested_value_summary
 from .syntax_to_speech import syntax_to_speech_code, syntax_to_speech_value
@@ -181,7 +180,7 @@ def iter_line_reports(conn: sqlite3.Connection, session_id: str) -> Iterable[Dic
     cur = conn.cursor()
     cur.execute(
         """
-        SELECT id, file, line_number, code, timestamp, variables, variables_delta, status, error_message, error_type
+        SELECT id, file, line_number, code, timestamp, variables, variables_delta, status, error_message, error_type, variables_codec, state_encoding
         FROM line_reports
         WHERE session_id=?
         ORDER BY id ASC
@@ -189,16 +188,20 @@ def iter_line_reports(conn: sqlite3.Connection, session_id: str) -> Iterable[Dic
         (session_id,),
     )
     columns = [d[0] for d in cur.description]
+    state: Optional[Dict[str, Any]] = None
     for row in cur.fetchall():
         rec = dict(zip(columns, row))
         try:
-            rec["variables"] = json.loads(rec.get("variables") or "{}")
+            rec["variables_delta"] = decode_scopes(rec.get("variables_delta"), rec.get("variables_codec"), conn)
         except Exception:
-            rec["variables"] = {}
+            rec["variables_delta"] = {}
+        # Rows stored as patches (--keyframe-interval) apply to the previous row's state
         try:
-            rec["variables_delta"] = json.loads(rec.get("variables_delta") or "{}")
+            variables = decode_scopes(rec.get("variables"), rec.get("variables_codec"), conn)
+            state = next_state(state, variables, rec["variables_delta"], rec.get("state_encoding"))
+            rec["variables"] = state
         except Exception:
-            rec["variables_delta"] = {}
+            rec["variables"] = {}
         yield rec
 
 
@@ -643,6 +646,8 @@ def run_audio_interface(
             return 0
         if verbose:
             print(f"[audio] Selected session: {session.session_id} {session.file}")
+    # A --shard-sessions session keeps its rows in its own file
+    with open_db(session_db_path(path, session.session_id)) as conn:
         autoplay_session(
             conn,
             tts,
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import json
 import os
 import sys
 import uuid
@@ -7,9 +8,11 @@ from typing import Optional
 
 import click
 
+from .common import CaptureBudget, value_codec_id
 from .runner import AutoDebugger
 from .audio_ui import run_audio_interface
-from .db import LineReportStore
+from .columnar import export_session_npz
+from .db import EXPORT_COLUMNS, LineReportStore
 from .ui import create_app as create_legacy_app
 from .unified_ui import create_unified_app, UnifiedReviewInterface
 
@@ -39,7 +42,58 @@ def main() -> None:  # pragma: no cover
 @click.option("--max-loop-iterations", "max_loop_iterations", type=int, default=None, help="Maximum iterations allowed in a loop before aborting (resource management).")
 @click.option("--max-memory-mb", "max_memory_mb", type=int, default=None, help="Maximum memory usage in MB before aborting (resource management).")
 @click.option("--max-disk-usage-mb", "max_disk_usage_mb", type=int, default=None, help="Maximum disk usage increase in MB before aborting (resource management).")
+@click.option("--max-hits-per-line", "max_hits_per_line", type=click.IntRange(min=1), default=None, help="Record each file:line at most N times; later hits only bump a per-line counter (hits, first/last timestamp).")
+@click.option("--summarize-loops-after", "summarize_loops_after", type=click.IntRange(min=0), default=None, help="Keep full rows for the first K iterations and the last iteration of each loop; fold the iterations in between into loop_summaries.")
 @click.option("--record-resources/--no-record-resources", "record_resources", default=False, help="Record resource usage (loop iterations, memory, disk) for each line executed.")
+@click.option(
+    "--engine",
+    "engine",
+    type=click.Choice(["dap", "monitor", "settrace"], case_sensitive=False),
+    default="dap",
+    show_default=True,
+    help="Capture engine: 'dap' steps via debugpy; 'monitor' (Python 3.12+, sys.monitoring) and 'settrace' (any Python) record in-process, auto mode only.",
+)
+@click.option("--capture-depth", "capture_depth", type=click.IntRange(min=1), default=20, show_default=True, help="Maximum nesting depth captured per variable.")
+@click.option("--capture-max-children", "capture_max_children", type=click.IntRange(min=0), default=None, help="Keep at most N elements per container (a head/tail sample) and record its full length.")
+@click.option("--capture-max-bytes", "capture_max_bytes", type=click.IntRange(min=0), default=None, help="Shrink any variable whose JSON form exceeds N bytes to a truncated sample.")
+@click.option(
+    "--scopes",
+    "scopes",
+    type=click.Choice(["all", "locals", "locals+changed-globals"], case_sensitive=False),
+    default="all",
+    show_default=True,
+    help="Scopes stored per line: every scope, Locals only, or Locals plus the module globals that changed (all globals are snapshotted once per module).",
+)
+@click.option(
+    "--capture-mode",
+    "capture_mode",
+    type=click.Choice(["full", "changed"], case_sensitive=False),
+    default="full",
+    show_default=True,
+    help="dap engine: 'full' re-expands every variable at each stop; 'changed' only re-expands variables whose preview or type changed since the frame's previous stop.",
+)
+@click.option(
+    "--stepping",
+    "stepping",
+    type=click.Choice(["step", "breakpoints"], case_sensitive=False),
+    default="step",
+    show_default=True,
+    help="dap engine auto mode: 'step' sends stepIn after every stop; 'breakpoints' sets breakpoints on every executable line of the user's files and resumes with continue, so library code runs at full speed.",
+)
+@click.option("--breakpoint-glob", "breakpoint_globs", multiple=True, help="Files to give breakpoints before they first run in --stepping breakpoints (relative to the script's directory; repeatable; at most 64). Default: only the script; other files are covered when they show up on the stack.")
+@click.option("--async-loop/--sync-loop", "async_loop", default=False, help="Drive the dap engine from an asyncio loop, writing each stop while the next step runs (auto mode only).")
+@click.option("--write-behind/--write-through", "write_behind", default=False, help="Queue rows for a writer thread that commits them in batches instead of committing each line before the next step.")
+@click.option("--intern-values", "intern_values", is_flag=True, default=False, help="Store each distinct large variable value once (interned_values table); rows keep only a name -> hash reference.")
+@click.option(
+    "--value-codec",
+    "value_codec",
+    type=click.Choice(["json", "zlib", "zstd"], case_sensitive=False),
+    default="json",
+    show_default=True,
+    help="Encoding of the variables/variables_delta columns: JSON text, or compact JSON compressed per row with zlib or zstd (zstd needs the 'zstandard' package and falls back to zlib).",
+)
+@click.option("--keyframe-interval", "keyframe_interval", type=click.IntRange(min=1), default=None, help="Store a row's full variables only every K rows of the session and a patch against the previous row in between (get_state_at rebuilds any row).")
+@click.option("--shard-sessions", "shard_sessions", is_flag=True, default=False, help="Write this session's rows to a database file of its own (sessions/<id>.db next to --db); --db keeps only the session summary.")
 @click.argument("script", type=click.Path(exists=True))
 @click.argument("script_args", nargs=-1)
 def run_cmd(
@@ -56,43 +110,255 @@ def run_cmd(
     max_loop_iterations: Optional[int],
     max_memory_mb: Optional[int],
     max_disk_usage_mb: Optional[int],
+    max_hits_per_line: Optional[int],
+    summarize_loops_after: Optional[int],
     record_resources: bool,
+    engine: str,
+    capture_depth: int,
+    capture_max_children: Optional[int],
+    capture_max_bytes: Optional[int],
+    capture_mode: str,
+    scopes: str,
+    stepping: str,
+    breakpoint_globs: tuple[str, ...],
+    async_loop: bool,
+    write_behind: bool,
+    intern_values: bool,
+    value_codec: str,
+    keyframe_interval: Optional[int],
+    shard_sessions: bool,
     script: str,
     script_args: tuple[str, ...],
 ) -> None:
     print(f"[CLI DEBUG] Starting with max_loop_iterations={max_loop_iterations}, max_memory_mb={max_memory_mb}, max_disk_usage_mb={max_disk_usage_mb}, record_resources={record_resources}", file=sys.stderr, flush=True)
+    engine = engine.lower()
+    if engine != "dap" and (manual or manual_from or manual_web or manual_audio):
+        raise click.UsageError(f"--engine {engine} records in auto mode only; use --engine dap for manual stepping.")
+    if async_loop and (engine != "dap" or manual or manual_from or manual_web or manual_audio or max_loop_iterations or max_memory_mb or max_disk_usage_mb or record_resources):
+        raise click.UsageError("--async-loop supports auto-mode --engine dap capture without resource limits or recording.")
+    stepping = stepping.lower()
+    if stepping != "step" and (engine != "dap" or manual or manual_from or manual_web or manual_audio):
+        raise click.UsageError("--stepping breakpoints supports auto-mode --engine dap capture only.")
     dbg = AutoDebugger(python_exe=python_exe, db_path=db_path)
-    session_id = dbg.run(
-        script,
-        list(script_args),
-        just_my_code=just_my_code,
-        stop_on_entry=stop_on_entry,
-        manual=manual,
-        manual_from=manual_from,
-        manual_web=manual_web,
-        manual_audio=manual_audio,
-        manual_voice=manual_voice,
-        manual_rate_wpm=manual_rate_wpm,
-        max_loop_iterations=max_loop_iterations,
-        max_memory_mb=max_memory_mb,
-        max_disk_usage_mb=max_disk_usage_mb,
-        record_resources=record_resources,
-    )
+    try:
+        session_id = dbg.run(
+            script,
+            list(script_args),
+            just_my_code=just_my_code,
+            stop_on_entry=stop_on_entry,
+            manual=manual,
+            manual_from=manual_from,
+            manual_web=manual_web,
+            manual_audio=manual_audio,
+            manual_voice=manual_voice,
+            manual_rate_wpm=manual_rate_wpm,
+            max_loop_iterations=max_loop_iterations,
+            max_memory_mb=max_memory_mb,
+            max_disk_usage_mb=max_disk_usage_mb,
+            record_resources=record_resources,
+            engine=engine,
+            async_loop=async_loop,
+            capture_budget=CaptureBudget(capture_depth, capture_max_children, capture_max_bytes),
+            capture_mode=capture_mode.lower(),
+            scopes=scopes.lower(),
+            max_hits_per_line=max_hits_per_line,
+            summarize_loops_after=summarize_loops_after,
+            stepping=stepping,
+            breakpoint_globs=list(breakpoint_globs) or None,
+            write_behind=write_behind,
+            intern_values=intern_values,
+            value_codec=value_codec.lower(),
+            keyframe_interval=keyframe_interval,
+            shard_sessions=shard_sessions,
+        )
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
     click.echo(session_id)
 
 
 @main.command("export")
 @click.option("--db", "db_path", type=click.Path(), default=None, help="SQLite DB path for reports.")
 @click.option("--session", "session_id", type=str, required=True)
-def export_cmd(db_path: Optional[str], session_id: str) -> None:
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(["json", "ndjson", "npz"], case_sensitive=False),
+    default="json",
+    show_default=True,
+    help=(
+        "json: one document with the session summary. ndjson: one line report per line, streamed. "
+        "npz: one NumPy array per numeric variable, aligned with step_id/line_number/memory_usage_mb (needs numpy)."
+    ),
+)
+@click.option("--out", "out_path", type=click.Path(dir_okay=False), default="-", help="Output file (default: stdout).")
+@click.option("--from-step", "from_step", type=int, default=None, help="ndjson/npz: first line report id to export.")
+@click.option("--to-step", "to_step", type=int, default=None, help="ndjson/npz: last line report id to export.")
+@click.option(
+    "--columns",
+    type=str,
+    default=None,
+    help=f"ndjson: comma-separated columns to include (default: all of {','.join(EXPORT_COLUMNS)}).",
+)
+def export_cmd(
+    db_path: Optional[str],
+    session_id: str,
+    fmt: str,
+    out_path: str,
+    from_step: Optional[int],
+    to_step: Optional[int],
+    columns: Optional[str],
+) -> None:
+    """Export a session as JSON, stream its line reports as NDJSON, or write numeric variables as NumPy arrays."""
+    selected = [c.strip() for c in columns.split(",") if c.strip()] if columns else None
+    unknown = [c for c in selected or [] if c not in EXPORT_COLUMNS]
+    if unknown:
+        raise click.BadParameter(f"unknown column(s): {', '.join(unknown)}", param_hint="--columns")
+    store = LineReportStore(db_path)
+    store.open()
+    try:
+        if fmt.lower() == "npz":
+            out = click.get_binary_stream("stdout") if out_path == "-" else out_path
+            try:
+                export_session_npz(store, session_id, out, from_step=from_step, to_step=to_step)
+            except RuntimeError as e:
+                raise click.ClickException(str(e))
+            return
+        with click.open_file(out_path, "w", encoding="utf-8") as out:
+            if fmt.lower() == "json":
+                out.write(store.export_session_json(session_id) + "\n")
+                return
+            for row in store.iter_session_reports(session_id, selected, from_step=from_step, to_step=to_step):
+                out.write(json.dumps(row, separators=(",", ":")) + "\n")
+    finally:
+        store.close()
+
+
+@main.command("migrate")
+@click.option("--db", "db_path", type=click.Path(), default=None, help="SQLite DB path for reports.")
+@click.option("--recode", is_flag=True, default=False, help="Re-encode the variables/variables_delta of stored rows in place.")
+@click.option(
+    "--codec",
+    type=click.Choice(["json", "zlib", "zstd"], case_sensitive=False),
+    default="zstd",
+    show_default=True,
+    help="Target encoding for --recode (zstd falls back to zlib without the 'zstandard' package).",
+)
+@click.option("--session", "session_id", type=str, default=None, help="Recode only this session (default: every session).")
+@click.option(
+    "--normalize",
+    is_flag=True,
+    default=False,
+    help="Move an older line_reports table into the narrow steps layout (line_reports stays readable as a view).",
+)
+def migrate_cmd(db_path: Optional[str], recode: bool, codec: str, session_id: Optional[str], normalize: bool) -> None:
+    """Bring the database schema up to date; with --recode, convert stored variables to another encoding."""
     store = LineReportStore(db_path)
+    # open() applies pending schema changes
     store.open()
     try:
-        click.echo(store.export_session_json(session_id))
+        if normalize:
+            count = store.normalize_line_reports()
+            click.echo(f"Moved {count} line reports into steps")
+        if recode:
+            count = store.recode_line_reports(value_codec_id(codec), session_id=session_id)
+            click.echo(f"Recoded {count} line reports")
     finally:
         store.close()
 
 
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def _parse_duration(ctx: click.Context, param: click.Parameter, value: Optional[str]) -> Optional[float]:
+    """'90s', '30m', '12h', '7d', '2w' (or plain seconds) -> seconds."""
+    if value is None:
+        return None
+    text = value.strip().lower()
+    unit = text[-1:] if text[-1:] in _DURATION_UNITS else "s"
+    number = text[:-1] if text[-1:] in _DURATION_UNITS else text
+    try:
+        return float(number) * _DURATION_UNITS[unit]
+    except ValueError:
+        raise click.BadParameter(f"expected a duration like 7d or 12h, got {value!r}")
+
+
+def _parse_size(ctx: click.Context, param: click.Parameter, value: Optional[str]) -> Optional[int]:
+    """'500M', '2G', '1.5GB' (or plain bytes) -> bytes."""
+    if value is None:
+        return None
+    text = value.strip().upper()
+    if text.endswith("IB"):
+        text = text[:-2]
+    elif text.endswith("B"):
+        text = text[:-1]
+    unit = text[-1:] if text[-1:] in _SIZE_UNITS else ""
+    number = text[:-1] if unit else text
+    try:
+        return int(float(number) * _SIZE_UNITS[unit])
+    except ValueError:
+        raise click.BadParameter(f"expected a size like 2G or 500M, got {value!r}")
+
+
+@main.command("gc")
+@click.option("--db", "db_path", type=click.Path(), default=None, help="SQLite DB path for reports.")
+@click.option("--keep-last", "keep_last", type=click.IntRange(min=0), default=None, help="Never delete the N most recently started finished sessions.")
+@click.option(
+    "--older-than",
+    "older_than",
+    type=str,
+    default=None,
+    callback=_parse_duration,
+    help="Delete sessions started longer ago than this (e.g. 7d, 12h). Without it, --keep-last deletes all other sessions.",
+)
+@click.option(
+    "--max-db-size",
+    "max_db_size",
+    type=str,
+    default=None,
+    callback=_parse_size,
+    help="Then delete the oldest sessions until the data fits in this size (e.g. 2G, 500M).",
+)
+@click.option(
+    "--convert-auto-vacuum",
+    "convert_auto_vacuum",
+    is_flag=True,
+    default=False,
+    help="Switch a database created without auto_vacuum=INCREMENTAL over first (one full VACUUM; needs free disk space about the size of the database).",
+)
+def gc_cmd(
+    db_path: Optional[str],
+    keep_last: Optional[int],
+    older_than: Optional[float],
+    max_db_size: Optional[int],
+    convert_auto_vacuum: bool,
+) -> None:
+    """Delete old sessions with everything they own, drop orphaned snapshots and shrink the database file.
+
+    Sessions still being captured (no end time yet) are never deleted.
+    """
+    store = LineReportStore(db_path)
+    store.open()
+    try:
+        result = store.collect_garbage(
+            keep_last=keep_last, older_than=older_than, max_db_size=max_db_size, convert_auto_vacuum=convert_auto_vacuum
+        )
+    finally:
+        store.close()
+    mb = 1024 * 1024
+    click.echo(
+        f"Deleted {result['deleted_sessions']} sessions; "
+        f"{result['size_before'] / mb:.1f} MB -> {result['size_after'] / mb:.1f} MB"
+    )
+    if not result["incremental"]:
+        click.echo(
+            "Warning: this database predates auto_vacuum=INCREMENTAL, so freed pages stay in the file "
+            "(new captures reuse them). Run gc once with --convert-auto-vacuum to switch it over; that "
+            "is one full VACUUM and needs free disk space about the size of the database.",
+            err=True,
+        )
+
+
 @main.command("ui")
 @click.option("--db", "db_path", type=click.Path(), default=None, help="SQLite DB path for reports.")
 @click.option("--host", default="127.0.0.1", show_default=True)
@@ -0,0 +1,80 @@
+"""Columnar export of a session's numeric variables (``autodebug export --format npz``).
+
+NumPy is optional; it is imported only when an export is written.
+"""
+
+from __future__ import annotations
+
+from typing import IO, Any, Dict, List, Optional, Tuple, Union
+
+from .db import LineReportStore
+from .loop_summary import _is_number
+
+_INT64_MIN = -(2**63)
+_INT64_MAX = 2**63 - 1
+
+
+def export_session_npz(
+    store: LineReportStore,
+    session_id: str,
+    out: Union[str, IO[bytes]],
+    from_step: Optional[int] = None,
+    to_step: Optional[int] = None,
+) -> int:
+    """Write a session's numeric variables to ``out`` (a path or binary file) as a compressed ``.npz``.
+
+    The arrays all have one entry per line report: ``step_id``,
+    ``line_number``, ``memory_usage_mb`` (NaN when not recorded) and, for
+    every variable that is numeric at some row, ``"<scope>/<name>"`` with its
+    mask ``"<scope>/<name>/mask"``. The mask is True where the variable is
+    missing or not a number (bools count as non-numeric); those entries hold
+    0 or NaN. A variable is int64 when all its numbers are ints that fit,
+    float64 otherwise. Returns the number of rows written.
+    """
+    try:
+        import numpy as np
+    except ImportError as e:
+        raise RuntimeError("--format npz needs numpy (pip install numpy)") from e
+
+    step_ids: List[int] = []
+    line_numbers: List[int] = []
+    memory: List[float] = []
+    # (scope, name) -> value per row so far; None where masked. Padded lazily.
+    series: Dict[Tuple[str, str], List[Any]] = {}
+    rows = store.iter_session_reports(
+        session_id,
+        ["id", "line_number", "memory_usage_mb", "variables"],
+        from_step=from_step,
+        to_step=to_step,
+    )
+    for n, row in enumerate(rows):
+        step_ids.append(row["id"])
+        line_numbers.append(row["line_number"])
+        memory.append(float("nan") if row["memory_usage_mb"] is None else row["memory_usage_mb"])
+        scopes = row["variables"] if isinstance(row["variables"], dict) else {}
+        for scope, variables in scopes.items():
+            if not isinstance(variables, dict):
+                continue
+            for name, value in variables.items():
+                if not _is_number(value):
+                    continue
+                values = series.setdefault((scope, name), [])
+                values.extend([None] * (n - len(values)))
+                values.append(value)
+
+    total = len(step_ids)
+    arrays: Dict[str, Any] = {
+        "step_id": np.array(step_ids, dtype=np.int64),
+        "line_number": np.array(line_numbers, dtype=np.int64),
+        "memory_usage_mb": np.array(memory, dtype=np.float64),
+    }
+    for (scope, name), values in series.items():
+        values.extend([None] * (total - len(values)))
+        key = f"{scope}/{name}"
+        arrays[f"{key}/mask"] = np.array([v is None for v in values], dtype=bool)
+        if all(v is None or (isinstance(v, int) and _INT64_MIN <= v <= _INT64_MAX) for v in values):
+            arrays[key] = np.array([0 if v is None else v for v in values], dtype=np.int64)
+        else:
+            arrays[key] = np.array([float("nan") if v is None else float(v) for v in values], dtype=np.float64)
+    np.savez_compressed(out, **arrays)
+    return total
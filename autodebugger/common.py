@@ -3,10 +3,544 @@
 from __future__ import annotations
 
 import ast
+import hashlib
+import json
 import os
+import re
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
 from typing import Any, Dict, List, Optional, Tuple
 
 
+# Key marking a container or string that was cut down to fit a capture budget
+TRUNCATED_KEY = "__truncated__"
+# Key marking a variable whose value lives in the interned_values table (--intern-values)
+VALUE_REF_KEY = "__value_ref__"
+# Values whose JSON is shorter than this stay inline; a reference would not be smaller
+INTERN_MIN_CHARS = 64
+
+# line_reports.variables_codec: how a row's variables/variables_delta are encoded.
+# NULL (rows written before the column existed) reads as CODEC_JSON.
+CODEC_JSON = 0  # JSON text
+CODEC_ZLIB = 1  # compact JSON, zlib-compressed BLOB
+CODEC_ZSTD = 2  # compact JSON, zstd-compressed BLOB (optional 'zstandard' package)
+VALUE_CODECS = {"json": CODEC_JSON, "zlib": CODEC_ZLIB, "zstd": CODEC_ZSTD}
+
+# line_reports.state_encoding: what a row's variables column holds (--keyframe-interval).
+# NULL (rows written before the column existed) reads as STATE_FULL.
+STATE_FULL = 0  # the full state (a keyframe)
+STATE_PATCH = 1  # a patch against the state of the session's previous row
+STATE_PATCH_IS_DELTA = 2  # the patch equals variables_delta, which is not stored twice
+# Patch entry for a key that disappeared (compute_delta's None is also a legitimate value)
+REMOVED_KEY = "__removed__"
+
+try:
+    import zstandard as _zstd
+except ImportError:  # zlib is always available
+    _zstd = None
+
+
+@dataclass(frozen=True)
+class CaptureBudget:
+    """Limits applied while capturing each variable.
+
+    ``depth`` bounds nesting, ``max_children`` bounds the elements kept per
+    container (a head/tail sample beyond that) and ``max_bytes`` bounds the
+    JSON size of one top-level variable. ``None`` means unlimited.
+    """
+    depth: int = 20
+    max_children: Optional[int] = None
+    max_bytes: Optional[int] = None
+
+
+# Which scopes each stop stores: every scope, Locals only, or Locals plus the
+# module globals that changed since the module's previous stop
+SCOPE_POLICIES = ("all", "locals", "locals+changed-globals")
+
+
+class GlobalsTracker:
+    """Per-module globals state for the ``locals+changed-globals`` scope policy.
+
+    Callers fingerprint each global cheaply (a DAP preview/type pair, or the
+    snapshot itself in-process), ask ``changed_names`` which globals need a
+    full capture, then ``update`` with the captured values.
+    """
+
+    def __init__(self) -> None:
+        self._fingerprints: Dict[str, Dict[str, Any]] = {}
+        self._values: Dict[str, Dict[str, Any]] = {}
+
+    def changed_names(self, module: str, fingerprints: Dict[str, Any]) -> Optional[set]:
+        """Names that are new or changed since the module's last update; None if never seen."""
+        previous = self._fingerprints.get(module)
+        if previous is None:
+            return None
+        return {name for name, fp in fingerprints.items() if name not in previous or previous[name] != fp}
+
+    def update(
+        self, module: str, fingerprints: Dict[str, Any], values: Dict[str, Any]
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Record captured ``values`` and return (all current globals, changes).
+
+        Only values that differ from the previous capture count as changes;
+        globals that disappeared are reported as None, matching ``compute_delta``.
+        """
+        current = self._values.setdefault(module, {})
+        changes = {name: value for name, value in values.items() if name not in current or current[name] != value}
+        for name in list(current):
+            if name not in fingerprints:
+                del current[name]
+                changes[name] = None
+        current.update(values)
+        self._fingerprints[module] = dict(fingerprints)
+        return dict(current), changes
+
+
+class LineHitCounter:
+    """Per-line hit budget for ``--max-hits-per-line``.
+
+    ``admit`` returns True while a ``(file, line)`` is still within budget;
+    later hits are aggregated into counters that ``drain`` hands back as
+    ``(file, line_number, hits, first_timestamp, last_timestamp)`` rows.
+    """
+
+    def __init__(self, max_hits: Optional[int] = None) -> None:
+        self.max_hits = max_hits
+        self._recorded: Dict[Tuple[str, int], int] = {}
+        self._overflow: Dict[Tuple[str, int], List[Any]] = {}
+
+    def admit(self, file: str, line: int, timestamp: str) -> bool:
+        if self.max_hits is None:
+            return True
+        key = (file, line)
+        recorded = self._recorded.get(key, 0)
+        if recorded < self.max_hits:
+            self._recorded[key] = recorded + 1
+            return True
+        counter = self._overflow.get(key)
+        if counter is None:
+            self._overflow[key] = [1, timestamp, timestamp]
+        else:
+            counter[0] += 1
+            counter[2] = timestamp
+        return False
+
+    def drain(self) -> List[Tuple[str, int, int, str, str]]:
+        rows = [(file, line, hits, first, last) for (file, line), (hits, first, last) in self._overflow.items()]
+        self._overflow.clear()
+        return rows
+
+
+def truncated_value(type_name: str, length: int, head: Any, tail: Any) -> Dict[str, Any]:
+    """Build the stored marker for a value that was only partially captured.
+
+    ``head``/``tail`` hold the first and last captured elements (lists for
+    sequences, dicts for mappings, substrings for strings).
+    """
+    return {TRUNCATED_KEY: True, "type": type_name, "length": length, "head": head, "tail": tail}
+
+
+def is_truncated(value: Any) -> bool:
+    return isinstance(value, dict) and value.get(TRUNCATED_KEY) is True
+
+
+def split_budget(max_children: int) -> Tuple[int, int]:
+    """Return (head, tail) sample sizes for a container over ``max_children``."""
+    head = (max_children + 1) // 2
+    return head, max_children - head
+
+
+def fit_to_bytes(value: Any, max_bytes: Optional[int]) -> Any:
+    """Shrink ``value`` until its JSON encoding fits ``max_bytes``.
+
+    Oversized strings, lists and dicts become ``truncated_value`` markers whose
+    head/tail samples are halved until they fit; anything else falls back to a
+    truncated string preview.
+    """
+    if max_bytes is None:
+        return value
+
+    def _size(v: Any) -> int:
+        return len(json.dumps(v, default=str))
+
+    if _size(value) <= max_bytes:
+        return value
+    if is_truncated(value):
+        type_name, length, head, tail = value["type"], value["length"], value["head"], value["tail"]
+    elif isinstance(value, list):
+        type_name, length, head, tail = "list", len(value), value, []
+    elif isinstance(value, dict):
+        type_name, length, head, tail = "dict", len(value), value, {}
+    elif isinstance(value, str):
+        type_name, length, head, tail = "str", len(value), value, ""
+    else:
+        text = str(value)
+        return truncated_value(type(value).__name__, len(text), text[: max(0, max_bytes // 2)], "")
+
+    # Keep roughly equal shares of the sample from each end, halving until it fits
+    n = len(head) + len(tail)
+    while n > 0:
+        n //= 2
+        h, t = split_budget(n) if n else (0, 0)
+        if isinstance(head, dict):
+            items = list(head.items()) + list(tail.items())
+            new_head, new_tail = dict(items[:h]), dict(items[len(items) - t:] if t else [])
+        else:
+            joined = head + tail
+            new_head, new_tail = joined[:h], (joined[len(joined) - t:] if t else joined[:0])
+        candidate = truncated_value(type_name, length, new_head, new_tail)
+        if _size(candidate) <= max_bytes:
+            return candidate
+    return truncated_value(type_name, length, head[:0] if not isinstance(head, dict) else {}, tail[:0] if not isinstance(tail, dict) else {})
+
+
+def intern_scopes(scopes: Any, new_values: Dict[str, str]) -> Any:
+    """Replace each large variable of ``{scope: {name: value}}`` with a value reference.
+
+    The JSON of every replaced value is added to ``new_values`` (hash -> JSON)
+    for the caller to store in ``interned_values``. Equal values share one hash.
+    """
+    if not isinstance(scopes, dict):
+        return scopes
+    out: Dict[str, Any] = {}
+    for scope, variables in scopes.items():
+        if not isinstance(variables, dict):
+            out[scope] = variables
+            continue
+        interned: Dict[str, Any] = {}
+        for name, value in variables.items():
+            encoded = json.dumps(value)
+            if len(encoded) < INTERN_MIN_CHARS:
+                interned[name] = value
+                continue
+            digest = hashlib.blake2b(encoded.encode("utf-8"), digest_size=16).hexdigest()
+            new_values[digest] = encoded
+            interned[name] = {VALUE_REF_KEY: digest}
+        out[scope] = interned
+    return out
+
+
+def is_value_ref(value: Any) -> bool:
+    return isinstance(value, dict) and len(value) == 1 and isinstance(value.get(VALUE_REF_KEY), str)
+
+
+def resolve_value_refs(conn: Any, scopes: Any) -> Any:
+    """Inverse of ``intern_scopes``: look up the referenced values on the sqlite ``conn``.
+
+    Rows stored without ``--intern-values`` come back unchanged without a query.
+    A reference whose value is missing resolves to None.
+    """
+    if not isinstance(scopes, dict):
+        return scopes
+    refs = {
+        value[VALUE_REF_KEY]
+        for variables in scopes.values() if isinstance(variables, dict)
+        for value in variables.values() if is_value_ref(value)
+    }
+    if not refs:
+        return scopes
+    ordered = sorted(refs)
+    values: Dict[str, Any] = {}
+    # Stay under SQLite's bound-parameter limit
+    for i in range(0, len(ordered), 500):
+        chunk = ordered[i:i + 500]
+        placeholders = ",".join("?" * len(chunk))
+        for h, encoded in conn.execute(f"SELECT hash, encoded FROM interned_values WHERE hash IN ({placeholders})", chunk):
+            values[h] = json.loads(encoded)
+    return {
+        scope: (
+            {name: values.get(value[VALUE_REF_KEY]) if is_value_ref(value) else value for name, value in variables.items()}
+            if isinstance(variables, dict) else variables
+        )
+        for scope, variables in scopes.items()
+    }
+
+
+_zstd_local = threading.local()
+
+
+def value_codec_id(name: str) -> int:
+    """Codec id for a ``--value-codec`` name; ``zstd`` falls back to zlib without zstandard."""
+    codec = VALUE_CODECS[name.lower()]
+    if codec == CODEC_ZSTD and _zstd is None:
+        return CODEC_ZLIB
+    return codec
+
+
+def encode_scopes(scopes: Any, codec: int = CODEC_JSON) -> Any:
+    """Encode a ``variables``/``variables_delta`` value for storage under ``codec``."""
+    if codec == CODEC_JSON:
+        return json.dumps(scopes)
+    data = json.dumps(scopes, separators=(",", ":")).encode("utf-8")
+    if codec == CODEC_ZLIB:
+        return zlib.compress(data)
+    if codec == CODEC_ZSTD:
+        # Compressor objects must not be shared between threads (write-behind)
+        compressor = getattr(_zstd_local, "compressor", None)
+        if compressor is None:
+            compressor = _zstd_local.compressor = _zstd.ZstdCompressor(level=3)
+        return compressor.compress(data)
+    raise ValueError(f"Unknown variables codec {codec!r}")
+
+
+def decode_scopes(raw: Any, codec: Optional[int] = None, conn: Any = None) -> Any:
+    """Decode a ``variables``/``variables_delta`` column written under ``codec``.
+
+    ``codec`` is the row's ``variables_codec``. With the sqlite ``conn``, values
+    interned by ``--intern-values`` are resolved as well. Every reader of
+    ``line_reports`` goes through this.
+    """
+    if raw is None or len(raw) == 0:
+        scopes: Any = {}
+    elif not codec:
+        scopes = json.loads(raw)
+    elif codec == CODEC_ZLIB:
+        scopes = json.loads(zlib.decompress(raw))
+    elif codec == CODEC_ZSTD:
+        if _zstd is None:
+            raise RuntimeError("Row is zstd-encoded; install the 'zstandard' package to read it")
+        scopes = json.loads(_zstd.ZstdDecompressor().decompress(raw))
+    else:
+        raise ValueError(f"Unknown variables codec {codec!r}")
+    return resolve_value_refs(conn, scopes) if conn is not None else scopes
+
+
+def compute_patch(curr: Dict[str, Any], prev: Dict[str, Any]) -> Dict[str, Any]:
+    """Like ``compute_delta``, but removed keys become ``{REMOVED_KEY: True}``.
+
+    ``apply_patch(prev, compute_patch(curr, prev)) == curr``.
+    """
+    patch: Dict[str, Any] = {}
+    for k in curr.keys() | prev.keys():
+        if k not in curr:
+            patch[k] = {REMOVED_KEY: True}
+            continue
+        cv = curr[k]
+        pv = prev.get(k)
+        if isinstance(cv, dict) and isinstance(pv, dict):
+            sub = compute_patch(cv, pv)
+            if sub:
+                patch[k] = sub
+        elif k not in prev or cv != pv:
+            patch[k] = cv
+    return patch
+
+
+def _is_removed(value: Any) -> bool:
+    return isinstance(value, dict) and len(value) == 1 and value.get(REMOVED_KEY) is True
+
+
+def apply_patch(state: Dict[str, Any], patch: Dict[str, Any]) -> Dict[str, Any]:
+    """Return ``state`` with ``patch`` applied; ``state`` itself is left untouched."""
+    out = dict(state)
+    for k, v in patch.items():
+        if _is_removed(v):
+            out.pop(k, None)
+        elif isinstance(v, dict) and isinstance(out.get(k), dict):
+            out[k] = apply_patch(out[k], v)
+        else:
+            out[k] = v
+    return out
+
+
+def next_state(prev_state: Optional[Dict[str, Any]], variables: Any, delta: Any, encoding: Optional[int]) -> Any:
+    """State at a row, from the state at the session's previous row and the row's decoded columns."""
+    if not encoding:
+        return variables
+    if encoding == STATE_PATCH:
+        return apply_patch(prev_state or {}, variables)
+    if encoding == STATE_PATCH_IS_DELTA:
+        return apply_patch(prev_state or {}, delta)
+    raise ValueError(f"Unknown state encoding {encoding!r}")
+
+
+def reconstruct_state(
+    conn: Any,
+    session_id: str,
+    step_id: int,
+    base: Optional[Tuple[int, Dict[str, Any]]] = None,
+) -> Optional[Dict[str, Any]]:
+    """Variables at ``line_reports`` row ``step_id``, replayed from the nearest keyframe.
+
+    ``base`` is a known ``(row_id, state)`` of the same session; replay starts
+    there instead when no keyframe lies between it and ``step_id``. Returns
+    None if the session has no such row.
+    """
+    row = conn.execute(
+        "SELECT id FROM line_reports WHERE session_id=? AND id<=? AND COALESCE(state_encoding, 0)=0 ORDER BY id DESC LIMIT 1",
+        (session_id, step_id),
+    ).fetchone()
+    keyframe_id = row[0] if row else None
+    if base is not None and base[0] <= step_id and (keyframe_id is None or base[0] >= keyframe_id):
+        first_id, state = base[0] + 1, base[1]
+    elif keyframe_id is not None:
+        first_id, state = keyframe_id, {}
+    else:
+        return None
+    rows = conn.execute(
+        "SELECT id, variables, variables_delta, variables_codec, state_encoding FROM line_reports "
+        "WHERE session_id=? AND id>=? AND id<=? ORDER BY id",
+        (session_id, first_id, step_id),
+    ).fetchall()
+    if first_id <= step_id and (not rows or rows[-1][0] != step_id):
+        return None
+    for _, variables, delta, codec, encoding in rows:
+        state = next_state(
+            state,
+            decode_scopes(variables, codec, conn),
+            decode_scopes(delta, codec, conn) if encoding == STATE_PATCH_IS_DELTA else None,
+            encoding,
+        )
+    return state
+
+
+# Sharded layout (run --shard-sessions): session_summaries.shard_path names the
+# session's own database file, relative to the catalog database's directory
+SHARDS_DIR = "sessions"
+
+
+def shard_relpath(session_id: str) -> str:
+    """Where a new session's shard goes, relative to the catalog's directory."""
+    return os.path.join(SHARDS_DIR, re.sub(r"[^A-Za-z0-9_.-]", "_", session_id) + ".db")
+
+
+def session_db_path(catalog_path: Any, session_id: str) -> str:
+    """Database file holding a session's rows: its shard if it has one, else the catalog itself."""
+    catalog_path = str(catalog_path)
+    try:
+        conn = sqlite3.connect(catalog_path)
+        try:
+            row = conn.execute("SELECT shard_path FROM session_summaries WHERE session_id=?", (session_id,)).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.OperationalError:
+        # No session_summaries/shard_path yet: nothing is sharded
+        return catalog_path
+    if row and row[0]:
+        return os.path.join(os.path.dirname(os.path.abspath(catalog_path)), row[0])
+    return catalog_path
+
+
+class StateCache:
+    """Recently reconstructed row states (see ``reconstruct_state``).
+
+    A miss replays from the closest cached earlier row of the session, so
+    stepping forward through a session costs one row per step. Returned
+    states are shared with the cache and must not be modified.
+    """
+
+    def __init__(self, max_entries: int = 256) -> None:
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, int], Dict[str, Any]]" = OrderedDict()
+
+    def get(self, conn: Any, session_id: str, step_id: int) -> Optional[Dict[str, Any]]:
+        key = (session_id, step_id)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            earlier = [k[1] for k in self._entries if k[0] == session_id and k[1] < step_id]
+            base = (max(earlier), self._entries[(session_id, max(earlier))]) if earlier else None
+        state = reconstruct_state(conn, session_id, step_id, base)
+        if state is not None:
+            with self._lock:
+                self._entries[key] = state
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return state
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class SourceCache:
+    """Source files read once and shared by every stop that needs them.
+
+    Entries are keyed by path and revalidated with ``os.stat`` (mtime, size,
+    inode), so a step costs a stat instead of a read. The text, its lines and
+    its parsed ``ast`` are derived lazily from the cached bytes. At most
+    ``max_files`` files are kept, least recently used first out. Thread-safe,
+    since the web controller reads from its own thread.
+    """
+
+    def __init__(self, max_files: int = 256) -> None:
+        self.max_files = max_files
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def _entry(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            st = os.stat(path)
+        except (OSError, ValueError):
+            return None
+        key = (st.st_mtime_ns, st.st_size, st.st_ino)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry["key"] == key:
+                self._entries.move_to_end(path)
+                return entry
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        entry = {"key": key, "bytes": data}
+        with self._lock:
+            self._entries[path] = entry
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_files:
+                self._entries.popitem(last=False)
+        return entry
+
+    def get_bytes(self, path: str) -> Optional[bytes]:
+        entry = self._entry(path)
+        return entry["bytes"] if entry is not None else None
+
+    def get_text(self, path: str) -> Optional[str]:
+        entry = self._entry(path)
+        if entry is None:
+            return None
+        if "text" not in entry:
+            entry["text"] = entry["bytes"].decode("utf-8", errors="replace")
+        return entry["text"]
+
+    def get_lines(self, path: str) -> List[str]:
+        """Lines without their line endings; empty if the file cannot be read."""
+        entry = self._entry(path)
+        if entry is None:
+            return []
+        if "lines" not in entry:
+            # Universal newlines, like reading the file in text mode
+            text = (self.get_text(path) or "").replace("\r\n", "\n").replace("\r", "\n")
+            entry["lines"] = text.split("\n")
+        return entry["lines"]
+
+    def get_line(self, path: str, line: int) -> str:
+        lines = self.get_lines(path)
+        return lines[line - 1] if 1 <= line <= len(lines) else ""
+
+    def get_tree(self, path: str) -> Optional[ast.AST]:
+        """Parsed module, or None if the file cannot be read or parsed."""
+        entry = self._entry(path)
+        if entry is None:
+            return None
+        if "tree" not in entry:
+            try:
+                entry["tree"] = ast.parse(self.get_text(path) or "", filename=path)
+            except (SyntaxError, ValueError):
+                entry["tree"] = None
+        return entry["tree"]
+
+
+# Shared by the runner, the web controllers and function-context extraction
+source_cache = SourceCache()
+
+
 def extract_function_context(file_path: str, line: int, source: Optional[str] = None) -> Dict[str, Any]:
     """
     Extract function context for a given file and line.
@@ -25,14 +559,18 @@ def extract_function_context(file_path: str, line: int, source: Optional[str] =
         return {"name": None, "sig": None, "body": None}
     
     try:
-        # Load source if not provided
+        # Load source if not provided (parsed trees are shared through the source cache)
+        tree: Optional[ast.AST] = None
         if source is None:
-            with open(file_path, "r", encoding="utf-8") as f:
-                source = f.read()
+            source = source_cache.get_text(file_path)
+            if source is None:
+                return {"name": None, "sig": None, "body": None}
+            tree = source_cache.get_tree(file_path)
         
         # Try AST parsing first for accuracy
         try:
-            tree = ast.parse(source, filename=file_path)
+            if tree is None:
+                tree = ast.parse(source, filename=file_path)
             return _extract_function_context_ast(tree, source, line)
         except:
             # Fall back to heuristic method if AST parsing fails
@@ -198,6 +736,35 @@ def _extract_function_context_heuristic(source: str, line: int) -> Dict[str, Any
     return {"name": func_name, "sig": func_sig, "body": func_body}
 
 
+def compute_delta(curr: Dict[str, Any], prev: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Compute the nested difference between two captured variable payloads.
+    
+    Keys whose values differ are reported with the current value; keys that
+    disappeared are reported as None. Nested dicts are compared recursively.
+    
+    Args:
+        curr: Variables captured at the current step
+        prev: Variables captured at the previous step
+    
+    Returns:
+        Dictionary containing only the changed entries
+    """
+    delta: Dict[str, Any] = {}
+    keys = set(curr.keys()) | set(prev.keys())
+    for k in sorted(keys):
+        cv = curr.get(k)
+        pv = prev.get(k)
+        if isinstance(cv, dict) and isinstance(pv, dict):
+            sub = compute_delta(cv, pv)
+            if sub:
+                delta[k] = sub
+        else:
+            if cv != pv:
+                delta[k] = cv
+    return delta
+
+
 def summarize_value(value: Any, max_len: int = 120) -> str:
     """
     Summarize a value for speech output.
@@ -214,6 +781,11 @@ def summarize_value(value: Any, max_len: int = 120) -> str:
     if value is None:
         return "None"
     
+    if is_truncated(value):
+        if value.get("type") == "str":
+            return f"string with {value.get('length')} characters, truncated"
+        return f"{value.get('type')} of {value.get('length')} items, truncated"
+    
     if isinstance(value, (list, tuple)):
         type_name = "list" if isinstance(value, list) else "tuple"
         if not value:
@@ -1,11 +1,15 @@
 from __future__ import annotations
 
+import asyncio
 import json
+import queue
 import socket
 import threading
 import time
+from concurrent.futures import Future, InvalidStateError
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from dataclasses import dataclass
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 
 HEADER_SEP = b"\r\n\r\n"
@@ -53,7 +57,27 @@ class DapMessage:
     success: Optional[bool] = None
 
 
+def _to_message(msg: Dict[str, Any]) -> DapMessage:
+    return DapMessage(
+        type=msg.get("type"),
+        seq=msg.get("seq"),
+        body=msg.get("body") or {},
+        command=msg.get("command"),
+        event=msg.get("event"),
+        request_seq=msg.get("request_seq"),
+        success=msg.get("success"),
+    )
+
+
 class DapClient:
+    """Threaded DAP client.
+
+    A listener thread reads the socket with blocking ``recv`` calls. Every
+    request is registered as a ``Future`` keyed by its seq and resolved the
+    moment its response is parsed; events go onto a blocking queue. Nothing
+    polls, so waiters wake as soon as the adapter answers.
+    """
+
     def __init__(self, host: str, port: int, timeout: float = 10.0) -> None:
         self.host = host
         self.port = port
@@ -61,14 +85,25 @@ class DapClient:
         self.sock: Optional[socket.socket] = None
         self._seq = 1
         self._lock = threading.Lock()
-        self._responses: Dict[int, DapMessage] = {}
+        self._send_lock = threading.Lock()
+        # One future per outstanding request seq, resolved by the listener
+        self._futures: Dict[int, Future] = {}
+        # Futures for send_request() seqs until wait_response() claims them
+        self._unclaimed: Dict[int, Future] = {}
         self._listener: Optional[threading.Thread] = None
-        self._events: list[DapMessage] = []
+        self._events: "queue.Queue[DapMessage]" = queue.Queue()
         self._running = False
 
+    @property
+    def connected(self) -> bool:
+        return self._running
+
     def connect(self) -> None:
         s = socket.create_connection((self.host, self.port), timeout=self.timeout)
-        s.settimeout(1.0)
+        # Block in recv; close() shuts the socket down to wake the listener
+        s.settimeout(None)
+        # DAP traffic is many small request/response pairs; don't let Nagle hold them back
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         self.sock = s
         self._running = True
         self._listener = threading.Thread(target=self._listen, daemon=True)
@@ -89,18 +124,15 @@ class DapClient:
 
     def _listen(self) -> None:
         assert self.sock is not None
+        sock = self.sock
         buffer = bytearray()
         while self._running:
             try:
-                try:
-                    chunk = self.sock.recv(4096)
-                    if not chunk:
-                        # connection closed
-                        break
-                    buffer.extend(chunk)
-                except (socket.timeout, TimeoutError):
-                    # no data this tick; try to parse what we have
-                    pass
+                chunk = sock.recv(65536)
+                if not chunk:
+                    # connection closed
+                    break
+                buffer.extend(chunk)
 
                 # parse as many complete messages as available
                 while True:
@@ -130,50 +162,69 @@ class DapClient:
                         msg = json.loads(payload.decode("utf-8"))
                     except Exception:
                         continue
-                    dm = DapMessage(
-                        type=msg.get("type"),
-                        seq=msg.get("seq"),
-                        body=msg.get("body") or {},
-                        command=msg.get("command"),
-                        event=msg.get("event"),
-                        request_seq=msg.get("request_seq"),
-                        success=msg.get("success"),
-                    )
-                    if dm.type == "response" and dm.request_seq is not None:
-                        with self._lock:
-                            self._responses[dm.request_seq] = dm
-                    elif dm.type == "event":
-                        self._events.append(dm)
-                    elif dm.type == "request":
-                        # Minimal handling for reverse requests (e.g., runInTerminal)
-                        cmd = dm.command or ""
-                        if cmd == "runInTerminal":
-                            # Reply not supported to let adapter fallback
-                            self.send_response(request_seq=dm.seq, command=cmd, success=False, body={}, message="runInTerminal not supported by client")
-                        else:
-                            self.send_response(request_seq=dm.seq, command=cmd, success=False, body={}, message="Request not supported by client")
-                    # else: ignore unexpected types
+                    self._dispatch(_to_message(msg))
             except Exception:
-                if self._running:
-                    self._running = False
                 break
+        self._running = False
+        self._fail_pending(ConnectionError("DAP connection closed"))
 
-    def _send(self, payload: Dict[str, Any]) -> int:
-        assert self.sock is not None
+    def _dispatch(self, dm: DapMessage) -> None:
+        if dm.type == "response" and dm.request_seq is not None:
+            with self._lock:
+                fut = self._futures.pop(dm.request_seq, None)
+            if fut is not None and not fut.done():
+                try:
+                    fut.set_result(dm)
+                except InvalidStateError:
+                    pass  # Cancelled by a waiter that just timed out
+        elif dm.type == "event":
+            self._events.put(dm)
+        elif dm.type == "request":
+            # Minimal handling for reverse requests (e.g., runInTerminal)
+            cmd = dm.command or ""
+            if cmd == "runInTerminal":
+                # Reply not supported to let adapter fallback
+                self.send_response(request_seq=dm.seq, command=cmd, success=False, body={}, message="runInTerminal not supported by client")
+            else:
+                self.send_response(request_seq=dm.seq, command=cmd, success=False, body={}, message="Request not supported by client")
+        # else: ignore unexpected types
+
+    def _fail_pending(self, exc: BaseException) -> None:
         with self._lock:
-            seq = self._seq
-            self._seq += 1
-        payload = {"seq": seq, "type": "request", **payload}
-        raw = json.dumps(payload).encode("utf-8")
-        header = f"Content-Length: {len(raw)}\r\n\r\n".encode("utf-8")
-        self.sock.sendall(header + raw)
-        return seq
+            pending = list(self._futures.values())
+            self._futures.clear()
+        for fut in pending:
+            if not fut.done():
+                try:
+                    fut.set_exception(exc)
+                except InvalidStateError:
+                    pass
 
-    def _send_raw(self, payload: Dict[str, Any]) -> None:
+    def _write(self, data: bytes) -> None:
         assert self.sock is not None
+        with self._send_lock:
+            self.sock.sendall(data)
+
+    @staticmethod
+    def _frame(payload: Dict[str, Any]) -> bytes:
         raw = json.dumps(payload).encode("utf-8")
-        header = f"Content-Length: {len(raw)}\r\n\r\n".encode("utf-8")
-        self.sock.sendall(header + raw)
+        return f"Content-Length: {len(raw)}\r\n\r\n".encode("utf-8") + raw
+
+    def _register(self, command: str, arguments: Optional[Dict[str, Any]]) -> Tuple[int, Future, bytes]:
+        """Allocate a seq and its future; must be called with ``_lock`` held."""
+        seq = self._seq
+        self._seq += 1
+        fut: Future = Future()
+        self._futures[seq] = fut
+        # A waiter that gives up cancels the future; drop its seq so a response that never comes does not leak
+        fut.add_done_callback(lambda f, seq=seq: self._forget(seq) if f.cancelled() else None)
+        wire = self._frame({"seq": seq, "type": "request", "command": command, "arguments": arguments or {}})
+        return seq, fut, wire
+
+    def _forget(self, seq: int) -> None:
+        with self._lock:
+            self._futures.pop(seq, None)
+            self._unclaimed.pop(seq, None)
 
     def send_response(self, request_seq: int, command: str, success: bool, body: Optional[Dict[str, Any]] = None, message: Optional[str] = None) -> None:
         payload: Dict[str, Any] = {
@@ -186,32 +237,240 @@ class DapClient:
             payload["body"] = body
         if message is not None:
             payload["message"] = message
-        self._send_raw(payload)
+        self._write(self._frame(payload))
 
     def send_request(self, command: str, arguments: Optional[Dict[str, Any]] = None) -> int:
-        if arguments is None:
-            arguments = {}
-        return self._send({"command": command, "arguments": arguments})
+        with self._lock:
+            seq, fut, wire = self._register(command, arguments)
+            self._unclaimed[seq] = fut
+        self._write(wire)
+        return seq
 
     def wait_response(self, seq: int, wait: float = 10.0) -> DapMessage:
-        start = time.time()
-        while time.time() - start < wait:
-            with self._lock:
-                dm = self._responses.pop(seq, None)
-            if dm is not None:
-                return dm
-            time.sleep(0.001)  # Reduced from 10ms to 1ms for faster stepping
-        raise TimeoutError(f"Timed out waiting for DAP response seq={seq}")
+        with self._lock:
+            fut = self._unclaimed.pop(seq, None)
+        if fut is None:
+            raise KeyError(f"No outstanding DAP request seq={seq}")
+        try:
+            return fut.result(timeout=wait)
+        except FutureTimeoutError:
+            fut.cancel()
+            raise TimeoutError(f"Timed out waiting for DAP response seq={seq}") from None
 
     def request(self, command: str, arguments: Optional[Dict[str, Any]] = None, wait: float = 10.0) -> DapMessage:
-        if arguments is None:
-            arguments = {}
-        # Send once with arguments
-        assert self.sock is not None
         seq = self.send_request(command, arguments)
         return self.wait_response(seq, wait=wait)
 
+    def send_requests(self, requests: Sequence[Tuple[str, Optional[Dict[str, Any]]]]) -> List[Future]:
+        """Pipeline several requests in one write and return a Future per request.
+
+        Each future resolves to the matching response ``DapMessage`` as soon as the
+        listener reads it, so callers can fan out a whole level of ``variables``
+        requests before waiting on any of them.
+        """
+        futures: List[Future] = []
+        wire = bytearray()
+        with self._lock:
+            for command, arguments in requests:
+                _seq, fut, frame = self._register(command, arguments)
+                futures.append(fut)
+                wire += frame
+        if wire:
+            self._write(bytes(wire))
+        return futures
+
+    def request_batch(self, requests: Sequence[Tuple[str, Optional[Dict[str, Any]]]], wait: float = 10.0) -> List[DapMessage]:
+        """Send ``requests`` together and return their responses in the same order."""
+        futures = self.send_requests(requests)
+        deadline = time.monotonic() + wait
+        results: List[DapMessage] = []
+        for (command, _args), fut in zip(requests, futures):
+            try:
+                results.append(fut.result(timeout=max(0.0, deadline - time.monotonic())))
+            except FutureTimeoutError:
+                for pending in futures:
+                    pending.cancel()
+                raise TimeoutError(f"Timed out waiting for DAP batch response ({command})") from None
+        return results
+
+    def pop_events(self) -> list[DapMessage]:
+        """Drain queued events without blocking."""
+        evs: list[DapMessage] = []
+        while True:
+            try:
+                evs.append(self._events.get_nowait())
+            except queue.Empty:
+                return evs
+
+    def wait_events(self, timeout: Optional[float] = None) -> list[DapMessage]:
+        """Block until at least one event arrives (or ``timeout``), then drain the queue."""
+        try:
+            first = self._events.get(timeout=timeout)
+        except queue.Empty:
+            return []
+        return [first, *self.pop_events()]
+
+
+class AsyncDapClient:
+    """asyncio DAP client.
+
+    Mirrors ``DapClient`` on asyncio streams: a reader task resolves one
+    ``asyncio.Future`` per request seq and queues events, so a single event
+    loop can drive several debug sessions at once.
+    """
+
+    def __init__(self, host: str, port: int, timeout: float = 10.0) -> None:
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._seq = 1
+        self._futures: Dict[int, "asyncio.Future[DapMessage]"] = {}
+        self._events: "asyncio.Queue[DapMessage]" = asyncio.Queue()
+        self._listener: Optional["asyncio.Task[None]"] = None
+        self._running = False
+
+    @property
+    def connected(self) -> bool:
+        return self._running
+
+    async def connect(self) -> None:
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), timeout=self.timeout
+        )
+        sock = self._writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._running = True
+        self._listener = asyncio.ensure_future(self._listen())
+
+    async def close(self) -> None:
+        self._running = False
+        if self._writer is not None:
+            try:
+                self._writer.close()
+                await self._writer.wait_closed()
+            except Exception:
+                pass
+            self._writer = None
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._listener = None
+
+    async def _listen(self) -> None:
+        assert self._reader is not None
+        reader = self._reader
+        try:
+            while self._running:
+                header_block = await reader.readuntil(HEADER_SEP)
+                headers: Dict[str, str] = {}
+                for line in header_block[: -len(HEADER_SEP)].split(b"\r\n"):
+                    if not line:
+                        continue
+                    key, _, value = line.partition(b": ")
+                    headers[key.decode()] = value.decode()
+                payload = await reader.readexactly(int(headers.get("Content-Length", "0")))
+                try:
+                    msg = json.loads(payload.decode("utf-8"))
+                except Exception:
+                    continue
+                self._dispatch(_to_message(msg))
+        except (asyncio.IncompleteReadError, ConnectionError, OSError):
+            pass
+        finally:
+            self._running = False
+            self._fail_pending(ConnectionError("DAP connection closed"))
+
+    def _dispatch(self, dm: DapMessage) -> None:
+        if dm.type == "response" and dm.request_seq is not None:
+            fut = self._futures.pop(dm.request_seq, None)
+            if fut is not None and not fut.done():
+                fut.set_result(dm)
+        elif dm.type == "event":
+            self._events.put_nowait(dm)
+        elif dm.type == "request":
+            # Decline reverse requests (e.g., runInTerminal) so the adapter falls back
+            cmd = dm.command or ""
+            self._write(DapClient._frame({
+                "type": "response",
+                "request_seq": dm.seq,
+                "success": False,
+                "command": cmd,
+                "body": {},
+                "message": f"{cmd} not supported by client",
+            }))
+
+    def _fail_pending(self, exc: BaseException) -> None:
+        pending = list(self._futures.values())
+        self._futures.clear()
+        for fut in pending:
+            if not fut.done():
+                fut.set_exception(exc)
+
+    def _write(self, data: bytes) -> None:
+        if self._writer is None:
+            raise ConnectionError("DAP connection closed")
+        self._writer.write(data)
+
+    def _register(self, command: str, arguments: Optional[Dict[str, Any]]) -> Tuple["asyncio.Future[DapMessage]", bytes]:
+        seq = self._seq
+        self._seq += 1
+        fut: "asyncio.Future[DapMessage]" = asyncio.get_running_loop().create_future()
+        self._futures[seq] = fut
+        # wait_for cancels the future on timeout; drop its seq so a response that never comes does not leak
+        fut.add_done_callback(lambda f, seq=seq: self._futures.pop(seq, None) if f.cancelled() else None)
+        wire = DapClient._frame({"seq": seq, "type": "request", "command": command, "arguments": arguments or {}})
+        return fut, wire
+
+    async def send_request(self, command: str, arguments: Optional[Dict[str, Any]] = None) -> "asyncio.Future[DapMessage]":
+        """Send a request and return the future its response will resolve."""
+        fut, wire = self._register(command, arguments)
+        self._write(wire)
+        assert self._writer is not None
+        await self._writer.drain()
+        return fut
+
+    async def request(self, command: str, arguments: Optional[Dict[str, Any]] = None, wait: float = 10.0) -> DapMessage:
+        fut = await self.send_request(command, arguments)
+        try:
+            return await asyncio.wait_for(fut, timeout=wait)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Timed out waiting for DAP response ({command})") from None
+
+    async def request_batch(self, requests: Sequence[Tuple[str, Optional[Dict[str, Any]]]], wait: float = 10.0) -> List[DapMessage]:
+        """Send ``requests`` in one write and return their responses in the same order."""
+        futures: List["asyncio.Future[DapMessage]"] = []
+        wire = bytearray()
+        for command, arguments in requests:
+            fut, frame = self._register(command, arguments)
+            futures.append(fut)
+            wire += frame
+        if not futures:
+            return []
+        self._write(bytes(wire))
+        assert self._writer is not None
+        await self._writer.drain()
+        try:
+            return list(await asyncio.wait_for(asyncio.gather(*futures), timeout=wait))
+        except asyncio.TimeoutError:
+            raise TimeoutError("Timed out waiting for DAP batch response") from None
+
     def pop_events(self) -> list[DapMessage]:
-        evs = list(self._events)
-        self._events.clear()
+        """Drain queued events without waiting."""
+        evs: list[DapMessage] = []
+        while not self._events.empty():
+            evs.append(self._events.get_nowait())
         return evs
+
+    async def wait_events(self, timeout: Optional[float] = None) -> list[DapMessage]:
+        """Wait until at least one event arrives (or ``timeout``), then drain the queue."""
+        try:
+            first = await asyncio.wait_for(self._events.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return []
+        return [first, *self.pop_events()]
@@ -2,14 +2,271 @@ from __future__ import annotations
 
 import json
 import os
+import queue
 import sqlite3
 import gzip
 import hashlib
-from dataclasses import dataclass, asdict
-from typing import Any, Dict, Optional
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from dataclasses import dataclass, asdict, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .common import (
+    CODEC_JSON,
+    SHARDS_DIR,
+    STATE_FULL,
+    STATE_PATCH,
+    STATE_PATCH_IS_DELTA,
+    VALUE_REF_KEY,
+    StateCache,
+    compute_patch,
+    decode_scopes,
+    encode_scopes,
+    intern_scopes,
+    is_value_ref,
+    next_state,
+    reconstruct_state,
+    shard_relpath,
+)
 
 DEFAULT_DB_PATH = os.path.join(os.getcwd(), ".autodebug", "line_reports.db")
 
+# Rows the write-behind thread commits per transaction at most
+WRITE_BATCH_SIZE = 256
+_STOP_WRITER = object()
+# In-memory session counters are written back after this many seconds (and on flush/end/close)
+COUNTER_FLUSH_INTERVAL = 1.0
+# line_reports columns iter_session_reports can return, in export order
+EXPORT_COLUMNS = (
+    "id",
+    "session_id",
+    "file",
+    "line_number",
+    "code",
+    "timestamp",
+    "variables",
+    "variables_delta",
+    "stack_depth",
+    "thread_id",
+    "observations",
+    "status",
+    "error_message",
+    "error_type",
+    "stack_trace",
+    "created_at",
+    "loop_iteration",
+    "memory_usage_mb",
+    "disk_usage_increase_mb",
+)
+# Rows fetched per batch while streaming an export
+EXPORT_BATCH_SIZE = 1000
+_RESOURCE_COLUMNS = ("loop_iteration", "memory_usage_mb", "disk_usage_increase_mb")
+# Tables whose rows belong to one session, keyed by session_id (besides line_reports).
+# The dependency tables are created by schema_migrations and may be missing.
+SESSION_TABLES = (
+    "file_snapshots",
+    "globals_snapshots",
+    "line_hit_counters",
+    "loop_summaries",
+    "dependency_summaries",
+    "variable_dependencies",
+    "variable_metadata",
+    "interned_value_refs",
+    "session_summaries",
+)
+# Which sessions refer to each interned value, so deletes can drop values without decoding rows
+_VALUE_REFS_TABLE = (
+    """
+    CREATE TABLE IF NOT EXISTS interned_value_refs (
+      session_id TEXT NOT NULL,
+      hash TEXT NOT NULL,
+      PRIMARY KEY (session_id, hash)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_value_refs_hash ON interned_value_refs(hash)",
+)
+# Pages released per incremental_vacuum transaction
+VACUUM_CHUNK_PAGES = 2048
+# Session databases a store keeps open at once under the sharded layout
+MAX_OPEN_SHARDS = 32
+
+_INSERT_LINE_REPORT = """
+    INSERT INTO line_reports(
+      session_id,file,line_number,code,timestamp,
+      variables,variables_delta,stack_depth,thread_id,observations,
+      status,error_message,error_type,stack_trace,
+      loop_iteration,memory_usage_mb,disk_usage_increase_mb,variables_codec,state_encoding
+    ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+"""
+
+# Normalized layout (new databases, or `autodebug migrate --normalize`): a narrow
+# steps table of integer ids, the wide columns in step_payloads, and line_reports
+# as a view with the columns of the original table.
+STEP_STATUSES = ("success", "error", "warning")  # steps.status is the index
+_STEP_TABLES = (
+    """
+    CREATE TABLE IF NOT EXISTS sessions (
+      id INTEGER PRIMARY KEY,
+      session_id TEXT NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS files (
+      id INTEGER PRIMARY KEY,
+      path TEXT NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS source_lines (
+      id INTEGER PRIMARY KEY,
+      code TEXT NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS steps (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      session_key INTEGER NOT NULL,
+      file_id INTEGER NOT NULL,
+      line_number INTEGER NOT NULL,
+      code_id INTEGER NOT NULL,
+      ts_ns INTEGER NOT NULL,
+      stack_depth INTEGER,
+      thread_id INTEGER,
+      status INTEGER NOT NULL DEFAULT 0,
+      loop_iteration INTEGER,
+      memory_usage_mb REAL,
+      disk_usage_increase_mb REAL,
+      state_encoding INTEGER
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_steps_session ON steps(session_key)",
+    "CREATE INDEX IF NOT EXISTS idx_steps_file_line ON steps(file_id, line_number)",
+    "CREATE INDEX IF NOT EXISTS idx_steps_code ON steps(code_id)",
+    """
+    CREATE TABLE IF NOT EXISTS step_payloads (
+      step_id INTEGER PRIMARY KEY,
+      variables,
+      variables_delta,
+      variables_codec INTEGER,
+      observations TEXT,
+      error_message TEXT,
+      error_type TEXT,
+      stack_trace TEXT
+    )
+    """,
+)
+# ISO-8601 text (as written by the engines) -> integer ns since the epoch, in SQL
+_TS_NS_SQL = (
+    "COALESCE(CAST(strftime('%s', {col}) AS INTEGER), 0) * 1000000000"
+    " + CASE WHEN substr({col}, 20, 1) = '.' THEN CAST(substr({col}, 21, 6) AS INTEGER) * 1000 ELSE 0 END"
+)
+_STATUS_SQL = "CASE {col} WHEN 'error' THEN 1 WHEN 'warning' THEN 2 ELSE 0 END"
+_LINE_REPORTS_VIEW = (
+    """
+    CREATE VIEW IF NOT EXISTS line_reports AS
+    SELECT
+      st.id AS id,
+      se.session_id AS session_id,
+      f.path AS file,
+      st.line_number AS line_number,
+      sl.code AS code,
+      strftime('%Y-%m-%dT%H:%M:%S', st.ts_ns / 1000000000, 'unixepoch')
+        || printf('.%06d+00:00', (st.ts_ns / 1000) % 1000000) AS timestamp,
+      p.variables AS variables,
+      p.variables_delta AS variables_delta,
+      st.stack_depth AS stack_depth,
+      st.thread_id AS thread_id,
+      p.observations AS observations,
+      CASE st.status WHEN 1 THEN 'error' WHEN 2 THEN 'warning' ELSE 'success' END AS status,
+      p.error_message AS error_message,
+      p.error_type AS error_type,
+      p.stack_trace AS stack_trace,
+      strftime('%Y-%m-%d %H:%M:%S', st.ts_ns / 1000000000, 'unixepoch') AS created_at,
+      st.loop_iteration AS loop_iteration,
+      st.memory_usage_mb AS memory_usage_mb,
+      st.disk_usage_increase_mb AS disk_usage_increase_mb,
+      p.variables_codec AS variables_codec,
+      st.state_encoding AS state_encoding
+    FROM steps st
+    JOIN sessions se ON se.id = st.session_key
+    JOIN files f ON f.id = st.file_id
+    JOIN source_lines sl ON sl.id = st.code_id
+    LEFT JOIN step_payloads p ON p.step_id = st.id
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS line_reports_insert INSTEAD OF INSERT ON line_reports
+    BEGIN
+      INSERT OR IGNORE INTO sessions(session_id) VALUES (NEW.session_id);
+      INSERT OR IGNORE INTO files(path) VALUES (NEW.file);
+      INSERT OR IGNORE INTO source_lines(code) VALUES (NEW.code);
+      INSERT INTO steps(
+        session_key, file_id, line_number, code_id, ts_ns, stack_depth, thread_id, status,
+        loop_iteration, memory_usage_mb, disk_usage_increase_mb, state_encoding
+      ) VALUES (
+        (SELECT id FROM sessions WHERE session_id = NEW.session_id),
+        (SELECT id FROM files WHERE path = NEW.file),
+        NEW.line_number,
+        (SELECT id FROM source_lines WHERE code = NEW.code),
+        """ + _TS_NS_SQL.format(col="NEW.timestamp") + """,
+        NEW.stack_depth, NEW.thread_id, """ + _STATUS_SQL.format(col="NEW.status") + """,
+        NEW.loop_iteration, NEW.memory_usage_mb, NEW.disk_usage_increase_mb, NEW.state_encoding
+      );
+      INSERT INTO step_payloads(
+        step_id, variables, variables_delta, variables_codec, observations, error_message, error_type, stack_trace
+      ) VALUES (
+        last_insert_rowid(), NEW.variables, NEW.variables_delta, NEW.variables_codec,
+        NEW.observations, NEW.error_message, NEW.error_type, NEW.stack_trace
+      );
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS line_reports_update INSTEAD OF UPDATE ON line_reports
+    BEGIN
+      UPDATE step_payloads SET
+        variables = NEW.variables,
+        variables_delta = NEW.variables_delta,
+        variables_codec = NEW.variables_codec,
+        observations = NEW.observations,
+        error_message = NEW.error_message,
+        error_type = NEW.error_type,
+        stack_trace = NEW.stack_trace
+      WHERE step_id = OLD.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS line_reports_delete INSTEAD OF DELETE ON line_reports
+    BEGIN
+      DELETE FROM step_payloads WHERE step_id = OLD.id;
+      DELETE FROM steps WHERE id = OLD.id;
+    END
+    """,
+)
+_INSERT_STEP = """
+    INSERT INTO steps(
+      session_key,file_id,line_number,code_id,ts_ns,stack_depth,thread_id,status,
+      loop_iteration,memory_usage_mb,disk_usage_increase_mb,state_encoding
+    ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
+"""
+_INSERT_STEP_PAYLOAD = """
+    INSERT INTO step_payloads(
+      step_id,variables,variables_delta,variables_codec,observations,error_message,error_type,stack_trace
+    ) VALUES (?,?,?,?,?,?,?,?)
+"""
+
+
+def timestamp_ns(timestamp: str) -> int:
+    """Integer ns since the epoch for an ISO-8601 timestamp; naive times are taken as UTC."""
+    try:
+        dt = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return time.time_ns()
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    delta = dt - datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return (delta.days * 86400 + delta.seconds) * 1_000_000_000 + delta.microseconds * 1000
+
 
 @dataclass
 class LineReport:
@@ -33,6 +290,25 @@ class LineReport:
     disk_usage_increase_mb: Optional[float] = None  # Disk usage increase since start in MB
 
 
+@dataclass
+class LoopSummary:
+    """Aggregate of the loop iterations collapsed by ``--summarize-loops-after``."""
+    session_id: str
+    file: str
+    line_number: int  # Loop header line
+    first_iteration: int  # First summarized iteration (1-based)
+    iterations: int = 0
+    rows: int = 0  # Line stops folded into this summary
+    first_timestamp: Optional[str] = None
+    last_timestamp: Optional[str] = None
+    # scope -> variable -> {"min", "max", "first", "last"} for numeric variables
+    variables: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def last_iteration(self) -> int:
+        return self.first_iteration + self.iterations - 1
+
+
 @dataclass
 class SessionSummary:
     session_id: str
@@ -50,60 +326,123 @@ class SessionSummary:
     git_dirty: int = 0
 
 
+def _collect_value_refs(value: Any, refs: Set[str]) -> None:
+    """Add the interned value hashes referenced anywhere in a decoded ``variables`` value."""
+    if is_value_ref(value):
+        refs.add(value[VALUE_REF_KEY])
+    elif isinstance(value, dict):
+        for v in value.values():
+            _collect_value_refs(v, refs)
+    elif isinstance(value, list):
+        for v in value:
+            _collect_value_refs(v, refs)
+
+
 class LineReportStore:
     def __init__(self, db_path: Optional[str] = None) -> None:
         self.db_path = db_path or DEFAULT_DB_PATH
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
         self.conn: Optional[sqlite3.Connection] = None
+        # Write-behind state (see start_write_behind)
+        self._write_queue: Optional["queue.Queue[Any]"] = None
+        self._writer: Optional[threading.Thread] = None
+        self._write_error: Optional[BaseException] = None
+        # session_id -> [lines, successful, errors] not yet added to session_summaries
+        self._pending_counts: Dict[str, List[int]] = {}
+        self._counts_flushed_at = time.monotonic()
+        # Store large variables once in interned_values and reference them by hash
+        self.intern_values = False
+        # (session_id, hash) pairs known to be in interned_value_refs (and their values in interned_values)
+        self._known_refs: Set[Tuple[str, str]] = set()
+        # Encoding of variables/variables_delta for new rows (see common.encode_scopes)
+        self.value_codec = CODEC_JSON
+        # Full variables every N rows of a session, patches in between (None: every row is full)
+        self.keyframe_interval: Optional[int] = None
+        # session_id -> (state of the last row written, rows written since its keyframe)
+        self._last_states: Dict[str, Tuple[Dict[str, Any], int]] = {}
+        self._states = StateCache()
+        # True when line_reports is the view over steps/step_payloads (new databases)
+        self.normalized = False
+        # (session_id, table, value) -> id in sessions/files/source_lines. Kept per session:
+        # delete_sessions prunes files/source_lines rows no step uses any more, so a session
+        # looks each key up again before its first step that uses it
+        self._step_ids: Dict[Tuple[str, str, str], int] = {}
+        # Give each new session its own database file (see _shard); this one keeps the summaries
+        self.shard_sessions = False
+        # session_id -> shard_path from session_summaries (None: the session lives in this file)
+        self._shard_paths: Dict[str, Optional[str]] = {}
+        self._shards: "OrderedDict[str, LineReportStore]" = OrderedDict()
+        self._write_behind_pending: Optional[int] = None
 
     def open(self) -> None:
         self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        # Takes effect for new databases; older ones are switched by incremental_vacuum(convert=True)
+        self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL;")
         self.conn.execute("PRAGMA journal_mode=WAL;")
         self._create_tables()
         self._ensure_delta_column()
         self._ensure_git_columns()
         self._ensure_resource_columns()
+        self._ensure_codec_column()
+        self._ensure_shard_column()
+        self._ensure_source_blobs()
+        self._ensure_value_refs()
 
     def close(self) -> None:
-        if self.conn is not None:
-            self.conn.close()
-            self.conn = None
+        try:
+            self.stop_write_behind()
+            self.flush()
+        finally:
+            while self._shards:
+                self._close_shard(*self._shards.popitem(last=False))
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
 
     def _create_tables(self) -> None:
         assert self.conn is not None
         cur = self.conn.cursor()
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS line_reports (
-              id INTEGER PRIMARY KEY AUTOINCREMENT,
-              session_id TEXT NOT NULL,
-              file TEXT NOT NULL,
-              line_number INTEGER NOT NULL,
-              code TEXT NOT NULL,
-              timestamp TEXT NOT NULL,
-              variables TEXT,
-              variables_delta TEXT,
-              stack_depth INTEGER,
-              thread_id INTEGER,
-              observations TEXT,
-              status TEXT CHECK(status IN ('success','error','warning')),
-              error_message TEXT,
-              error_type TEXT,
-              stack_trace TEXT,
-              created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            );
-            """
-        )
-        cur.execute(
-            """
-            CREATE INDEX IF NOT EXISTS idx_session_id ON line_reports(session_id);
-            """
-        )
-        cur.execute(
-            """
-            CREATE INDEX IF NOT EXISTS idx_file_line ON line_reports(file, line_number);
-            """
-        )
+        cur.execute("SELECT type FROM sqlite_master WHERE name='line_reports'")
+        existing = cur.fetchone()
+        # Databases created before the steps table keep line_reports as a table
+        # until `autodebug migrate --normalize`
+        self.normalized = existing is None or existing[0] == "view"
+        if self.normalized:
+            for statement in _STEP_TABLES + _LINE_REPORTS_VIEW:
+                cur.execute(statement)
+        else:
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS line_reports (
+                  id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  session_id TEXT NOT NULL,
+                  file TEXT NOT NULL,
+                  line_number INTEGER NOT NULL,
+                  code TEXT NOT NULL,
+                  timestamp TEXT NOT NULL,
+                  variables TEXT,
+                  variables_delta TEXT,
+                  stack_depth INTEGER,
+                  thread_id INTEGER,
+                  observations TEXT,
+                  status TEXT CHECK(status IN ('success','error','warning')),
+                  error_message TEXT,
+                  error_type TEXT,
+                  stack_trace TEXT,
+                  created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                );
+                """
+            )
+            cur.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_session_id ON line_reports(session_id);
+                """
+            )
+            cur.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_file_line ON line_reports(file, line_number);
+                """
+            )
         cur.execute(
             """
             CREATE TABLE IF NOT EXISTS session_summaries (
@@ -119,6 +458,7 @@ class LineReportStore:
               git_root TEXT,
               git_commit TEXT,
               git_dirty INTEGER DEFAULT 0,
+              shard_path TEXT,
               created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
               updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
             );
@@ -131,17 +471,101 @@ class LineReportStore:
               session_id TEXT NOT NULL,
               file TEXT NOT NULL,
               sha256 TEXT NOT NULL,
-              content_gzip BLOB NOT NULL,
               created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
               PRIMARY KEY (session_id, file)
             );
             """
         )
+        # Snapshot contents, shared by every session that ran the same source
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS source_blobs (
+              sha256 TEXT PRIMARY KEY,
+              content_gzip BLOB NOT NULL,
+              created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            );
+            """
+        )
         cur.execute(
             """
             CREATE INDEX IF NOT EXISTS idx_snapshots_session ON file_snapshots(session_id);
             """
         )
+        # Module globals captured once per module (--scopes locals+changed-globals);
+        # later line reports only carry the globals that changed
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS globals_snapshots (
+              id INTEGER PRIMARY KEY AUTOINCREMENT,
+              session_id TEXT NOT NULL,
+              file TEXT NOT NULL,
+              timestamp TEXT NOT NULL,
+              variables TEXT,
+              created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            );
+            """
+        )
+        cur.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_globals_session ON globals_snapshots(session_id, file);
+            """
+        )
+        # Variable values shared by reference from line_reports rows (--intern-values)
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS interned_values (
+              hash TEXT PRIMARY KEY,
+              encoded TEXT NOT NULL
+            );
+            """
+        )
+        # Loop iterations collapsed by --summarize-loops-after
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS loop_summaries (
+              id INTEGER PRIMARY KEY AUTOINCREMENT,
+              session_id TEXT NOT NULL,
+              file TEXT NOT NULL,
+              line_number INTEGER NOT NULL,
+              first_iteration INTEGER NOT NULL,
+              last_iteration INTEGER NOT NULL,
+              iterations INTEGER NOT NULL,
+              rows INTEGER NOT NULL,
+              first_timestamp TEXT,
+              last_timestamp TEXT,
+              variables TEXT,
+              created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            );
+            """
+        )
+        cur.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_loop_summaries_session ON loop_summaries(session_id, file, line_number);
+            """
+        )
+        # Executable line numbers per source content (see executable_lines.py)
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS executable_lines (
+              sha256 TEXT PRIMARY KEY,
+              lines TEXT NOT NULL
+            );
+            """
+        )
+        # Hits beyond --max-hits-per-line, aggregated per line instead of stored as rows
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS line_hit_counters (
+              session_id TEXT NOT NULL,
+              file TEXT NOT NULL,
+              line_number INTEGER NOT NULL,
+              hits INTEGER NOT NULL DEFAULT 0,
+              first_timestamp TEXT,
+              last_timestamp TEXT,
+              PRIMARY KEY (session_id, file, line_number)
+            );
+            """
+        )
         self.conn.commit()
 
     def _ensure_delta_column(self) -> None:
@@ -197,16 +621,198 @@ class LineReportStore:
         if to_add:
             self.conn.commit()
 
+    def _ensure_codec_column(self) -> None:
+        """Ensure line_reports records how each row's variables are encoded."""
+        assert self.conn is not None
+        cur = self.conn.cursor()
+        cur.execute("PRAGMA table_info(line_reports)")
+        cols = [r[1] for r in cur.fetchall()]
+        to_add = [name for name in ("variables_codec", "state_encoding") if name not in cols]
+        for name in to_add:
+            try:
+                cur.execute(f"ALTER TABLE line_reports ADD COLUMN {name} INTEGER")
+            except sqlite3.OperationalError:
+                pass
+        if to_add:
+            self.conn.commit()
+
+    def _ensure_shard_column(self) -> None:
+        """Ensure session_summaries can point a session at its own database file."""
+        assert self.conn is not None
+        cur = self.conn.cursor()
+        cur.execute("PRAGMA table_info(session_summaries)")
+        if "shard_path" not in [r[1] for r in cur.fetchall()]:
+            try:
+                cur.execute("ALTER TABLE session_summaries ADD COLUMN shard_path TEXT")
+                self.conn.commit()
+            except sqlite3.OperationalError:
+                pass
+
+    def _shard(self, session_id: str) -> Optional["LineReportStore"]:
+        """Store for a session kept in its own database file, or None if it lives in this one.
+
+        Under the sharded layout this database is the catalog: it holds the
+        session_summaries row, whose ``shard_path`` (relative to this file's
+        directory) names a database with the same schema holding the
+        session's rows, snapshots and its own copy of the summary.
+        """
+        if session_id not in self._shard_paths:
+            assert self.conn is not None
+            row = self.conn.execute("SELECT shard_path FROM session_summaries WHERE session_id=?", (session_id,)).fetchone()
+            if row is None:
+                return None
+            self._shard_paths[session_id] = row[0]
+        relpath = self._shard_paths[session_id]
+        if not relpath:
+            return None
+        shard = self._shards.get(session_id)
+        if shard is None:
+            shard = LineReportStore(os.path.join(os.path.dirname(os.path.abspath(self.db_path)), relpath))
+            shard.open()
+            if self._write_behind_pending is not None:
+                shard.start_write_behind(self._write_behind_pending)
+            self._shards[session_id] = shard
+            while len(self._shards) > MAX_OPEN_SHARDS:
+                self._close_shard(*self._shards.popitem(last=False))
+        else:
+            self._shards.move_to_end(session_id)
+        shard.intern_values = self.intern_values
+        shard.value_codec = self.value_codec
+        shard.keyframe_interval = self.keyframe_interval
+        return shard
+
+    def _sync_shard_counters(self, session_id: str, shard: "LineReportStore", commit: bool = True) -> None:
+        """Copy a sharded session's line counters from its own summary row into the catalog."""
+        assert self.conn is not None and shard.conn is not None
+        shard.flush()
+        counts = shard.conn.execute(
+            "SELECT total_lines_executed, successful_lines, lines_with_errors, total_crashes "
+            "FROM session_summaries WHERE session_id=?",
+            (session_id,),
+        ).fetchone()
+        if counts is not None:
+            self.conn.execute(
+                "UPDATE session_summaries SET total_lines_executed=?, successful_lines=?, lines_with_errors=?, "
+                "total_crashes=? WHERE session_id=?",
+                (*counts, session_id),
+            )
+            if commit:
+                self.conn.commit()
+
+    def _close_shard(self, session_id: str, shard: "LineReportStore") -> None:
+        """Close a session's store; rows written after end_session still reach the catalog counters."""
+        try:
+            if self.conn is not None and shard.conn is not None:
+                self._sync_shard_counters(session_id, shard)
+        finally:
+            shard.close()
+
+    def session_conn(self, session_id: str) -> sqlite3.Connection:
+        """Connection holding a session's line_reports (and its session_summaries row)."""
+        shard = self._shard(session_id)
+        if shard is not None:
+            assert shard.conn is not None
+            return shard.conn
+        assert self.conn is not None
+        return self.conn
+
+    def _shard_files(self) -> List[str]:
+        """Database files of the sharded sessions in this catalog, with their -wal/-shm files."""
+        assert self.conn is not None
+        base = os.path.dirname(os.path.abspath(self.db_path))
+        rows = self.conn.execute("SELECT shard_path FROM session_summaries WHERE shard_path IS NOT NULL").fetchall()
+        return [
+            path
+            for (relpath,) in rows
+            for path in (os.path.join(base, relpath + suffix) for suffix in ("", "-wal", "-shm"))
+            if os.path.exists(path)
+        ]
+
+    def _ensure_source_blobs(self) -> None:
+        """Move snapshot contents of older databases out of file_snapshots into source_blobs."""
+        assert self.conn is not None
+        cur = self.conn.cursor()
+        cur.execute("PRAGMA table_info(file_snapshots)")
+        if "content_gzip" not in [r[1] for r in cur.fetchall()]:
+            return
+        try:
+            cur.execute("BEGIN IMMEDIATE")
+            # Another process may have migrated while we waited for the lock
+            cur.execute("PRAGMA table_info(file_snapshots)")
+            if "content_gzip" in [r[1] for r in cur.fetchall()]:
+                cur.execute(
+                    "INSERT OR IGNORE INTO source_blobs(sha256, content_gzip) SELECT sha256, content_gzip FROM file_snapshots"
+                )
+                cur.execute(
+                    """
+                    CREATE TABLE file_snapshots_v2 (
+                      session_id TEXT NOT NULL,
+                      file TEXT NOT NULL,
+                      sha256 TEXT NOT NULL,
+                      created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                      PRIMARY KEY (session_id, file)
+                    )
+                    """
+                )
+                cur.execute(
+                    "INSERT INTO file_snapshots_v2(session_id, file, sha256, created_at) "
+                    "SELECT session_id, file, sha256, created_at FROM file_snapshots"
+                )
+                cur.execute("DROP TABLE file_snapshots")
+                cur.execute("ALTER TABLE file_snapshots_v2 RENAME TO file_snapshots")
+                cur.execute("CREATE INDEX IF NOT EXISTS idx_snapshots_session ON file_snapshots(session_id)")
+            self.conn.commit()
+        except sqlite3.OperationalError:
+            self.conn.rollback()
+
+    def _ensure_value_refs(self) -> None:
+        """Create interned_value_refs; in older databases, fill it from the stored rows once.
+
+        A row that cannot be decoded (e.g. zstd without zstandard installed)
+        counts as referring to every stored value, so none is dropped for it.
+        """
+        assert self.conn is not None
+        cur = self.conn.cursor()
+        cur.execute("SELECT 1 FROM sqlite_master WHERE name='interned_value_refs'")
+        if cur.fetchone() is not None:
+            return
+        try:
+            cur.execute("BEGIN IMMEDIATE")
+            # Another process may have created it while we waited for the lock
+            cur.execute("SELECT 1 FROM sqlite_master WHERE name='interned_value_refs'")
+            if cur.fetchone() is None:
+                for statement in _VALUE_REFS_TABLE:
+                    cur.execute(statement)
+                if cur.execute("SELECT 1 FROM interned_values LIMIT 1").fetchone() is not None:
+                    refs: Set[Tuple[str, str]] = set()
+                    rows = self.conn.execute("SELECT session_id, variables, variables_delta, variables_codec FROM line_reports")
+                    for session_id, variables, delta, codec in rows:
+                        for raw in (variables, delta):
+                            if raw is None or (not codec and isinstance(raw, str) and VALUE_REF_KEY not in raw):
+                                continue
+                            hashes: Set[str] = set()
+                            try:
+                                _collect_value_refs(decode_scopes(raw, codec), hashes)
+                            except Exception:
+                                hashes = {h for (h,) in self.conn.execute("SELECT hash FROM interned_values")}
+                            refs.update((session_id, h) for h in hashes)
+                    cur.executemany("INSERT OR IGNORE INTO interned_value_refs(session_id, hash) VALUES (?,?)", sorted(refs))
+            self.conn.commit()
+        except sqlite3.OperationalError:
+            self.conn.rollback()
+
     def create_session(self, summary: SessionSummary) -> None:
+        """Record a new session; with ``shard_sessions``, its rows go to a database file of its own."""
         assert self.conn is not None
+        shard_path = shard_relpath(summary.session_id) if self.shard_sessions else None
         cur = self.conn.cursor()
         cur.execute(
             """
             INSERT OR REPLACE INTO session_summaries(
               session_id, file, language, start_time, end_time,
               total_lines_executed, successful_lines, lines_with_errors, total_crashes,
-              git_root, git_commit, git_dirty
-            ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
+              git_root, git_commit, git_dirty, shard_path
+            ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)
             """,
             (
                 summary.session_id,
@@ -221,13 +827,112 @@ class LineReportStore:
                 summary.git_root,
                 summary.git_commit,
                 int(summary.git_dirty or 0),
+                shard_path,
             ),
         )
         self.conn.commit()
+        self._shard_paths[summary.session_id] = shard_path
+        shard = self._shard(summary.session_id)
+        if shard is not None:
+            shard.create_session(summary)
+
+    def start_write_behind(self, max_pending: int = 1024) -> None:
+        """Queue line reports and loop summaries for a dedicated writer thread.
+
+        ``add_line_report``/``add_loop_summary`` then return as soon as the row is
+        queued; they block while ``max_pending`` rows are waiting (backpressure).
+        The thread commits whatever has accumulated, up to WRITE_BATCH_SIZE rows,
+        in one transaction on its own connection. ``flush``, ``end_session`` and
+        ``close`` wait until every queued row is committed.
+        """
+        self._write_behind_pending = max_pending
+        for shard in self._shards.values():
+            shard.start_write_behind(max_pending)
+        if self._writer is not None:
+            return
+        self._write_error = None
+        self._write_queue = queue.Queue(maxsize=max(1, max_pending))
+        self._writer = threading.Thread(
+            target=self._write_loop, args=(self._write_queue,), name="autodebug-db-writer", daemon=True
+        )
+        self._writer.start()
+
+    def flush(self) -> None:
+        """Commit buffered session counters and wait until queued rows are committed.
+
+        Re-raises the writer thread's error, if any.
+        """
+        for shard in self._shards.values():
+            shard.flush()
+        if self._write_queue is not None:
+            self._write_queue.join()
+        if self._pending_counts and self.conn is not None:
+            self._update_counters(self.conn.cursor(), self._pending_counts)
+            self.conn.commit()
+            self._counts_flushed_at = time.monotonic()
+        if self._write_error is not None:
+            error, self._write_error = self._write_error, None
+            raise error
+
+    def stop_write_behind(self) -> None:
+        """Commit what is still queued and stop the writer thread."""
+        self._write_behind_pending = None
+        for shard in self._shards.values():
+            shard.stop_write_behind()
+        if self._writer is None or self._write_queue is None:
+            return
+        self._write_queue.put(_STOP_WRITER)
+        self._writer.join()
+        self._writer = None
+        self._write_queue = None
+        self.flush()
+
+    def _write_loop(self, pending: "queue.Queue[Any]") -> None:
+        conn = sqlite3.connect(self.db_path)
+        try:
+            stop = False
+            while not stop:
+                batch = [pending.get()]
+                while len(batch) < WRITE_BATCH_SIZE:
+                    try:
+                        batch.append(pending.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = batch[-1] is _STOP_WRITER
+                reports = [item for item in batch if isinstance(item, LineReport)]
+                try:
+                    cur = conn.cursor()
+                    if reports:
+                        self._insert_line_reports(cur, reports)
+                        counts: Dict[str, List[int]] = {}
+                        self._tally(reports, counts)
+                        self._update_counters(cur, counts)
+                    for item in batch:
+                        if isinstance(item, LoopSummary):
+                            self._insert_loop_summary(cur, item)
+                    conn.commit()
+                except Exception as e:
+                    # Surfaced by the next flush; keep draining so producers never block forever
+                    conn.rollback()
+                    self._known_refs.clear()
+                    # Rows after a lost one must not patch against it
+                    self._last_states.clear()
+                    self._step_ids.clear()
+                    self._write_error = e
+                finally:
+                    for _ in batch:
+                        pending.task_done()
+        finally:
+            conn.close()
 
     def end_session(self, session_id: str, end_time: str) -> None:
         assert self.conn is not None
+        self.flush()
         cur = self.conn.cursor()
+        shard = self._shard(session_id)
+        if shard is not None:
+            shard.end_session(session_id, end_time)
+            self._sync_shard_counters(session_id, shard, commit=False)
         cur.execute(
             """
             UPDATE session_summaries
@@ -238,73 +943,506 @@ class LineReportStore:
         )
         self.conn.commit()
 
-    def add_line_report(self, report: LineReport) -> int:
+    def add_line_report(self, report: LineReport) -> Optional[int]:
+        """Insert one row; returns its id, or None when it was queued for the writer thread."""
+        shard = self._shard(report.session_id)
+        if shard is not None:
+            return shard.add_line_report(report)
+        if self._write_queue is not None:
+            self._write_queue.put(report)
+            return None
         assert self.conn is not None
         cur = self.conn.cursor()
+        last_id = self._insert_line_reports(cur, [report])
+        # Summary counters are kept in memory and written back periodically
+        self._tally([report], self._pending_counts)
+        if time.monotonic() - self._counts_flushed_at >= COUNTER_FLUSH_INTERVAL:
+            self._update_counters(cur, self._pending_counts)
+            self._counts_flushed_at = time.monotonic()
+        self.conn.commit()
+        return int(last_id)
+
+    def add_line_reports(self, reports: Iterable[LineReport]) -> int:
+        """Insert many rows in one transaction (one ``executemany``); returns how many.
+
+        Under the sharded layout the rows of one call must belong to one session.
+        """
+        reports = list(reports)
+        shard = self._shard(reports[0].session_id) if reports else None
+        if shard is not None:
+            return shard.add_line_reports(reports)
+        if self._write_queue is not None:
+            for report in reports:
+                self._write_queue.put(report)
+            return len(reports)
+        assert self.conn is not None
+        if not reports:
+            return 0
+        cur = self.conn.cursor()
+        self._insert_line_reports(cur, reports)
+        self._tally(reports, self._pending_counts)
+        self._update_counters(cur, self._pending_counts)
+        self._counts_flushed_at = time.monotonic()
+        self.conn.commit()
+        return len(reports)
+
+    def _insert_line_reports(self, cur: sqlite3.Cursor, reports: List[LineReport]) -> Optional[int]:
+        """Insert rows (and their interned values); returns the id of the last one."""
+        new_values: Dict[str, str] = {}
+        refs: Set[Tuple[str, str]] = set()
+        rows = []
+        for report in reports:
+            row_values: Dict[str, str] = {}
+            rows.append(self._line_report_row(report, row_values))
+            if row_values:
+                new_values.update(row_values)
+                refs.update((report.session_id, h) for h in row_values)
+        self._insert_values(cur, new_values, refs)
+        if self.normalized:
+            return self._insert_steps(cur, rows)
+        if len(rows) == 1:
+            cur.execute(_INSERT_LINE_REPORT, rows[0])
+        else:
+            cur.executemany(_INSERT_LINE_REPORT, rows)
+        return cur.lastrowid
+
+    def _insert_steps(self, cur: sqlite3.Cursor, rows: List[Tuple[Any, ...]]) -> Optional[int]:
+        """Write ``_line_report_row`` tuples to steps/step_payloads; returns the last step id."""
+        payloads = []
+        step_id = None
+        for row in rows:
+            cur.execute(
+                _INSERT_STEP,
+                (
+                    self._step_key(cur, row[0], "sessions", "session_id", row[0]),
+                    self._step_key(cur, row[0], "files", "path", row[1]),
+                    row[2],
+                    self._step_key(cur, row[0], "source_lines", "code", row[3]),
+                    timestamp_ns(row[4]),
+                    row[7],
+                    row[8],
+                    STEP_STATUSES.index(row[10]),
+                    row[14],
+                    row[15],
+                    row[16],
+                    row[18],
+                ),
+            )
+            step_id = cur.lastrowid
+            payloads.append((step_id, row[5], row[6], row[17], row[9], row[11], row[12], row[13]))
+        cur.executemany(_INSERT_STEP_PAYLOAD, payloads)
+        return step_id
+
+    def _step_key(self, cur: sqlite3.Cursor, session_id: str, table: str, column: str, value: str) -> int:
+        """Id of ``value`` in an interned table of the normalized layout, inserting it if new."""
+        key = self._step_ids.get((session_id, table, value))
+        if key is None:
+            cur.execute(f"INSERT OR IGNORE INTO {table}({column}) VALUES (?)", (value,))
+            cur.execute(f"SELECT id FROM {table} WHERE {column} = ?", (value,))
+            key = self._step_ids[(session_id, table, value)] = int(cur.fetchone()[0])
+        return key
+
+    def _insert_values(self, cur: sqlite3.Cursor, new_values: Dict[str, str], refs: Set[Tuple[str, str]]) -> None:
+        # A session's first reference to a value (re)writes the value with it, so
+        # a capture never counts on a value that a concurrent gc has just dropped
+        fresh_refs = sorted(refs - self._known_refs)
+        if fresh_refs:
+            cur.executemany(
+                "INSERT OR IGNORE INTO interned_values(hash, encoded) VALUES (?,?)",
+                sorted({(h, new_values[h]) for _, h in fresh_refs}),
+            )
+            cur.executemany("INSERT OR IGNORE INTO interned_value_refs(session_id, hash) VALUES (?,?)", fresh_refs)
+            self._known_refs.update(fresh_refs)
+
+    def _line_report_row(self, report: LineReport, new_values: Dict[str, str]) -> Tuple[Any, ...]:
+        variables = report.variables or {}
+        delta = report.variables_delta or {}
+        encoding = STATE_FULL
+        if self.keyframe_interval:
+            variables, encoding = self._state_payload(report.session_id, variables, delta)
+        if self.intern_values:
+            variables = intern_scopes(variables, new_values)
+            delta = intern_scopes(delta, new_values)
+        return (
+            report.session_id,
+            report.file,
+            report.line_number,
+            report.code,
+            report.timestamp,
+            encode_scopes(variables, self.value_codec),
+            encode_scopes(delta, self.value_codec),
+            report.stack_depth,
+            report.thread_id,
+            report.observations,
+            report.status,
+            report.error_message,
+            report.error_type,
+            report.stack_trace,
+            report.loop_iteration,
+            report.memory_usage_mb,
+            report.disk_usage_increase_mb,
+            self.value_codec,
+            encoding,
+        )
+
+    def _state_payload(self, session_id: str, variables: Dict[str, Any], delta: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+        """What to store in the variables column under ``keyframe_interval``, and its state_encoding."""
+        last = self._last_states.get(session_id)
+        if last is None or last[1] + 1 >= (self.keyframe_interval or 1):
+            self._last_states[session_id] = (variables, 0)
+            return variables, STATE_FULL
+        self._last_states[session_id] = (variables, last[1] + 1)
+        patch = compute_patch(variables, last[0])
+        if patch == delta:
+            return {}, STATE_PATCH_IS_DELTA
+        return patch, STATE_PATCH
+
+    def get_state_at(self, session_id: str, step_id: int) -> Optional[Dict[str, Any]]:
+        """Variables of line report ``step_id`` (its id), whether stored in full or as a patch.
+
+        Patched rows are replayed from the nearest keyframe or recently
+        reconstructed row. The result is cached; do not modify it. Returns
+        None when the session has no such row.
+        """
+        shard = self._shard(session_id)
+        if shard is not None:
+            return shard.get_state_at(session_id, step_id)
+        assert self.conn is not None
+        return self._states.get(self.conn, session_id, step_id)
+
+    def recode_line_reports(self, codec: int, session_id: Optional[str] = None, batch_size: int = 1000) -> int:
+        """Re-encode stored variables/variables_delta under ``codec`` in place.
+
+        Covers one session, or every session when ``session_id`` is None. Rows
+        already in ``codec`` are skipped; each batch is committed on its own.
+        Returns the number of rows rewritten.
+        """
+        assert self.conn is not None
+        self.flush()
+        recoded = 0
+        if session_id is None:
+            # Sharded sessions first, then the rows kept in this file
+            for (sid,) in self.conn.execute("SELECT session_id FROM session_summaries WHERE shard_path IS NOT NULL").fetchall():
+                shard = self._shard(sid)
+                if shard is not None:
+                    recoded += shard.recode_line_reports(codec, None, batch_size)
+        else:
+            shard = self._shard(session_id)
+            if shard is not None:
+                return shard.recode_line_reports(codec, session_id, batch_size)
+        return recoded + self._recode_rows(codec, session_id, batch_size)
+
+    def _recode_rows(self, codec: int, session_id: Optional[str], batch_size: int) -> int:
+        assert self.conn is not None
+        cur = self.conn.cursor()
+        session_filter = "" if session_id is None else " AND session_id = ?"
+        session_params = () if session_id is None else (session_id,)
+        recoded = 0
+        last_id = 0
+        while True:
+            cur.execute(
+                "SELECT id, variables, variables_delta, variables_codec FROM line_reports "
+                f"WHERE COALESCE(variables_codec, 0) != ? AND id > ?{session_filter} ORDER BY id LIMIT ?",
+                (codec, last_id, *session_params, batch_size),
+            )
+            rows = cur.fetchall()
+            if not rows:
+                return recoded
+            # Value references stay as they are; only the encoding changes
+            cur.executemany(
+                "UPDATE step_payloads SET variables=?, variables_delta=?, variables_codec=? WHERE step_id=?"
+                if self.normalized
+                else "UPDATE line_reports SET variables=?, variables_delta=?, variables_codec=? WHERE id=?",
+                [
+                    (
+                        encode_scopes(decode_scopes(variables, old_codec), codec),
+                        encode_scopes(decode_scopes(delta, old_codec), codec),
+                        codec,
+                        row_id,
+                    )
+                    for row_id, variables, delta, old_codec in rows
+                ],
+            )
+            self.conn.commit()
+            recoded += len(rows)
+            last_id = rows[-1][0]
+
+    def normalize_line_reports(self) -> int:
+        """Move a line_reports table of an older database into the normalized layout.
+
+        Rows keep their ids; line_reports becomes the view over steps and
+        step_payloads. The freed pages stay in the file until it is vacuumed.
+        Returns the number of rows moved (0 when already normalized).
+        """
+        assert self.conn is not None
+        self.flush()
+        if self.normalized:
+            return 0
+        cur = self.conn.cursor()
+        try:
+            cur.execute("BEGIN IMMEDIATE")
+            # Another process may have migrated while we waited for the lock
+            cur.execute("SELECT type FROM sqlite_master WHERE name='line_reports'")
+            if cur.fetchone()[0] != "table":
+                self.conn.rollback()
+                self.normalized = True
+                return 0
+            for statement in _STEP_TABLES:
+                cur.execute(statement)
+            cur.execute("INSERT OR IGNORE INTO sessions(session_id) SELECT DISTINCT session_id FROM line_reports")
+            cur.execute("INSERT OR IGNORE INTO files(path) SELECT DISTINCT file FROM line_reports")
+            cur.execute("INSERT OR IGNORE INTO source_lines(code) SELECT DISTINCT code FROM line_reports")
+            cur.execute(
+                f"""
+                INSERT INTO steps(
+                  id, session_key, file_id, line_number, code_id, ts_ns, stack_depth, thread_id, status,
+                  loop_iteration, memory_usage_mb, disk_usage_increase_mb, state_encoding
+                )
+                SELECT lr.id, se.id, f.id, lr.line_number, sl.id, {_TS_NS_SQL.format(col="lr.timestamp")},
+                       lr.stack_depth, lr.thread_id, {_STATUS_SQL.format(col="lr.status")},
+                       lr.loop_iteration, lr.memory_usage_mb, lr.disk_usage_increase_mb, lr.state_encoding
+                FROM line_reports lr
+                JOIN sessions se ON se.session_id = lr.session_id
+                JOIN files f ON f.path = lr.file
+                JOIN source_lines sl ON sl.code = lr.code
+                ORDER BY lr.id
+                """
+            )
+            moved = cur.rowcount
+            cur.execute(
+                """
+                INSERT INTO step_payloads(
+                  step_id, variables, variables_delta, variables_codec, observations, error_message, error_type, stack_trace
+                )
+                SELECT id, variables, variables_delta, variables_codec, observations, error_message, error_type, stack_trace
+                FROM line_reports ORDER BY id
+                """
+            )
+            cur.execute("DROP TABLE line_reports")
+            for statement in _LINE_REPORTS_VIEW:
+                cur.execute(statement)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        self.normalized = True
+        self._states.clear()
+        return moved
+
+    @staticmethod
+    def _tally(reports: List[LineReport], counts: Dict[str, List[int]]) -> None:
+        for report in reports:
+            c = counts.setdefault(report.session_id, [0, 0, 0])
+            c[0] += 1
+            if report.status == "success":
+                c[1] += 1
+            elif report.status == "error":
+                c[2] += 1
+
+    @staticmethod
+    def _update_counters(cur: sqlite3.Cursor, counts: Dict[str, List[int]]) -> None:
+        """Add and clear the tallied counts; every error row also counts as a crash."""
+        cur.executemany(
+            """
+            UPDATE session_summaries
+            SET total_lines_executed = total_lines_executed + ?,
+                successful_lines = successful_lines + ?,
+                lines_with_errors = lines_with_errors + ?,
+                total_crashes = total_crashes + ?,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE session_id = ?
+            """,
+            [(c[0], c[1], c[2], c[2], session_id) for session_id, c in counts.items()],
+        )
+        counts.clear()
+
+    def add_file_snapshot(self, session_id: str, file: str, content: bytes) -> None:
+        """Map ``file`` to its content for this session; the content is stored once per sha256."""
+        shard = self._shard(session_id)
+        if shard is not None:
+            shard.add_file_snapshot(session_id, file, content)
+            return
+        assert self.conn is not None
+        sha = hashlib.sha256(content).hexdigest()
+        cur = self.conn.cursor()
+        cur.execute("SELECT 1 FROM source_blobs WHERE sha256=?", (sha,))
+        if cur.fetchone() is None:
+            cur.execute(
+                "INSERT OR IGNORE INTO source_blobs(sha256, content_gzip) VALUES (?,?)",
+                (sha, sqlite3.Binary(gzip.compress(content))),
+            )
+        # Do not overwrite if already present
+        cur.execute(
+            "INSERT OR IGNORE INTO file_snapshots(session_id, file, sha256) VALUES (?,?,?)",
+            (session_id, file, sha),
+        )
+        self.conn.commit()
+
+    def add_globals_snapshot(self, session_id: str, file: str, timestamp: str, variables: Dict[str, Any]) -> None:
+        shard = self._shard(session_id)
+        if shard is not None:
+            shard.add_globals_snapshot(session_id, file, timestamp, variables)
+            return
+        assert self.conn is not None
+        cur = self.conn.cursor()
+        cur.execute(
+            "INSERT INTO globals_snapshots(session_id, file, timestamp, variables) VALUES (?,?,?,?)",
+            (session_id, file, timestamp, json.dumps(variables or {})),
+        )
+        self.conn.commit()
+
+    def get_globals_snapshots(self, session_id: str) -> List[Dict[str, Any]]:
+        """Per-module globals captured under the ``locals+changed-globals`` scope policy."""
+        shard = self._shard(session_id)
+        if shard is not None:
+            return shard.get_globals_snapshots(session_id)
+        assert self.conn is not None
+        cur = self.conn.cursor()
+        cur.execute(
+            "SELECT file, timestamp, variables FROM globals_snapshots WHERE session_id=? ORDER BY id",
+            (session_id,),
+        )
+        snapshots = []
+        for file, timestamp, variables in cur.fetchall():
+            try:
+                decoded = json.loads(variables or "{}")
+            except Exception:
+                decoded = {}
+            snapshots.append({"file": file, "timestamp": timestamp, "variables": decoded})
+        return snapshots
+
+    def add_loop_summary(self, summary: LoopSummary) -> Optional[int]:
+        shard = self._shard(summary.session_id)
+        if shard is not None:
+            return shard.add_loop_summary(summary)
+        # Queued behind the line reports it follows when write-behind is on
+        if self._write_queue is not None:
+            self._write_queue.put(summary)
+            return None
+        assert self.conn is not None
+        last_id = self._insert_loop_summary(self.conn.cursor(), summary)
+        self.conn.commit()
+        return last_id
+
+    @staticmethod
+    def _insert_loop_summary(cur: sqlite3.Cursor, summary: LoopSummary) -> int:
         cur.execute(
             """
-            INSERT INTO line_reports(
-              session_id,file,line_number,code,timestamp,
-              variables,variables_delta,stack_depth,thread_id,observations,
-              status,error_message,error_type,stack_trace,
-              loop_iteration,memory_usage_mb,disk_usage_increase_mb
-            ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+            INSERT INTO loop_summaries(
+              session_id,file,line_number,first_iteration,last_iteration,
+              iterations,rows,first_timestamp,last_timestamp,variables
+            ) VALUES (?,?,?,?,?,?,?,?,?,?)
             """,
             (
-                report.session_id,
-                report.file,
-                report.line_number,
-                report.code,
-                report.timestamp,
-                json.dumps(report.variables or {}),
-                json.dumps(report.variables_delta or {}),
-                report.stack_depth,
-                report.thread_id,
-                report.observations,
-                report.status,
-                report.error_message,
-                report.error_type,
-                report.stack_trace,
-                report.loop_iteration,
-                report.memory_usage_mb,
-                report.disk_usage_increase_mb,
+                summary.session_id,
+                summary.file,
+                summary.line_number,
+                summary.first_iteration,
+                summary.last_iteration,
+                summary.iterations,
+                summary.rows,
+                summary.first_timestamp,
+                summary.last_timestamp,
+                json.dumps(summary.variables or {}),
             ),
         )
-        last_id = cur.lastrowid
-        # Update summary counters
-        updates = ["total_lines_executed = total_lines_executed + 1"]
-        if report.status == "success":
-            updates.append("successful_lines = successful_lines + 1")
-        elif report.status == "error":
-            updates.append("lines_with_errors = lines_with_errors + 1")
-            updates.append("total_crashes = total_crashes + 1")
+        return int(cur.lastrowid)
+
+    def get_loop_summaries(self, session_id: str) -> List[Dict[str, Any]]:
+        """Loop iterations collapsed under ``--summarize-loops-after``, in capture order."""
+        shard = self._shard(session_id)
+        if shard is not None:
+            return shard.get_loop_summaries(session_id)
+        assert self.conn is not None
+        cur = self.conn.cursor()
         cur.execute(
-            f"UPDATE session_summaries SET {', '.join(updates)}, updated_at=CURRENT_TIMESTAMP WHERE session_id=?",
-            (report.session_id,),
+            """
+            SELECT id, file, line_number, first_iteration, last_iteration, iterations, rows,
+                   first_timestamp, last_timestamp, variables
+            FROM loop_summaries WHERE session_id=? ORDER BY id
+            """,
+            (session_id,),
+        )
+        colnames = [d[0] for d in cur.description] if cur.description else []
+        summaries = [dict(zip(colnames, row)) for row in cur.fetchall()]
+        for summary in summaries:
+            try:
+                summary["variables"] = json.loads(summary.get("variables") or "{}")
+            except Exception:
+                summary["variables"] = {}
+        return summaries
+
+    def add_line_hits(self, session_id: str, counters: List[Tuple[str, int, int, str, str]]) -> None:
+        """Merge (file, line_number, hits, first_timestamp, last_timestamp) overflow counters."""
+        shard = self._shard(session_id)
+        if shard is not None:
+            shard.add_line_hits(session_id, counters)
+            return
+        assert self.conn is not None
+        if not counters:
+            return
+        cur = self.conn.cursor()
+        cur.executemany(
+            """
+            INSERT INTO line_hit_counters(session_id, file, line_number, hits, first_timestamp, last_timestamp)
+            VALUES (?,?,?,?,?,?)
+            ON CONFLICT(session_id, file, line_number) DO UPDATE SET
+              hits = hits + excluded.hits,
+              last_timestamp = excluded.last_timestamp
+            """,
+            [(session_id, *counter) for counter in counters],
         )
         self.conn.commit()
-        return int(last_id)
 
-    def add_file_snapshot(self, session_id: str, file: str, content: bytes) -> None:
+    def get_line_hits(self, session_id: str) -> List[Dict[str, Any]]:
+        """Hits that were counted rather than recorded under ``--max-hits-per-line``."""
+        shard = self._shard(session_id)
+        if shard is not None:
+            return shard.get_line_hits(session_id)
         assert self.conn is not None
-        sha = hashlib.sha256(content).hexdigest()
-        gz = gzip.compress(content)
         cur = self.conn.cursor()
-        # Do not overwrite if already present
         cur.execute(
             """
-            INSERT OR IGNORE INTO file_snapshots(session_id, file, sha256, content_gzip)
-            VALUES (?,?,?,?)
+            SELECT file, line_number, hits, first_timestamp, last_timestamp
+            FROM line_hit_counters WHERE session_id=? ORDER BY file, line_number
             """,
-            (session_id, file, sha, sqlite3.Binary(gz)),
+            (session_id,),
+        )
+        colnames = [d[0] for d in cur.description] if cur.description else []
+        return [dict(zip(colnames, row)) for row in cur.fetchall()]
+
+    def get_executable_lines(self, sha256: str) -> Optional[List[int]]:
+        assert self.conn is not None
+        cur = self.conn.cursor()
+        cur.execute("SELECT lines FROM executable_lines WHERE sha256=?", (sha256,))
+        row = cur.fetchone()
+        if not row:
+            return None
+        try:
+            return [int(n) for n in json.loads(row[0])]
+        except Exception:
+            return None
+
+    def add_executable_lines(self, sha256: str, lines: List[int]) -> None:
+        assert self.conn is not None
+        cur = self.conn.cursor()
+        cur.execute(
+            "INSERT OR REPLACE INTO executable_lines(sha256, lines) VALUES (?,?)",
+            (sha256, json.dumps(list(lines))),
         )
         self.conn.commit()
 
     def get_file_snapshot(self, session_id: str, file: str) -> Optional[str]:
+        shard = self._shard(session_id)
+        if shard is not None:
+            return shard.get_file_snapshot(session_id, file)
         assert self.conn is not None
         cur = self.conn.cursor()
         cur.execute(
-            "SELECT content_gzip FROM file_snapshots WHERE session_id=? AND file=?",
+            """
+            SELECT b.content_gzip FROM file_snapshots s JOIN source_blobs b ON b.sha256 = s.sha256
+            WHERE s.session_id=? AND s.file=?
+            """,
             (session_id, file),
         )
         row = cur.fetchone()
@@ -316,7 +1454,85 @@ class LineReportStore:
         except Exception:
             return None
 
+    def iter_session_reports(
+        self,
+        session_id: str,
+        columns: Optional[Iterable[str]] = None,
+        from_step: Optional[int] = None,
+        to_step: Optional[int] = None,
+    ) -> Iterable[Dict[str, Any]]:
+        """Yield a session's line reports in order, one dict per row.
+
+        ``columns`` picks from EXPORT_COLUMNS (default: all). ``variables`` is
+        the full state at the row, rebuilt under ``--keyframe-interval``, and
+        ``variables``/``variables_delta`` have interned values resolved.
+        ``from_step``/``to_step`` bound the row ids, inclusive. Rows are read
+        EXPORT_BATCH_SIZE at a time, so memory does not grow with the session.
+        """
+        shard = self._shard(session_id)
+        if shard is not None:
+            yield from shard.iter_session_reports(session_id, columns, from_step=from_step, to_step=to_step)
+            return
+        assert self.conn is not None
+        columns = list(EXPORT_COLUMNS if columns is None else columns)
+        unknown = [c for c in columns if c not in EXPORT_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown line report column(s): {', '.join(unknown)}")
+        want_variables = "variables" in columns
+        want_delta = "variables_delta" in columns
+        # Decoding columns go last and are dropped from the yielded rows
+        fetched = [c for c in columns if c != "id"] + ["variables_codec", "state_encoding"]
+        if want_variables and not want_delta:
+            fetched.append("variables_delta")
+        last_id = (from_step - 1) if from_step is not None else 0
+        state: Optional[Dict[str, Any]] = None
+        first = True
+        cur = self.conn.cursor()
+        while True:
+            cur.execute(
+                f"SELECT id, {', '.join(fetched)} FROM line_reports WHERE session_id=? AND id>?"
+                + ("" if to_step is None else " AND id<=?")
+                + " ORDER BY id LIMIT ?",
+                (session_id, last_id) + (() if to_step is None else (to_step,)) + (EXPORT_BATCH_SIZE,),
+            )
+            rows = cur.fetchall()
+            if not rows:
+                return
+            for row in rows:
+                r = dict(zip(["id"] + fetched, row))
+                codec, encoding = r.pop("variables_codec"), r.pop("state_encoding")
+                delta_raw = r["variables_delta"] if want_delta else r.pop("variables_delta", None)
+                if want_variables:
+                    if first and encoding:
+                        # Starting inside a run of patches: replay up to the session's previous
+                        # row, which is not r["id"] - 1 when sessions interleave in one file
+                        prev_id = self.conn.execute(
+                            "SELECT MAX(id) FROM line_reports WHERE session_id=? AND id<?", (session_id, r["id"])
+                        ).fetchone()[0]
+                        state = None if prev_id is None else reconstruct_state(self.conn, session_id, prev_id)
+                    try:
+                        state = next_state(
+                            state,
+                            decode_scopes(r["variables"], codec, self.conn),
+                            decode_scopes(delta_raw, codec, self.conn) if encoding == STATE_PATCH_IS_DELTA else None,
+                            encoding,
+                        )
+                        r["variables"] = state
+                    except Exception:
+                        r["variables"] = {}
+                if want_delta:
+                    try:
+                        r["variables_delta"] = decode_scopes(delta_raw, codec, self.conn)
+                    except Exception:
+                        r["variables_delta"] = {}
+                first = False
+                yield {c: r[c] for c in columns}
+            last_id = rows[-1][0]
+
     def export_session_json(self, session_id: str) -> str:
+        shard = self._shard(session_id)
+        if shard is not None:
+            return shard.export_session_json(session_id)
         assert self.conn is not None
         cur = self.conn.cursor()
         cur.execute("SELECT * FROM session_summaries WHERE session_id=?", (session_id,))
@@ -324,18 +1540,12 @@ class LineReportStore:
         columns = [d[0] for d in cur.description] if cur.description else []
         summary_obj = dict(zip(columns, summary)) if summary else None
 
-        cur.execute(
-            "SELECT id, session_id, file, line_number, code, timestamp, variables, stack_depth, thread_id, observations, status, error_message, error_type, stack_trace, created_at FROM line_reports WHERE session_id=? ORDER BY id",
-            (session_id,),
+        reports = list(
+            self.iter_session_reports(
+                session_id,
+                columns=[c for c in EXPORT_COLUMNS if c not in ("variables_delta",) + _RESOURCE_COLUMNS],
+            )
         )
-        rows = cur.fetchall()
-        colnames = [d[0] for d in cur.description] if cur.description else []
-        reports = [dict(zip(colnames, row)) for row in rows]
-        for r in reports:
-            try:
-                r["variables"] = json.loads(r.get("variables") or "{}")
-            except Exception:
-                r["variables"] = {}
 
         crashes = [
             {
@@ -351,6 +1561,9 @@ class LineReportStore:
         export_payload = {
             "session_info": summary_obj,
             "line_reports": reports,
+            "globals_snapshots": self.get_globals_snapshots(session_id),
+            "line_hit_counters": self.get_line_hits(session_id),
+            "loop_summaries": self.get_loop_summaries(session_id),
             "crashes": crashes,
             "summary": {
                 "total_lines_executed": (summary_obj or {}).get("total_lines_executed", 0),
@@ -365,12 +1578,212 @@ class LineReportStore:
 
     def delete_session(self, session_id: str) -> None:
         """Delete a session and all associated data from the store."""
+        self.delete_sessions([session_id])
+
+    def delete_sessions(self, session_ids: Iterable[str]) -> int:
+        """Delete sessions and every row they own in one transaction; returns how many were given.
+
+        Covers the line reports and every table in SESSION_TABLES that exists,
+        then drops file paths, source lines, snapshot contents and interned
+        values no remaining session refers to. A session with its own database file is deleted by removing
+        the file.
+        """
+        assert self.conn is not None
+        ids = list(dict.fromkeys(session_ids))
+        if not ids:
+            return 0
+        shard_files = []
+        for session_id in ids:
+            if self._shard(session_id) is not None:
+                shard = self._shards.pop(session_id)
+                shard.close()
+                shard_files += [shard.db_path + suffix for suffix in ("", "-wal", "-shm")]
+        cur = self.conn.cursor()
+        cur.execute("CREATE TEMP TABLE IF NOT EXISTS gc_sessions (session_id TEXT PRIMARY KEY)")
+        cur.execute("DELETE FROM temp.gc_sessions")
+        cur.executemany("INSERT OR IGNORE INTO temp.gc_sessions(session_id) VALUES (?)", [(i,) for i in ids])
+        doomed = "(SELECT session_id FROM temp.gc_sessions)"
+        if self.normalized:
+            keys = f"(SELECT id FROM sessions WHERE session_id IN {doomed})"
+            # Paths and source lines these steps used; dropped below unless another step uses them
+            for table, column in (("files", "file_id"), ("source_lines", "code_id")):
+                cur.execute(f"CREATE TEMP TABLE IF NOT EXISTS gc_{table} (id INTEGER PRIMARY KEY)")
+                cur.execute(f"DELETE FROM temp.gc_{table}")
+                cur.execute(f"INSERT OR IGNORE INTO temp.gc_{table} SELECT {column} FROM steps WHERE session_key IN {keys}")
+            cur.execute(f"DELETE FROM step_payloads WHERE step_id IN (SELECT id FROM steps WHERE session_key IN {keys})")
+            cur.execute(f"DELETE FROM steps WHERE session_key IN {keys}")
+            cur.execute(f"DELETE FROM sessions WHERE session_id IN {doomed}")
+            for table, column in (("files", "file_id"), ("source_lines", "code_id")):
+                cur.execute(
+                    f"DELETE FROM {table} WHERE id IN (SELECT id FROM temp.gc_{table}) "
+                    f"AND NOT EXISTS (SELECT 1 FROM steps WHERE steps.{column} = {table}.id)"
+                )
+                cur.execute(f"DELETE FROM temp.gc_{table}")
+        else:
+            cur.execute(f"DELETE FROM line_reports WHERE session_id IN {doomed}")
+        cur.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        existing = {r[0] for r in cur.fetchall()}
+        if "interned_value_refs" in existing:
+            # Values these sessions referred to; checked once their references are gone
+            cur.execute("CREATE TEMP TABLE IF NOT EXISTS gc_values (hash TEXT PRIMARY KEY)")
+            cur.execute("DELETE FROM temp.gc_values")
+            cur.execute(f"INSERT OR IGNORE INTO temp.gc_values SELECT hash FROM interned_value_refs WHERE session_id IN {doomed}")
+        for table in SESSION_TABLES:
+            if table in existing:
+                cur.execute(f"DELETE FROM {table} WHERE session_id IN {doomed}")
+        # Contents no other session refers to
+        cur.execute("DELETE FROM source_blobs WHERE sha256 NOT IN (SELECT sha256 FROM file_snapshots)")
+        if "interned_value_refs" in existing:
+            self._drop_unreferenced_values(cur)
+        cur.execute("DELETE FROM temp.gc_sessions")
+        self.conn.commit()
+        for path in shard_files:
+            if os.path.exists(path):
+                os.remove(path)
+        self._states.clear()
+        gone = set(ids)
+        self._step_ids = {k: v for k, v in self._step_ids.items() if k[0] not in gone}
+        for session_id in ids:
+            self._shard_paths.pop(session_id, None)
+        return len(ids)
+
+    def _drop_unreferenced_values(self, cur: sqlite3.Cursor) -> None:
+        """Delete the values in ``temp.gc_values`` that no interned_value_refs row points to any more.
+
+        Runs inside ``delete_sessions``' transaction, so it costs what the
+        deleted sessions referred to, not a pass over every stored row.
+        """
+        cur.execute(
+            """
+            DELETE FROM interned_values WHERE hash IN (
+              SELECT g.hash FROM temp.gc_values g
+              WHERE NOT EXISTS (SELECT 1 FROM interned_value_refs r WHERE r.hash = g.hash)
+            )
+            """
+        )
+        cur.execute("DELETE FROM temp.gc_values")
+        self._known_refs.clear()
+
+    def collect_garbage(
+        self,
+        keep_last: Optional[int] = None,
+        older_than: Optional[float] = None,
+        max_db_size: Optional[int] = None,
+        convert_auto_vacuum: bool = False,
+    ) -> Dict[str, int]:
+        """Apply a retention policy, drop orphaned snapshots and give free pages back to the filesystem.
+
+        Only finished sessions (with an ``end_time``) are considered, so a
+        capture still in progress is never deleted. Of those, the
+        ``keep_last`` most recently started are never deleted.
+        With only ``keep_last``, every other session is deleted; with
+        ``older_than`` (seconds), only those that started earlier than that.
+        Then, while the pages in use exceed ``max_db_size`` bytes, the oldest
+        remaining sessions go one at a time. Finishes with
+        ``incremental_vacuum`` (``convert_auto_vacuum`` is its ``convert``).
+        Returns the number of sessions deleted, the database size before and
+        after, in bytes, and ``incremental`` (0 when the file still lacks
+        ``auto_vacuum=INCREMENTAL``, so free pages stayed in it).
+        """
+        assert self.conn is not None
+        self.flush()
+        size_before = self._db_size()
+        cur = self.conn.cursor()
+        cur.execute("SELECT session_id, start_time FROM session_summaries WHERE end_time IS NOT NULL")
+        # Newest first; an unparsable start_time counts as now
+        sessions = sorted(((timestamp_ns(start or ""), sid) for sid, start in cur.fetchall()), reverse=True)
+        kept = sessions[: keep_last or 0]
+        candidates = sessions[len(kept) :]
+        if older_than is not None:
+            cutoff = time.time_ns() - int(older_than * 1_000_000_000)
+            doomed = [sid for start, sid in candidates if start < cutoff]
+        elif keep_last is not None:
+            doomed = [sid for _, sid in candidates]
+        else:
+            doomed = []
+        deleted = self.delete_sessions(doomed)
+        if max_db_size is not None:
+            doomed_set = set(doomed)
+            for _, sid in reversed(candidates):
+                if self._used_bytes() <= max_db_size:
+                    break
+                if sid not in doomed_set:
+                    deleted += self.delete_sessions([sid])
+        self._drop_orphaned_snapshots()
+        self.incremental_vacuum(convert=convert_auto_vacuum)
+        return {
+            "deleted_sessions": deleted,
+            "size_before": size_before,
+            "size_after": self._db_size(),
+            "incremental": int(self._auto_vacuum_incremental()),
+        }
+
+    def _drop_orphaned_snapshots(self) -> None:
+        """Snapshots of sessions whose summary is gone (e.g. deleted by older UI code), and unreferenced contents.
+
+        Session database files no summary points to are removed as well.
+        """
         assert self.conn is not None
         cur = self.conn.cursor()
-        cur.execute("DELETE FROM line_reports WHERE session_id=?", (session_id,))
-        cur.execute("DELETE FROM file_snapshots WHERE session_id=?", (session_id,))
-        cur.execute("DELETE FROM session_summaries WHERE session_id=?", (session_id,))
+        for table in ("file_snapshots", "globals_snapshots"):
+            cur.execute(f"DELETE FROM {table} WHERE session_id NOT IN (SELECT session_id FROM session_summaries)")
+        cur.execute("DELETE FROM source_blobs WHERE sha256 NOT IN (SELECT sha256 FROM file_snapshots)")
+        self.conn.commit()
+        shards_dir = os.path.join(os.path.dirname(os.path.abspath(self.db_path)), SHARDS_DIR)
+        if os.path.isdir(shards_dir):
+            referenced = set(self._shard_files())
+            for name in os.listdir(shards_dir):
+                path = os.path.join(shards_dir, name)
+                if name.endswith((".db", ".db-wal", ".db-shm")) and path not in referenced:
+                    os.remove(path)
+
+    def incremental_vacuum(self, chunk_pages: int = VACUUM_CHUNK_PAGES, convert: bool = False) -> int:
+        """Return free pages to the filesystem, ``chunk_pages`` per transaction; returns the pages released.
+
+        A database created before auto_vacuum was enabled releases nothing.
+        With ``convert`` it is switched to ``auto_vacuum=INCREMENTAL`` first,
+        which takes one unbounded VACUUM of the whole file.
+        """
+        assert self.conn is not None
         self.conn.commit()
+        cur = self.conn.cursor()
+        if not self._auto_vacuum_incremental():
+            if not convert:
+                return 0
+            cur.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            cur.execute("VACUUM")
+        released = 0
+        free = cur.execute("PRAGMA freelist_count").fetchone()[0]
+        while free > 0:
+            cur.execute(f"PRAGMA incremental_vacuum({max(1, int(chunk_pages))})").fetchall()
+            remaining = cur.execute("PRAGMA freelist_count").fetchone()[0]
+            if remaining >= free:
+                # Pages still held by another connection's snapshot
+                break
+            released += free - remaining
+            free = remaining
+        cur.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        return released
+
+    def _auto_vacuum_incremental(self) -> bool:
+        assert self.conn is not None
+        return self.conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+    def _used_bytes(self) -> int:
+        assert self.conn is not None
+        cur = self.conn.cursor()
+        page_size = cur.execute("PRAGMA page_size").fetchone()[0]
+        page_count = cur.execute("PRAGMA page_count").fetchone()[0]
+        free = cur.execute("PRAGMA freelist_count").fetchone()[0]
+        return int(page_size * (page_count - free)) + sum(os.path.getsize(p) for p in self._shard_files())
+
+    def _db_size(self) -> int:
+        """Bytes on disk, including the WAL and any session database files."""
+        return sum(
+            os.path.getsize(path)
+            for path in (self.db_path, self.db_path + "-wal")
+            if os.path.exists(path)
+        ) + sum(os.path.getsize(p) for p in self._shard_files())
 
     def estimate_session_size(self, session_id: str) -> int:
         """Approximate storage size on disk for a session, in bytes.
@@ -378,6 +1791,9 @@ class LineReportStore:
         Includes the length of text fields stored per line report and the
         compressed snapshot blob sizes. This is an estimate suitable for UI display.
         """
+        shard = self._shard(session_id)
+        if shard is not None:
+            return shard.estimate_session_size(session_id)
         assert self.conn is not None
         cur = self.conn.cursor()
         # Sum approximate bytes for text columns in line_reports
@@ -401,9 +1817,19 @@ class LineReportStore:
         lr_bytes = int((lr_bytes_row[0] if lr_bytes_row and lr_bytes_row[0] is not None else 0))
         # Sum compressed snapshot sizes
         cur.execute(
-            "SELECT COALESCE(SUM(LENGTH(content_gzip)), 0) FROM file_snapshots WHERE session_id=?",
+            """
+            SELECT COALESCE(SUM(LENGTH(b.content_gzip)), 0)
+            FROM file_snapshots s JOIN source_blobs b ON b.sha256 = s.sha256
+            WHERE s.session_id=?
+            """,
             (session_id,),
         )
         snap_bytes_row = cur.fetchone()
         snap_bytes = int((snap_bytes_row[0] if snap_bytes_row and snap_bytes_row[0] is not None else 0))
-        return lr_bytes + snap_bytes
+        cur.execute(
+            "SELECT COALESCE(SUM(LENGTH(COALESCE(variables,''))), 0) FROM globals_snapshots WHERE session_id=?",
+            (session_id,),
+        )
+        globals_bytes_row = cur.fetchone()
+        globals_bytes = int((globals_bytes_row[0] if globals_bytes_row and globals_bytes_row[0] is not None else 0))
+        return lr_bytes + snap_bytes + globals_bytes
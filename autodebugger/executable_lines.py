@@ -0,0 +1,109 @@
+"""Executable line numbers of a source file, read from its compiled bytecode.
+
+``ExecutableLineIndex`` compiles a file once and collects the line of every
+instruction across all nested code objects (``co_lines()`` on Python 3.10+,
+``dis.findlinestarts`` before that). These are exactly the lines a debugger can
+stop on, so dense breakpoints and goto lookups neither miss lines nor land on
+blank lines, comments or continuation lines.
+
+Indexes are cached per path and invalidated by mtime/size. When a
+``LineReportStore`` is given they are also persisted by the file's sha256, so an
+unchanged file is not recompiled in later sessions.
+"""
+
+from __future__ import annotations
+
+import bisect
+import dis
+import hashlib
+import os
+import types
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .common import source_cache
+from .db import LineReportStore
+
+# path -> ((mtime_ns, size), index)
+_INDEX_CACHE: Dict[str, Tuple[Tuple[int, int], "ExecutableLineIndex"]] = {}
+
+
+def _code_lines(code: types.CodeType) -> Iterator[int]:
+    if hasattr(code, "co_lines"):
+        for _start, _end, line in code.co_lines():
+            if line:
+                yield line
+    else:  # Python 3.9
+        for _offset, line in dis.findlinestarts(code):
+            if line:
+                yield line
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            yield from _code_lines(const)
+
+
+class ExecutableLineIndex:
+    """Sorted executable line numbers of one file with O(log n) neighbour lookups."""
+
+    def __init__(self, lines: Sequence[int]) -> None:
+        self.lines: List[int] = sorted(set(lines))
+
+    @classmethod
+    def from_source(cls, source: Any, filename: str = "<string>") -> "ExecutableLineIndex":
+        """Compile ``source`` (str or bytes); raises SyntaxError/ValueError like ``compile``."""
+        return cls(_code_lines(compile(source, filename, "exec", dont_inherit=True)))
+
+    def __contains__(self, line: int) -> bool:
+        i = bisect.bisect_left(self.lines, line)
+        return i < len(self.lines) and self.lines[i] == line
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def before(self, line: int) -> Optional[int]:
+        """Closest executable line strictly before ``line``."""
+        i = bisect.bisect_left(self.lines, line)
+        return self.lines[i - 1] if i > 0 else None
+
+    def after(self, line: int) -> Optional[int]:
+        """Closest executable line strictly after ``line``."""
+        i = bisect.bisect_right(self.lines, line)
+        return self.lines[i] if i < len(self.lines) else None
+
+    def nearest(self, line: int) -> Optional[int]:
+        """``line`` itself if executable, else the next one after it, else the last one before it."""
+        if line in self:
+            return line
+        after = self.after(line)
+        return after if after is not None else self.before(line)
+
+
+def get_line_index(file_path: str, store: Optional[LineReportStore] = None) -> Optional[ExecutableLineIndex]:
+    """Index for ``file_path``, or None if it cannot be read or compiled.
+
+    ``store`` is an open ``LineReportStore`` used to reuse indexes persisted for
+    the same file content.
+    """
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _INDEX_CACHE.get(file_path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    source = source_cache.get_bytes(file_path)
+    if source is None:
+        return None
+    sha = hashlib.sha256(source).hexdigest() if store is not None else None
+    lines = store.get_executable_lines(sha) if store is not None and sha else None
+    if lines is not None:
+        index = ExecutableLineIndex(lines)
+    else:
+        try:
+            index = ExecutableLineIndex.from_source(source, file_path)
+        except (SyntaxError, ValueError):
+            return None
+        if store is not None and sha:
+            store.add_executable_lines(sha, index.lines)
+    _INDEX_CACHE[file_path] = (key, index)
+    return index
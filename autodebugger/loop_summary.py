@@ -0,0 +1,205 @@
+"""Collapse repeated loop iterations into aggregates (``--summarize-loops-after K``).
+
+``LoopSummarizer`` sits between a capture loop and the store. Each captured
+``LineReport`` is fed in, and the rows to persist come back out in order: every
+row of the first K iterations and of the last iteration of each loop. The
+iterations in between are folded into one ``LoopSummary`` per loop run, holding
+the iteration count and the min/max/first/last of every numeric variable.
+
+Loops are located with ``ast`` rather than by matching ``for``/``while``
+prefixes, so a loop ends as soon as a stop in its own frame lands outside the
+loop statement. Stops in deeper frames (calls made from the body) belong to
+the current iteration.
+"""
+
+from __future__ import annotations
+
+import ast
+import os
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from .common import source_cache
+from .db import LineReport, LineReportStore, LoopSummary
+
+LoopItem = Union[LineReport, LoopSummary]
+
+# file path -> (mtime, {loop header line: last line of the loop statement})
+_LOOP_RANGES: Dict[str, Tuple[float, Dict[int, int]]] = {}
+
+
+def loop_body_range(file_path: str, line: int) -> Optional[Tuple[int, int]]:
+    """Return (header line, end line) when ``line`` starts a for/while loop in ``file_path``."""
+    try:
+        mtime = os.path.getmtime(file_path)
+    except OSError:
+        return None
+    cached = _LOOP_RANGES.get(file_path)
+    if cached is None or cached[0] != mtime:
+        ranges: Dict[int, int] = {}
+        tree = source_cache.get_tree(file_path)
+        for node in ast.walk(tree) if tree is not None else ():
+            if isinstance(node, (ast.For, ast.AsyncFor, ast.While)):
+                ranges[node.lineno] = getattr(node, "end_lineno", None) or node.lineno
+        cached = (mtime, ranges)
+        _LOOP_RANGES[file_path] = cached
+    end = cached[1].get(line)
+    return (line, end) if end is not None else None
+
+
+def store_items(store: LineReportStore, items: List[LoopItem]) -> None:
+    """Write the rows and summaries a ``LoopSummarizer`` released."""
+    if len(items) == 1 and isinstance(items[0], LineReport):
+        store.add_line_report(items[0])
+        return
+    # Consecutive rows go in as one bulk insert
+    run: List[LineReport] = []
+    for item in items:
+        if isinstance(item, LoopSummary):
+            store.add_line_reports(run)
+            run = []
+            store.add_loop_summary(item)
+        else:
+            run.append(item)
+    store.add_line_reports(run)
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class _ActiveLoop:
+    """One run of a loop: the iteration being captured and the held-back candidates for 'last'."""
+
+    def __init__(self, file: str, start: int, end: int, depth: int) -> None:
+        self.file = file
+        self.start = start
+        self.end = end
+        self.depth = depth
+        self.iteration = 1
+        self.current: List[LoopItem] = []
+        self.pending_last: Optional[List[LoopItem]] = None
+        self.summary: Optional[LoopSummary] = None
+
+    def has_left(self, report: LineReport) -> bool:
+        if report.stack_depth != self.depth:
+            return report.stack_depth < self.depth
+        return report.file != self.file or not (self.start <= report.line_number <= self.end)
+
+    def is_header(self, report: LineReport) -> bool:
+        return report.stack_depth == self.depth and report.file == self.file and report.line_number == self.start
+
+
+class LoopSummarizer:
+    """Keep full rows for the first ``keep_iterations`` and the last iteration of every loop."""
+
+    def __init__(self, session_id: str, keep_iterations: int) -> None:
+        self.session_id = session_id
+        self.keep_iterations = keep_iterations
+        self._stack: List[_ActiveLoop] = []
+
+    def feed(self, report: LineReport) -> List[LoopItem]:
+        """Take one captured row; return the rows and summaries that are final now, in order."""
+        out: List[LoopItem] = []
+        while self._stack and self._stack[-1].has_left(report):
+            self._close(self._stack.pop(), out)
+        top = self._stack[-1] if self._stack else None
+        if top is not None and top.is_header(report):
+            self._end_iteration(top, out)
+            top.current.append(report)
+            return out
+        body = loop_body_range(report.file, report.line_number)
+        if body is not None:
+            loop = _ActiveLoop(report.file, body[0], body[1], report.stack_depth)
+            loop.current.append(report)
+            self._stack.append(loop)
+            return out
+        self._emit([report], out)
+        return out
+
+    def finish(self) -> List[LoopItem]:
+        """Close every loop still open (end of session) and return what remains."""
+        out: List[LoopItem] = []
+        while self._stack:
+            self._close(self._stack.pop(), out)
+        return out
+
+    def _emit(self, items: List[LoopItem], out: List[LoopItem], depth: Optional[int] = None) -> None:
+        # Resolved items join the iteration of the loop at ``depth`` on the stack
+        # (the innermost by default), or leave the summarizer
+        depth = len(self._stack) if depth is None else depth
+        if depth:
+            self._stack[depth - 1].current.extend(items)
+        else:
+            out.extend(items)
+
+    def _end_iteration(self, loop: _ActiveLoop, out: List[LoopItem]) -> None:
+        finished, loop.current = loop.current, []
+        if loop.iteration <= self.keep_iterations:
+            # ``loop`` is still innermost; its kept rows belong to the loop around it
+            self._emit(finished, out, len(self._stack) - 1)
+        else:
+            # Only the newest iteration can still turn out to be the last one
+            if loop.pending_last is not None:
+                self._fold(loop, loop.pending_last)
+            loop.pending_last = finished
+        loop.iteration += 1
+
+    def _close(self, loop: _ActiveLoop, out: List[LoopItem]) -> None:
+        resolved = loop.current
+        if loop.pending_last is not None:
+            # A for loop ends on one more header stop (the exhausted iterator); that
+            # stub is not an iteration, so the held-back one really was the last
+            exhausted = all(isinstance(item, LineReport) and loop.is_header(item) for item in loop.current)
+            if exhausted:
+                last = loop.pending_last + loop.current
+            else:
+                self._fold(loop, loop.pending_last)
+                last = loop.current
+            resolved = ([loop.summary] if loop.summary is not None else []) + last
+        self._emit(resolved, out)
+
+    def _fold(self, loop: _ActiveLoop, items: List[LoopItem]) -> None:
+        summary = loop.summary
+        if summary is None:
+            summary = loop.summary = LoopSummary(
+                session_id=self.session_id,
+                file=loop.file,
+                line_number=loop.start,
+                first_iteration=self.keep_iterations + 1,
+            )
+        summary.iterations += 1
+        for item in items:
+            if isinstance(item, LoopSummary):
+                # A nested loop that ran inside this iteration
+                summary.rows += item.rows
+                self._merge_timestamps(summary, item.first_timestamp, item.last_timestamp)
+                for scope, stats in item.variables.items():
+                    for name, stat in stats.items():
+                        self._merge_stat(summary.variables.setdefault(scope, {}), name, stat)
+                continue
+            summary.rows += 1
+            self._merge_timestamps(summary, item.timestamp, item.timestamp)
+            for scope, values in (item.variables or {}).items():
+                if not isinstance(values, dict):
+                    continue
+                for name, value in values.items():
+                    if _is_number(value):
+                        stat = {"min": value, "max": value, "first": value, "last": value}
+                        self._merge_stat(summary.variables.setdefault(scope, {}), name, stat)
+
+    @staticmethod
+    def _merge_timestamps(summary: LoopSummary, first: Optional[str], last: Optional[str]) -> None:
+        if summary.first_timestamp is None:
+            summary.first_timestamp = first
+        if last is not None:
+            summary.last_timestamp = last
+
+    @staticmethod
+    def _merge_stat(stats: Dict[str, Dict[str, Any]], name: str, stat: Dict[str, Any]) -> None:
+        existing = stats.get(name)
+        if existing is None:
+            stats[name] = dict(stat)
+            return
+        existing["min"] = min(existing["min"], stat["min"])
+        existing["max"] = max(existing["max"], stat["max"])
+        existing["last"] = stat["last"]
@@ -12,6 +12,8 @@ import select
 import time
 from typing import Any, Dict, List, Optional, Tuple, Union, Callable
 
+from .common import is_truncated
+
 
 class NestedValueExplorer:
     """Interactive explorer for nested data structures during audio debugging."""
@@ -386,6 +388,10 @@ class NestedValueExplorer:
             
         if value is None:
             return "None"
+        elif is_truncated(value):
+            if value.get("type") == "str":
+                return f"string of {value.get('length')} characters, truncated"
+            return f"{value.get('type')} of {value.get('length')} items, truncated"
         elif isinstance(value, bool):
             return str(value)
         elif isinstance(value, (int, float)):
@@ -822,6 +828,8 @@ def format_nested_value_summary(value: Any, max_depth: int = 2) -> str:
             
         if v is None:
             return "None"
+        elif is_truncated(v):
+            return f"{v.get('type')} with {v.get('length')} items, truncated"
         elif isinstance(v, bool):
             return str(v)
         elif isinstance(v, (int, float)):
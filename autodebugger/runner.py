@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+import asyncio
+import fnmatch
+import glob
 import os
 import psutil
 import re
@@ -8,12 +11,14 @@ import shlex
 import socket
 import subprocess
 import sys
+import tempfile
 import threading
 import time
 import traceback
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Set, Tuple
+from typing import Any, Dict, Generator, List, Optional, Set, Tuple
 
 import debugpy
 
@@ -29,10 +34,26 @@ if USE_ENHANCED:
 else:
     print("[DEBUG] Using control.py (USE_ENHANCED=False)", file=sys.stderr)
     from .control import HttpStepController, prompt_for_action
-from .common import extract_function_context, summarize_value, summarize_delta
+from .common import (
+    SCOPE_POLICIES,
+    CaptureBudget,
+    GlobalsTracker,
+    LineHitCounter,
+    compute_delta,
+    extract_function_context,
+    fit_to_bytes,
+    source_cache,
+    split_budget,
+    summarize_delta,
+    summarize_value,
+    truncated_value,
+    value_codec_id,
+)
 from .function_blocks import FunctionBlockExplorer, get_block_preview
-from .dap_client import DapClient
+from .dap_client import AsyncDapClient, DapClient, DapMessage
 from .db import LineReport, LineReportStore, SessionSummary
+from .executable_lines import get_line_index
+from .loop_summary import LoopItem, LoopSummarizer, store_items
 from .audio_ui import MacSayTTS
 from .nested_explorer import NestedValueExplorer, format_nested_value_summary
 from .syntax_to_speech import syntax_to_speech_code
@@ -47,48 +68,10 @@ def find_alternative_executable_lines(file_path: str, target_line: int) -> Tuple
     
     Returns: (line_before, line_after, is_target_executable)
     """
-    try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-        
-        def is_executable(idx: int) -> bool:
-            if idx < 1 or idx > len(lines):
-                return False
-            text = lines[idx - 1]
-            stripped = text.strip()
-            # Skip empty lines and comments
-            if not stripped or stripped.startswith('#'):
-                return False
-            # Skip docstrings and multiline strings
-            if '"""' in stripped or "'''" in stripped:
-                return False
-            # Check if likely executable
-            if any(kw in text for kw in ['=', 'if ', 'for ', 'while ', 'def ', 'class ', 'return', 'print', 'import']):
-                return True
-            elif not text.startswith(' ') and not text.startswith('\t'):
-                return True
-            return False
-        
-        # Check if target is executable
-        is_target_exec = is_executable(target_line)
-        
-        # Find nearest before
-        line_before = None
-        for idx in range(target_line - 1, 0, -1):
-            if is_executable(idx):
-                line_before = idx
-                break
-        
-        # Find nearest after
-        line_after = None
-        for idx in range(target_line + 1, len(lines) + 1):
-            if is_executable(idx):
-                line_after = idx
-                break
-        
-        return (line_before, line_after, is_target_exec)
-    except Exception:
+    index = get_line_index(file_path)
+    if index is None:
         return (None, None, False)
+    return (index.before(target_line), index.after(target_line), target_line in index)
 
 
 def find_nearest_executable_line(file_path: str, target_line: int) -> int:
@@ -97,62 +80,51 @@ def find_nearest_executable_line(file_path: str, target_line: int) -> int:
     Returns the target line if it's executable, or the next executable line after it.
     Returns 0 if no executable line found.
     """
-    try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-        
-        # Check if target line is executable
-        if 1 <= target_line <= len(lines):
-            text = lines[target_line - 1]
-            stripped = text.strip()
-            
-            # Check if it's likely executable
-            if stripped and not stripped.startswith('#') and '"""' not in stripped and "'''" not in stripped:
-                if any(kw in text for kw in ['=', 'if ', 'for ', 'while ', 'def ', 'class ', 'return', 'print', 'import']):
-                    return target_line
-                elif not text.startswith(' ') and not text.startswith('\t'):
-                    return target_line
-        
-        # Search forward for next executable line
-        for idx in range(target_line, len(lines) + 1):
-            if idx > len(lines):
-                break
-            text = lines[idx - 1]
-            stripped = text.strip()
-            
-            # Skip empty lines and comments
-            if not stripped or stripped.startswith('#'):
-                continue
-            # Skip docstrings and multiline strings
-            if '"""' in stripped or "'''" in stripped:
-                continue
-            # Check if likely executable
-            if any(kw in text for kw in ['=', 'if ', 'for ', 'while ', 'def ', 'class ', 'return', 'print', 'import']):
-                return idx
-            elif not text.startswith(' ') and not text.startswith('\t'):
-                return idx
-        
-        # Search backward if nothing found forward
-        for idx in range(target_line - 1, 0, -1):
-            text = lines[idx - 1]
-            stripped = text.strip()
-            
-            # Skip empty lines and comments
-            if not stripped or stripped.startswith('#'):
-                continue
-            # Skip docstrings and multiline strings
-            if '"""' in stripped or "'''" in stripped:
-                continue
-            # Check if likely executable
-            if any(kw in text for kw in ['=', 'if ', 'for ', 'while ', 'def ', 'class ', 'return', 'print', 'import']):
-                return idx
-            elif not text.startswith(' ') and not text.startswith('\t'):
-                return idx
-                
-    except Exception:
-        pass
-    
-    return 0
+    index = get_line_index(file_path)
+    nearest = index.nearest(target_line) if index is not None else None
+    return nearest or 0
+
+
+# "dap" steps through debugpy; the others record inside the debuggee (see tracer.py)
+CAPTURE_ENGINES = ("dap", "monitor", "settrace")
+CAPTURE_MODES = ("full", "changed")
+# "step" issues stepIn after every stop; "breakpoints" puts a breakpoint on every
+# executable line of the user's files and resumes with continue
+STEPPING_MODES = ("step", "breakpoints")
+# Directories never searched for --breakpoint-glob matches
+_BREAKPOINT_SKIP_DIRS = {"site-packages", "dist-packages", "__pycache__", "node_modules", "venv", "env"}
+# At most this many --breakpoint-glob matches (nearest first) get breakpoints at the
+# first stop; the others are covered when they show up on the stack
+MAX_BREAKPOINT_GLOB_FILES = 64
+# setBreakpoints requests per round trip, and how long one round trip may take
+BREAKPOINT_BATCH_SIZE = 32
+BREAKPOINT_BATCH_WAIT = 30.0
+# run_async: the one thread that touches any session's store, shared by every session
+# in the process so concurrent captures queue their writes instead of contending for locks
+_ASYNC_DB_WRITER = ThreadPoolExecutor(max_workers=1, thread_name_prefix="autodebug-writer")
+
+
+def _glob_parts_match(pattern: List[str], path: List[str]) -> bool:
+    """Whether split ``path`` matches split glob ``pattern`` (``**`` spans directories; no leading-dot matches)."""
+    if not pattern:
+        return not path
+    if pattern[0] == "**":
+        return _glob_parts_match(pattern[1:], path) or (bool(path) and _glob_parts_match(pattern, path[1:]))
+    if not path or (path[0].startswith(".") and not pattern[0].startswith(".")):
+        return False
+    return fnmatch.fnmatchcase(path[0], pattern[0]) and _glob_parts_match(pattern[1:], path[1:])
+
+
+def _breakpoint_batches(requests: List[Tuple[str, Dict[str, Any]]]) -> List[List[Tuple[str, Dict[str, Any]]]]:
+    """Split setBreakpoints requests into round trips of ``BREAKPOINT_BATCH_SIZE``."""
+    return [requests[i:i + BREAKPOINT_BATCH_SIZE] for i in range(0, len(requests), BREAKPOINT_BATCH_SIZE)]
+
+
+def _check_breakpoint_responses(batch: List[Tuple[str, Dict[str, Any]]], responses: List[DapMessage]) -> None:
+    """Raise when the adapter rejected one of ``batch``'s setBreakpoints requests."""
+    for (_command, arguments), response in zip(batch, responses):
+        if not response.success:
+            raise RuntimeError(f"setBreakpoints failed for {arguments['source']['path']}")
 
 
 class AutoDebugger:
@@ -174,6 +146,27 @@ class AutoDebugger:
         self._audio_state_before_goto: bool = False  # To restore audio state after goto
         self._skip_to_next_file_mode: bool = False  # Skip to next file mode
         self._skip_from_file: Optional[str] = None  # Original file we're skipping from
+        self._capture_budget = CaptureBudget()  # Per-variable capture limits for each stop
+        # Per-stop memo keyed by variablesReference; cleared whenever the debuggee resumes
+        self._stop_children_cache: Dict[Tuple[int, Optional[int]], Tuple[Optional[List[Dict[str, Any]]], Optional[Tuple[int, int]]]] = {}
+        self._stop_value_cache: Dict[Tuple[int, CaptureBudget], Any] = {}
+        self._capture_mode = "full"  # "changed": only deep-fetch variables whose preview changed
+        self._scope_policy = "all"  # One of SCOPE_POLICIES
+        self._globals_tracker = GlobalsTracker()
+        self._line_hits = LineHitCounter()  # --max-hits-per-line budget and overflow counters
+        self._loop_summarizer: Optional[LoopSummarizer] = None  # --summarize-loops-after
+        self._stepping = "step"  # One of STEPPING_MODES
+        self._breakpoint_files: Set[str] = set()  # Files already given dense breakpoints
+        self._pending_breakpoint_files: List[str] = []  # --breakpoint-glob matches sent at the first stop
+        self._stepped_lines: Set[Tuple[str, int]] = set()  # Lines auto mode has left with stepIn
+        self._step_in_next = False  # Leave the current stop with stepIn (breakpoints stepping)
+        self._return_site: Optional[Tuple[str, int, int]] = None  # Caller (file, line, depth) of the last stepIn
+        self._write_behind = False  # Rows are committed by the store's writer thread
+        # run_async: the one thread allowed to touch self.db while the event loop runs (_ASYNC_DB_WRITER)
+        self._db_writer: Optional[ThreadPoolExecutor] = None
+        self._value_codec = "json"  # --value-codec name, passed on to in-process engines
+        # Changed mode: per frame, (scope, name) -> (value preview, type, built value) from its last stop
+        self._frame_captures: Dict[Tuple[Any, str, str], Dict[Tuple[str, str], Tuple[Any, Any, Any]]] = {}
 
     def _find_free_port(self) -> int:
         with socket.socket() as s:
@@ -199,6 +192,41 @@ class AutoDebugger:
             t = threading.Thread(target=_pump, daemon=True)
             t.start()
 
+    async def _start_adapter_async(self) -> Tuple["asyncio.subprocess.Process", "asyncio.Task[None]"]:
+        """``_start_adapter`` for run_async: stderr is pumped by a task on the loop instead of a thread."""
+        env = os.environ.copy()
+        env["PYTHONUNBUFFERED"] = "1"
+        proc = await asyncio.create_subprocess_exec(
+            self.python_exe, "-m", "debugpy.adapter", "--host", self.adapter_host, "--port", str(self.adapter_port),
+            env=env, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+        )
+
+        async def _pump() -> None:
+            assert proc.stderr is not None
+            async for line in proc.stderr:
+                sys.stderr.write("[debugpy.adapter] " + line.decode("utf-8", errors="ignore"))
+
+        return proc, asyncio.ensure_future(_pump())
+
+    @staticmethod
+    async def _stop_adapter_async(proc: "asyncio.subprocess.Process", pump: "asyncio.Task[None]") -> None:
+        """Terminate the adapter started by ``_start_adapter_async`` and wait for it."""
+        if proc.returncode is None:
+            try:
+                proc.terminate()
+            except ProcessLookupError:
+                pass
+            try:
+                await asyncio.wait_for(proc.wait(), timeout=3)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+        pump.cancel()
+        try:
+            await pump
+        except (asyncio.CancelledError, Exception):
+            pass
+
     def _stop_adapter(self) -> None:
         if self.client:
             try:
@@ -219,6 +247,267 @@ class AutoDebugger:
                     pass
             self._adapter_proc = None
     
+    def _launch_environment(self, script_abs: str) -> Tuple[str, Dict[str, str]]:
+        """Working directory and environment (with PYTHONPATH) used to launch the debuggee."""
+        script_dir = os.path.dirname(script_abs)
+        parent_dir = os.path.dirname(script_dir)
+
+        # For tests with package imports, we need the parent directory in PYTHONPATH
+        # This allows "from calculator import Calculator" to work properly
+        pythonpath_parts = []
+        
+        # Keep any existing PYTHONPATH
+        if os.environ.get("PYTHONPATH"):
+            pythonpath_parts.append(os.environ.get("PYTHONPATH"))
+        
+        # For scripts inside package structures (directories with __init__.py)
+        # We need to find the root package directory and add its parent to PYTHONPATH
+        if os.path.exists(os.path.join(script_dir, "__init__.py")):
+            # The script is in a package directory
+            # Walk up to find the topmost package directory
+            current_dir = script_dir
+            package_root = script_dir
+            
+            while True:
+                parent = os.path.dirname(current_dir)
+                if os.path.exists(os.path.join(parent, "__init__.py")):
+                    # Parent is also a package, keep going up
+                    package_root = parent
+                    current_dir = parent
+                else:
+                    # Parent is not a package, we found the root
+                    break
+            
+            # Add the parent of the package root to PYTHONPATH
+            package_parent = os.path.dirname(package_root)
+            if package_parent and package_parent not in pythonpath_parts:
+                pythonpath_parts.append(package_parent)
+        
+        # Always add parent directory as fallback
+        if parent_dir not in pythonpath_parts:
+            pythonpath_parts.append(parent_dir)
+        
+        # Build final PYTHONPATH
+        final_pythonpath = os.pathsep.join(filter(None, pythonpath_parts))
+        
+        # Copy current environment and update PYTHONPATH
+        env_vars = os.environ.copy()
+        env_vars["PYTHONPATH"] = final_pythonpath
+
+        # Set working directory based on package structure
+        # If script is in a package, use the package parent as working directory
+        if os.path.exists(os.path.join(script_dir, "__init__.py")):
+            # Find the root package directory (same logic as above)
+            current_dir = script_dir
+            package_root = script_dir
+            
+            while True:
+                parent = os.path.dirname(current_dir)
+                if os.path.exists(os.path.join(parent, "__init__.py")):
+                    package_root = parent
+                    current_dir = parent
+                else:
+                    break
+            
+            # Use parent of package root as working directory
+            working_dir = os.path.dirname(package_root) or os.getcwd()
+        else:
+            working_dir = os.path.dirname(script_abs) or os.getcwd()
+        return working_dir, env_vars
+
+    def _git_provenance(self, script_abs: str) -> Tuple[Optional[str], Optional[str], int]:
+        """Return (git_root, git_commit, git_dirty) for the repository containing the script."""
+        git_root: Optional[str] = None
+        git_commit: Optional[str] = None
+        git_dirty: int = 0
+        try:
+            import subprocess as _sp
+            # Find repo root containing the script
+            probe = _sp.run(["git", "rev-parse", "--show-toplevel"], cwd=os.path.dirname(script_abs), capture_output=True, text=True)
+            if probe.returncode == 0:
+                git_root = probe.stdout.strip()
+                head = _sp.run(["git", "rev-parse", "HEAD"], cwd=git_root, capture_output=True, text=True)
+                if head.returncode == 0:
+                    git_commit = head.stdout.strip()
+                status = _sp.run(["git", "status", "--porcelain"], cwd=git_root, capture_output=True, text=True)
+                if status.returncode == 0 and status.stdout.strip():
+                    git_dirty = 1
+        except Exception:
+            pass
+        return git_root, git_commit, git_dirty
+
+    def _dense_breakpoints(self, script_abs: str) -> List[Dict[str, int]]:
+        """Breakpoints on every executable line of the script (line 1 if it cannot be compiled)."""
+        index = get_line_index(script_abs, self.db if self.db.conn is not None else None)
+        if index is None:
+            return [{"line": 1}]
+        return [{"line": n} for n in index.lines]
+
+    def _breakpoint_targets(self, script_abs: str, patterns: Optional[List[str]]) -> List[str]:
+        """User source files that get dense breakpoints before they show up on the stack.
+
+        Always the script, first. ``patterns`` are globs (relative ones resolve
+        against the script's directory), capped at the ``MAX_BREAKPOINT_GLOB_FILES``
+        nearest matches; without them no other file is searched for.
+        Virtualenvs, site-packages, pip ``--target`` directories (anything
+        holding a ``.dist-info``) and hidden directories are skipped.
+        """
+        script_dir = os.path.dirname(script_abs)
+        files: Set[str] = set()
+        for pattern in patterns or []:
+            if not os.path.isabs(pattern):
+                pattern = os.path.join(script_dir, pattern)
+            parts = os.path.normpath(pattern).split(os.sep)
+            # Walk from the longest literal prefix; skipped directories are pruned, never listed
+            n = next((i for i, part in enumerate(parts) if glob.has_magic(part)), len(parts))
+            base, rest = os.sep.join(parts[:n]) or os.sep, parts[n:]
+            if not rest:
+                if os.path.isfile(base):
+                    files.add(os.path.abspath(base))
+                continue
+            for dirpath, dirnames, filenames in os.walk(base):
+                if any(d.endswith(".dist-info") for d in dirnames):
+                    dirnames[:] = []
+                    continue
+                dirnames[:] = [d for d in dirnames if d not in _BREAKPOINT_SKIP_DIRS and not d.startswith(".")]
+                rel = os.path.relpath(dirpath, base)
+                rel_parts = [] if rel == os.curdir else rel.split(os.sep)
+                for name in filenames:
+                    if _glob_parts_match(rest, rel_parts + [name]):
+                        files.add(os.path.abspath(os.path.join(dirpath, name)))
+        files.discard(script_abs)
+        targets = sorted(files, key=lambda path: (path.count(os.sep), path))
+        if len(targets) > MAX_BREAKPOINT_GLOB_FILES:
+            print(
+                f"[DEBUG] --breakpoint-glob matched {len(targets)} files; breakpoints go on the "
+                f"{MAX_BREAKPOINT_GLOB_FILES} nearest up front, on the others once they show up on the stack",
+                file=sys.stderr, flush=True,
+            )
+            targets = targets[:MAX_BREAKPOINT_GLOB_FILES]
+        return [script_abs, *targets]
+
+    def _breakpoint_requests(self, files: List[str]) -> List[Tuple[str, Dict[str, Any]]]:
+        """setBreakpoints requests for ``files`` not covered yet (marks them covered)."""
+        requests: List[Tuple[str, Dict[str, Any]]] = []
+        for path in files:
+            if not path or path in self._breakpoint_files or not os.path.isfile(path):
+                continue
+            self._breakpoint_files.add(path)
+            requests.append(("setBreakpoints", {"source": {"path": path}, "breakpoints": self._dense_breakpoints(path)}))
+        return requests
+
+    def _uncovered_frame_breakpoints(self, frames: List[Dict[str, Any]]) -> List[Tuple[str, Dict[str, Any]]]:
+        """In ``breakpoints`` stepping, cover uncovered user files on the stack and the pending glob matches.
+
+        Only the script gets breakpoints before ``configurationDone``; glob
+        matches go out at the first stop, while the debuggee is still paused on
+        the script's first line.
+        """
+        if self._stepping != "breakpoints":
+            return []
+        files = [f.get("source", {}).get("path") or "" for f in frames] + self._pending_breakpoint_files
+        self._pending_breakpoint_files = []
+        return self._breakpoint_requests(files)
+
+    def _set_breakpoints(self, client: DapClient, requests: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """Send setBreakpoints requests in bounded batches; a rejected or timed-out batch raises."""
+        for batch in _breakpoint_batches(requests):
+            _check_breakpoint_responses(batch, client.request_batch(batch, wait=BREAKPOINT_BATCH_WAIT))
+
+    async def _set_breakpoints_async(self, client: AsyncDapClient, requests: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """Asyncio counterpart of ``_set_breakpoints``."""
+        for batch in _breakpoint_batches(requests):
+            _check_breakpoint_responses(batch, await client.request_batch(batch, wait=BREAKPOINT_BATCH_WAIT))
+
+    def _breakpoint_stop(self, frames: List[Dict[str, Any]], reason: str) -> bool:
+        """Pick how ``breakpoints`` stepping leaves this stop; False when the stop is not recorded.
+
+        A line is left with ``stepIn`` the first time, so the user files it calls
+        into show up on the stack (and get breakpoints) before ``continue`` can
+        run past them. The caller stop such a ``stepIn`` makes after a return is
+        skipped: ``continue`` never makes it.
+        """
+        if self._stepping != "breakpoints":
+            return True
+        frame = frames[0]
+        here = (frame.get("source", {}).get("path") or "", int(frame.get("line") or 0))
+        after_return = reason == "step" and (*here, len(frames)) == self._return_site
+        self._step_in_next = here not in self._stepped_lines
+        self._stepped_lines.add(here)
+        self._return_site = None
+        if self._step_in_next and len(frames) > 1:
+            caller = frames[1]
+            self._return_site = (caller.get("source", {}).get("path") or "", int(caller.get("line") or 0), len(frames) - 1)
+        return not after_return
+
+    @property
+    def _auto_resume(self) -> str:
+        """DAP command that moves auto mode to the next line to record."""
+        return "continue" if self._stepping == "breakpoints" and not self._step_in_next else "stepIn"
+
+    def _run_inprocess(self, engine: str, script_abs: str, args: List[str], just_my_code: bool) -> str:
+        """Record a session with an in-process engine instead of DAP stepping.
+
+        The debuggee runs ``autodebugger.tracer`` under the target interpreter and
+        writes line reports into the same database; this process only owns the
+        session row. Raises ``RuntimeError`` if the engine cannot start, after
+        deleting the session row.
+        """
+        working_dir, env_vars = self._launch_environment(script_abs)
+        # The target interpreter may not have autodebugger installed; expose this checkout
+        package_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env_vars["PYTHONPATH"] = os.pathsep.join(filter(None, [package_parent, env_vars.get("PYTHONPATH")]))
+        env_vars["PYTHONUNBUFFERED"] = "1"
+        cmd = [
+            self.python_exe, "-m", "autodebugger.tracer",
+            "--engine", engine,
+            "--db", os.path.abspath(self.db.db_path),
+            "--session-id", self.session_id,
+        ]
+        if not just_my_code:
+            cmd.append("--all-code")
+        cmd += ["--scopes", self._scope_policy]
+        if self._line_hits.max_hits is not None:
+            cmd += ["--max-hits-per-line", str(self._line_hits.max_hits)]
+        if self._loop_summarizer is not None:
+            cmd += ["--summarize-loops-after", str(self._loop_summarizer.keep_iterations)]
+        if self._write_behind:
+            cmd.append("--write-behind")
+        if self.db.intern_values:
+            cmd.append("--intern-values")
+        if self._value_codec != "json":
+            cmd += ["--value-codec", self._value_codec]
+        if self.db.keyframe_interval:
+            cmd += ["--keyframe-interval", str(self.db.keyframe_interval)]
+        cmd += ["--capture-depth", str(self._capture_budget.depth)]
+        if self._capture_budget.max_children is not None:
+            cmd += ["--capture-max-children", str(self._capture_budget.max_children)]
+        if self._capture_budget.max_bytes is not None:
+            cmd += ["--capture-max-bytes", str(self._capture_budget.max_bytes)]
+        # The script may exit with any code (2 included), so startup failure comes back in a file
+        fd, startup_error_file = tempfile.mkstemp(prefix="autodebug-engine-", suffix=".txt")
+        os.close(fd)
+        cmd += ["--startup-error-file", startup_error_file, script_abs, *args]
+        try:
+            # Close our handle so the debuggee is the only writer while it runs
+            self.db.close()
+            subprocess.run(cmd, cwd=working_dir, env=env_vars)
+            with open(startup_error_file, encoding="utf-8") as f:
+                startup_error = f.read().strip()
+            self.db.open()
+            if startup_error:
+                # Nothing ran, so leave no finished-looking session behind
+                self.db.delete_session(self.session_id)
+                raise RuntimeError(f"{engine} engine failed to start: {startup_error}")
+            self.db.end_session(self.session_id, utc_now_iso())
+            return self.session_id
+        finally:
+            try:
+                os.remove(startup_error_file)
+            except OSError:
+                pass
+            self.db.close()
+
     def _wait_for_speech_with_interrupt(self) -> bool:
         """Wait for TTS to finish speaking, but check for stop_audio interrupts.
         Returns True if speech completed, False if interrupted."""
@@ -293,117 +582,487 @@ class AutoDebugger:
             return any(self._contains_ellipsis(v) for v in obj.values())
         return False
     
-    def _fetch_complete_value(self, var_ref: int, max_depth: int = 20, seen_refs: Optional[set] = None) -> Any:
+    # Entries debugpy adds to every container that are not part of the actual data
+    _CLUTTER_NAMES = {"special variables", "function variables", "len()"}
+    _CLUTTER_METHODS = {"append", "clear", "copy", "count", "extend", "index",
+                        "insert", "pop", "remove", "reverse", "sort", "get",
+                        "items", "keys", "values", "update", "setdefault",
+                        "popitem", "fromkeys"}
+
+    def _filter_data_variables(self, variables: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Drop special variables, methods and dunder attributes from a ``variables`` response."""
+        filtered_vars = []
+        for var in variables:
+            name = var.get("name", "")
+            if (name in self._CLUTTER_NAMES or
+                name.startswith("__") or
+                name in self._CLUTTER_METHODS):
+                continue
+            filtered_vars.append(var)
+        return filtered_vars
+
+    def _walk_variable_children(
+        self,
+        var_refs: List[int],
+        budget: CaptureBudget,
+        indexed: Optional[Dict[int, int]] = None,
+    ) -> Generator[List[Tuple[int, Dict[str, Any]]], Optional[List[Any]], Tuple[Dict[int, Optional[List[Dict[str, Any]]]], Dict[int, Tuple[int, int]]]]:
+        """Breadth-first walk over the references reachable from ``var_refs``.
+
+        Yields each tree level as ``(ref, variables arguments)`` pairs and expects
+        the matching ``variables`` responses to be sent back (or None to stop).
+        Returns the kept children per reference plus, for containers cut down to
+        ``budget.max_children``, their full length and head sample size. Keeping
+        the walk free of I/O lets the threaded and asyncio clients drive it the
+        same way.
+
+        ``indexed`` maps references to their ``indexedVariables`` count; when an
+        adapter reports one above the budget, only the head and tail pages are
+        requested with ``start``/``count``.
+        """
+        children: Dict[int, Optional[List[Dict[str, Any]]]] = {}
+        truncated: Dict[int, Tuple[int, int]] = {}
+        counts: Dict[int, int] = dict(indexed or {})
+        max_children = budget.max_children
+        level = list(dict.fromkeys(r for r in var_refs if isinstance(r, int) and r > 0))
+        depth = 0
+        while level and depth < budget.depth:
+            requests: List[Tuple[int, Dict[str, Any]]] = []
+            for ref in level:
+                cached = self._stop_children_cache.get((ref, max_children))
+                if cached is not None:
+                    # Already fetched at this stop through another scope or variable
+                    children[ref], sample = cached
+                    if sample:
+                        truncated[ref] = sample
+                    continue
+                count = counts.get(ref)
+                if max_children is not None and count is not None and count > max_children:
+                    head, tail = split_budget(max_children)
+                    requests.append((ref, {"variablesReference": ref, "filter": "indexed", "start": 0, "count": head}))
+                    if tail:
+                        requests.append((ref, {"variablesReference": ref, "filter": "indexed", "start": count - tail, "count": tail}))
+                else:
+                    requests.append((ref, {"variablesReference": ref}))
+            responses = (yield requests) if requests else []
+            if responses is None:
+                break
+            fetched: Dict[int, Optional[List[Dict[str, Any]]]] = {}
+            for (ref, _args), response in zip(requests, responses):
+                if not response or not response.body:
+                    fetched[ref] = None
+                elif ref not in fetched or fetched[ref] is not None:
+                    fetched[ref] = (fetched.get(ref) or []) + response.body.get("variables", [])
+            next_level: List[int] = []
+            for ref in level:
+                if ref in fetched:
+                    variables = fetched[ref]
+                    if variables is None:
+                        children[ref] = None
+                        continue
+                    kept = self._sample_children(ref, variables, counts.get(ref), max_children, truncated)
+                    children[ref] = kept
+                    self._stop_children_cache[(ref, max_children)] = (kept, truncated.get(ref))
+                for var in children.get(ref) or []:
+                    child_ref = var.get("variablesReference", 0)
+                    if isinstance(child_ref, int) and child_ref > 0 and child_ref not in children:
+                        next_level.append(child_ref)
+                        if isinstance(var.get("indexedVariables"), int):
+                            counts[child_ref] = var["indexedVariables"]
+            level = list(dict.fromkeys(r for r in next_level if r not in children))
+            depth += 1
+        return children, truncated
+
+    def _sample_children(
+        self,
+        ref: int,
+        variables: List[Dict[str, Any]],
+        indexed_count: Optional[int],
+        max_children: Optional[int],
+        truncated: Dict[int, Tuple[int, int]],
+    ) -> List[Dict[str, Any]]:
+        """Filter one container's children and cut them down to ``max_children``.
+
+        The container's length comes from ``indexedVariables`` or debugpy's
+        ``len()`` entry. debugpy pages long containers behind a ``more`` child;
+        that continuation is never followed, so the tail sample is only kept
+        when every element was returned.
+        """
+        filtered = self._filter_data_variables(variables)
+        if max_children is None:
+            return filtered
+        length = indexed_count
+        if length is None:
+            for var in variables:
+                if var.get("name") == "len()":
+                    try:
+                        length = int(str(var.get("value")))
+                    except ValueError:
+                        pass
+                    break
+        items = filtered
+        if length is not None and len(filtered) <= length and any(v.get("name") == "more" for v in filtered):
+            items = [v for v in filtered if v.get("name") != "more"]
+        total = length if length is not None else len(items)
+        if total <= max_children and len(items) <= max_children:
+            return items
+        head_n, tail_n = split_budget(max_children)
+        head = items[:head_n]
+        rest = items[head_n:]
+        paged = indexed_count is not None and indexed_count > max_children
+        tail = rest[-tail_n:] if tail_n and (paged or len(items) == total) else []
+        truncated[ref] = (total, len(head))
+        return head + tail
+
+    def _fetch_variable_children(
+        self, var_refs: List[int], budget: CaptureBudget, indexed: Optional[Dict[int, int]] = None
+    ) -> Tuple[Dict[int, Optional[List[Dict[str, Any]]]], Dict[int, Tuple[int, int]]]:
+        """Fetch the kept children of every reference reachable from ``var_refs``.
+
+        Each tree level is sent as one pipelined batch of ``variables`` requests,
+        so a stop costs one round trip per tree level instead of one per container.
+        """
+        if not self.client:
+            return {}, {}
+        walk = self._walk_variable_children(var_refs, budget, indexed)
+        try:
+            level = next(walk)
+            while True:
+                try:
+                    responses: Optional[List[Any]] = self.client.request_batch(
+                        [("variables", arguments) for _ref, arguments in level]
+                    )
+                except Exception as e:
+                    print(f"[Debug] Failed to fetch variables for refs {[ref for ref, _a in level[:5]]}: {e}")
+                    responses = None
+                level = walk.send(responses)
+        except StopIteration as stop:
+            return stop.value
+
+    async def _fetch_complete_values_async(
+        self,
+        client: AsyncDapClient,
+        var_refs: List[int],
+        budget: Optional[CaptureBudget] = None,
+        indexed: Optional[Dict[int, int]] = None,
+    ) -> Dict[int, Any]:
+        """Asyncio counterpart of ``_fetch_complete_values``."""
+        budget = budget or CaptureBudget()
+        missing = [ref for ref in var_refs if isinstance(ref, int) and ref > 0 and (ref, budget) not in self._stop_value_cache]
+        if not missing:
+            return self._cached_complete_values(var_refs, budget)
+        walk = self._walk_variable_children(missing, budget, indexed)
+        children: Dict[int, Optional[List[Dict[str, Any]]]] = {}
+        truncated: Dict[int, Tuple[int, int]] = {}
+        try:
+            level = next(walk)
+            while True:
+                try:
+                    responses: Optional[List[Any]] = await client.request_batch(
+                        [("variables", arguments) for _ref, arguments in level]
+                    )
+                except Exception as e:
+                    print(f"[Debug] Failed to fetch variables for refs {[ref for ref, _a in level[:5]]}: {e}")
+                    responses = None
+                level = walk.send(responses)
+        except StopIteration as stop:
+            children, truncated = stop.value
+        self._cache_complete_values(missing, children, truncated, budget)
+        return self._cached_complete_values(var_refs, budget)
+
+    def _build_complete_value(
+        self,
+        var_ref: int,
+        children: Dict[int, Optional[List[Dict[str, Any]]]],
+        max_depth: int,
+        seen_refs: set,
+        truncated: Optional[Dict[int, Tuple[int, int]]] = None,
+    ) -> Any:
+        """Assemble a clean Python value for ``var_ref`` from already fetched children."""
+        if var_ref <= 0 or max_depth <= 0:
+            return None
+        if var_ref in seen_refs:
+            return "<circular reference>"
+        seen_refs.add(var_ref)
+
+        filtered_vars = children.get(var_ref)
+        # Now check if this is a list/dict based on actual data keys
+        if not filtered_vars:
+            return None
+
+        def _child_value(var: Dict[str, Any]) -> Any:
+            value_str = var.get("value", "")
+            child_ref = var.get("variablesReference", 0)
+            if child_ref > 0:
+                # Recursively build children
+                child_value = self._build_complete_value(child_ref, children, max_depth - 1, seen_refs, truncated)
+                if child_value is not None:
+                    return child_value
+                return self._parse_string_to_object(value_str)
+            parsed = self._parse_string_to_object(value_str)
+            if isinstance(parsed, dict) and parsed.get("_needs_fetch"):
+                # Still has ellipsis, just use string
+                return value_str
+            return parsed
+
+        sample = truncated.get(var_ref) if truncated else None
+
+        # Check if all remaining keys are numeric (it's a list)
+        if all(v.get("name", "").isdigit() for v in filtered_vars):
+            # Build as a list - ONLY the actual values, sorted by numeric index
+            sorted_vars = sorted(filtered_vars, key=lambda v: int(v.get("name", "0")))
+            values = [_child_value(var) for var in sorted_vars]
+            if sample:
+                length, head_n = sample
+                return truncated_value("list", length, values[:head_n], values[head_n:])
+            return values
+
+        # Build as a dict - ONLY actual key-value pairs
+        result = {}
+        for var in filtered_vars:
+            name = var.get("name", "")
+            # Clean up quoted keys like "'key'" -> "key"
+            if name.startswith("'") and name.endswith("'"):
+                name = name[1:-1]
+            result[name] = _child_value(var)
+        if sample:
+            length, head_n = sample
+            items = list(result.items())
+            return truncated_value("dict", length, dict(items[:head_n]), dict(items[head_n:]))
+        return result
+
+    def _fetch_complete_values(
+        self,
+        var_refs: List[int],
+        budget: Optional[CaptureBudget] = None,
+        indexed: Optional[Dict[int, int]] = None,
+    ) -> Dict[int, Any]:
+        """Fetch clean values for several references at once (see ``_fetch_complete_value``)."""
+        budget = budget or CaptureBudget()
+        missing = [ref for ref in var_refs if isinstance(ref, int) and ref > 0 and (ref, budget) not in self._stop_value_cache]
+        if missing:
+            children, truncated = self._fetch_variable_children(missing, budget, indexed)
+            self._cache_complete_values(missing, children, truncated, budget)
+        return self._cached_complete_values(var_refs, budget)
+
+    def _cache_complete_values(
+        self,
+        var_refs: List[int],
+        children: Dict[int, Optional[List[Dict[str, Any]]]],
+        truncated: Dict[int, Tuple[int, int]],
+        budget: CaptureBudget,
+    ) -> None:
+        for ref in var_refs:
+            self._stop_value_cache[(ref, budget)] = self._build_complete_value(ref, children, budget.depth, set(), truncated)
+
+    def _cached_complete_values(self, var_refs: List[int], budget: CaptureBudget) -> Dict[int, Any]:
+        return {
+            ref: self._stop_value_cache.get((ref, budget))
+            for ref in var_refs
+            if isinstance(ref, int) and ref > 0
+        }
+
+    def _invalidate_stop_cache(self) -> None:
+        """Forget fetched variables; references are only valid until the debuggee resumes."""
+        self._stop_children_cache.clear()
+        self._stop_value_cache.clear()
+
+    def _resume(self, client: DapClient, command: str, thread_id: int) -> DapMessage:
+        """Send ``stepIn``/``continue`` for ``thread_id`` after dropping this stop's cache."""
+        self._invalidate_stop_cache()
+        return client.request(command, {"threadId": thread_id})
+
+    def _fetch_complete_value(self, var_ref: int, max_depth: int = 20) -> Any:
         """Fetch ONLY the actual data from debugpy - no Python internals.
         
         Filters out all methods, special variables, and Python-specific clutter.
         """
         if not self.client or var_ref <= 0 or max_depth <= 0:
             return None
-        
-        # Track seen references to avoid infinite loops
-        if seen_refs is None:
-            seen_refs = set()
-        if var_ref in seen_refs:
-            return "<circular reference>"
-        seen_refs.add(var_ref)
-            
-        try:
-            # Fetch ALL variables for this reference
-            response = self.client.request("variables", {"variablesReference": var_ref})
-            if not response or not response.body:
-                return None
-                
-            variables = response.body.get("variables", [])
-            
-            # Filter out all the Python clutter
-            filtered_vars = []
-            for var in variables:
-                name = var.get("name", "")
-                # Skip ALL these:
-                # - Special variables section
-                # - Function variables section  
-                # - Methods (append, clear, copy, etc.)
-                # - Private attributes (__xxx__)
-                # - len() and other special entries
-                if (name == "special variables" or 
-                    name == "function variables" or
-                    name.startswith("__") or
-                    name == "len()" or
-                    name in {"append", "clear", "copy", "count", "extend", "index", 
-                            "insert", "pop", "remove", "reverse", "sort", "get",
-                            "items", "keys", "values", "update", "setdefault",
-                            "popitem", "fromkeys"}):
+        return self._fetch_complete_values([var_ref], CaptureBudget(depth=max_depth)).get(var_ref)
+    
+    _SKIPPED_SCOPE_ENTRIES = {"special variables", "function variables", "class variables"}
+
+    def _scope_refs(self, scopes: DapMessage) -> List[Tuple[str, int]]:
+        """(scope name, variablesReference) for each non-empty scope the scope policy captures."""
+        refs = [
+            (str(sc.get("name")), sc.get("variablesReference"))
+            for sc in (scopes.body.get("scopes", []) if scopes.body else [])
+            if sc.get("variablesReference")
+        ]
+        if self._scope_policy == "locals":
+            refs = [(name, vr) for name, vr in refs if name == "Locals"]
+        return refs
+
+    def _select_globals(
+        self, frame: Dict[str, Any], scope_vars: List[Tuple[str, List[Dict[str, Any]]]]
+    ) -> Tuple[List[Tuple[str, List[Dict[str, Any]]]], Optional[Tuple[str, Dict[str, Any], bool]]]:
+        """Under ``locals+changed-globals``, keep only the globals that need a fresh capture.
+
+        Globals are fingerprinted by DAP preview and type per module; the first
+        stop in a module captures all of them. Default ``<... at 0x...>`` reprs
+        are always recaptured since their preview hides attribute changes.
+        Returns the trimmed scopes and a (module, fingerprints, first sight) plan
+        for ``_apply_globals_policy``.
+        """
+        if self._scope_policy != "locals+changed-globals":
+            return scope_vars, None
+        module = frame.get("source", {}).get("path") or ""
+        plan: Optional[Tuple[str, Dict[str, Any], bool]] = None
+        selected: List[Tuple[str, List[Dict[str, Any]]]] = []
+        for scope_name, var_list in scope_vars:
+            if scope_name == "Globals":
+                fingerprints = {str(v.get("name")): (v.get("value"), v.get("type")) for v in var_list}
+                changed = self._globals_tracker.changed_names(module, fingerprints)
+                if changed is not None:
+                    var_list = [
+                        v for v in var_list
+                        if str(v.get("name")) in changed or self._OPAQUE_PREVIEW.search(str(v.get("value")))
+                    ]
+                plan = (module, fingerprints, changed is None)
+            selected.append((scope_name, var_list))
+        return selected, plan
+
+    def _apply_globals_policy(
+        self, vars_payload: Dict[str, Any], plan: Optional[Tuple[str, Dict[str, Any], bool]]
+    ) -> Tuple[Dict[str, Any], Dict[str, Any], Optional[Tuple[str, Dict[str, Any]]]]:
+        """Split a stop's payload into (stored row, full view for deltas, globals snapshot).
+
+        The first stop in a module yields a snapshot of all its globals and stores
+        none in the row; later rows store only the globals that changed.
+        """
+        if plan is None:
+            return vars_payload, vars_payload, None
+        module, fingerprints, first_sight = plan
+        all_globals, changes = self._globals_tracker.update(module, fingerprints, vars_payload.get("Globals", {}))
+        full_view = {**vars_payload, "Globals": all_globals}
+        stored = {**vars_payload, "Globals": {} if first_sight else changes}
+        return stored, full_view, ((module, all_globals) if first_sight else None)
+
+    def _scope_variables(
+        self, scope_refs: List[Tuple[str, int]], responses: List[DapMessage]
+    ) -> List[Tuple[str, List[Dict[str, Any]]]]:
+        """Pair each scope with its variables, dropping debugpy's grouping entries."""
+        scope_vars: List[Tuple[str, List[Dict[str, Any]]]] = []
+        for (scope_name, _vr), vres in zip(scope_refs, responses):
+            var_list = vres.body.get("variables", []) if vres.body else []
+            scope_vars.append((scope_name, [v for v in var_list if str(v.get("name")) not in self._SKIPPED_SCOPE_ENTRIES]))
+        return scope_vars
+
+    def _variable_refs(self, scope_vars: List[Tuple[str, List[Dict[str, Any]]]]) -> List[int]:
+        return [
+            v.get("variablesReference")
+            for _scope_name, var_list in scope_vars
+            for v in var_list
+            if isinstance(v.get("variablesReference"), int) and v.get("variablesReference") > 0
+        ]
+
+    _OPAQUE_PREVIEW = re.compile(r" at 0x[0-9a-fA-F]+>")
+
+    def _frame_key(self, frame: Dict[str, Any]) -> Tuple[Any, str, str]:
+        return (frame.get("id"), frame.get("source", {}).get("path") or "", str(frame.get("name")))
+
+    def _plan_capture(
+        self, frame: Dict[str, Any], scope_vars: List[Tuple[str, List[Dict[str, Any]]]]
+    ) -> Tuple[List[int], Dict[int, Any]]:
+        """Split this stop's references into those to deep-fetch and reusable values.
+
+        In ``changed`` capture mode a variable whose DAP ``value`` preview and
+        ``type`` match this frame's previous stop keeps its previously built
+        value; everything else (and every variable in ``full`` mode) is fetched.
+        Previews holding a default ``<... at 0x...>`` repr say nothing about the
+        object's contents, so those are always fetched.
+        """
+        refs = self._variable_refs(scope_vars)
+        if self._capture_mode != "changed":
+            return refs, {}
+        previous = self._frame_captures.get(self._frame_key(frame), {})
+        fetch: List[int] = []
+        reused: Dict[int, Any] = {}
+        for scope_name, var_list in scope_vars:
+            for v in var_list:
+                ref = v.get("variablesReference")
+                if not (isinstance(ref, int) and ref > 0):
                     continue
-                filtered_vars.append(var)
-            
-            # Now check if this is a list/dict based on actual data keys
-            if not filtered_vars:
-                return None
-                
-            # Check if all remaining keys are numeric (it's a list)
-            is_sequence = all(v.get("name", "").isdigit() for v in filtered_vars)
-            
-            if is_sequence:
-                # Build as a list - ONLY the actual values
-                items = []
-                # Sort by numeric index
-                sorted_vars = sorted(filtered_vars, key=lambda v: int(v.get("name", "0")))
-                for var in sorted_vars:
-                    value_str = var.get("value", "")
-                    child_ref = var.get("variablesReference", 0)
-                    
-                    if child_ref > 0:
-                        # Recursively fetch children
-                        child_value = self._fetch_complete_value(child_ref, max_depth - 1, seen_refs)
-                        if child_value is not None:
-                            items.append(child_value)
-                        else:
-                            # Parse the string value
-                            parsed = self._parse_string_to_object(value_str)
-                            items.append(parsed)
-                    else:
-                        # Parse the value
-                        parsed = self._parse_string_to_object(value_str)
-                        if isinstance(parsed, dict) and parsed.get("_needs_fetch"):
-                            # Still has ellipsis, just use string
-                            items.append(value_str)
-                        else:
-                            items.append(parsed)
-                return items
-            else:
-                # Build as a dict - ONLY actual key-value pairs
-                result = {}
-                for var in filtered_vars:
-                    name = var.get("name", "")
-                    # Clean up quoted keys like "'key'" -> "key"
-                    if name.startswith("'") and name.endswith("'"):
-                        name = name[1:-1]
-                    
-                    value_str = var.get("value", "")
-                    child_ref = var.get("variablesReference", 0)
-                    
-                    if child_ref > 0:
-                        # Recursively fetch children
-                        child_value = self._fetch_complete_value(child_ref, max_depth - 1, seen_refs)
-                        if child_value is not None:
-                            result[name] = child_value
-                        else:
-                            parsed = self._parse_string_to_object(value_str)
-                            result[name] = parsed
+                prev = previous.get((scope_name, str(v.get("name"))))
+                preview = v.get("value")
+                if (
+                    prev is not None
+                    and prev[2] is not None
+                    and prev[0] == preview
+                    and prev[1] == v.get("type")
+                    and not self._OPAQUE_PREVIEW.search(str(preview))
+                ):
+                    reused[ref] = prev[2]
+                else:
+                    fetch.append(ref)
+        return fetch, reused
+
+    def _remember_capture(
+        self,
+        frame: Dict[str, Any],
+        frames: List[Dict[str, Any]],
+        scope_vars: List[Tuple[str, List[Dict[str, Any]]]],
+        complete_values: Dict[int, Any],
+    ) -> None:
+        """Record this frame's previews and built values for the next stop (``changed`` mode)."""
+        if self._capture_mode != "changed":
+            return
+        # Frames that left the stack will not be compared again
+        live = {self._frame_key(fr) for fr in frames}
+        self._frame_captures = {k: v for k, v in self._frame_captures.items() if k in live}
+        self._frame_captures[self._frame_key(frame)] = {
+            (scope_name, str(v.get("name"))): (v.get("value"), v.get("type"), complete_values.get(v.get("variablesReference")))
+            for scope_name, var_list in scope_vars
+            for v in var_list
+            if isinstance(v.get("variablesReference"), int) and v.get("variablesReference") > 0
+        }
+
+    def _indexed_counts(self, scope_vars: List[Tuple[str, List[Dict[str, Any]]]]) -> Dict[int, int]:
+        """``indexedVariables`` per reference, for adapters that support paging."""
+        return {
+            v["variablesReference"]: v["indexedVariables"]
+            for _scope_name, var_list in scope_vars
+            for v in var_list
+            if isinstance(v.get("variablesReference"), int) and isinstance(v.get("indexedVariables"), int)
+        }
+
+    def _build_scope_payload(
+        self, scope_vars: List[Tuple[str, List[Dict[str, Any]]]], complete_values: Dict[int, Any]
+    ) -> Dict[str, Any]:
+        """Build the stored ``{scope: {name: value}}`` payload for one stop."""
+        vars_payload: Dict[str, Any] = {}
+        for scope_name, var_list in scope_vars:
+            scope_map: Dict[str, Any] = {}
+            for v in var_list:
+                vname = str(v.get("name"))
+                vvalue = v.get("value")
+                vref = v.get("variablesReference")
+
+                if isinstance(vref, int) and vref > 0:
+                    complete = complete_values.get(vref)
+                    if complete is not None:
+                        scope_map[vname] = complete
                     else:
-                        # Parse the value
-                        parsed = self._parse_string_to_object(value_str)
-                        if isinstance(parsed, dict) and parsed.get("_needs_fetch"):
-                            result[name] = value_str
-                        else:
-                            result[name] = parsed
-                return result
-                
-        except Exception as e:
-            print(f"[Debug] Failed to fetch complete value for ref {var_ref}: {e}")
-            return None
-    
+                        # Fallback to string value
+                        scope_map[vname] = self._parse_string_to_object(vvalue)
+                else:
+                    # No reference, just parse the value
+                    scope_map[vname] = self._parse_string_to_object(vvalue)
+                scope_map[vname] = fit_to_bytes(scope_map[vname], self._capture_budget.max_bytes)
+            vars_payload[scope_name] = scope_map
+        return vars_payload
+
+    def _stack_trace_text(self, stack_trace: DapMessage) -> str:
+        """Render a ``stackTrace`` response as ``path:line`` lines, innermost first."""
+        stack_lines = []
+        for fr in (stack_trace.body.get("stackFrames", []) if stack_trace.body else []):
+            sp = fr.get("source", {}).get("path")
+            sl = fr.get("line")
+            if sp and sl:
+                stack_lines.append(f"{sp}:{sl}")
+        return "\n".join(stack_lines)
+
     def _extract_display_values(self, vars_dict: Dict[str, Any]) -> Dict[str, Any]:
         """Extract displayable values from structured variable format.
         
@@ -477,8 +1136,67 @@ class AutoDebugger:
         max_memory_mb: Optional[int] = None,
         max_disk_usage_mb: Optional[int] = None,
         record_resources: bool = False,
+        engine: str = "dap",
+        async_loop: bool = False,
+        capture_budget: Optional[CaptureBudget] = None,
+        capture_mode: str = "full",
+        scopes: str = "all",
+        max_hits_per_line: Optional[int] = None,
+        summarize_loops_after: Optional[int] = None,
+        stepping: str = "step",
+        breakpoint_globs: Optional[List[str]] = None,
+        write_behind: bool = False,
+        intern_values: bool = False,
+        value_codec: str = "json",
+        keyframe_interval: Optional[int] = None,
+        shard_sessions: bool = False,
     ) -> str:
         script_abs = os.path.abspath(script_path)
+        if capture_budget is not None:
+            self._capture_budget = capture_budget
+        # async_loop already writes from its own thread
+        self._write_behind = write_behind
+        self.db.intern_values = intern_values
+        self._value_codec = value_codec
+        self.db.value_codec = value_codec_id(value_codec)
+        self.db.keyframe_interval = keyframe_interval
+        # The in-process engines find the session's file through its summary row
+        self.db.shard_sessions = shard_sessions
+        if capture_mode not in CAPTURE_MODES:
+            raise ValueError(f"Unknown capture mode {capture_mode!r}; expected one of {', '.join(CAPTURE_MODES)}")
+        self._capture_mode = capture_mode
+        if scopes not in SCOPE_POLICIES:
+            raise ValueError(f"Unknown scope policy {scopes!r}; expected one of {', '.join(SCOPE_POLICIES)}")
+        self._scope_policy = scopes
+        if max_hits_per_line is not None and max_hits_per_line < 1:
+            raise ValueError("max_hits_per_line must be at least 1")
+        self._line_hits = LineHitCounter(max_hits_per_line)
+        if summarize_loops_after is not None and summarize_loops_after < 0:
+            raise ValueError("summarize_loops_after must not be negative")
+        self._loop_summarizer = (
+            LoopSummarizer(self.session_id, summarize_loops_after) if summarize_loops_after is not None else None
+        )
+        if stepping not in STEPPING_MODES:
+            raise ValueError(f"Unknown stepping mode {stepping!r}; expected one of {', '.join(STEPPING_MODES)}")
+        if stepping != "step" and (engine != "dap" or manual or manual_from or manual_web or manual_audio):
+            raise ValueError("breakpoints stepping drives auto-mode --engine dap capture only")
+        self._stepping = stepping
+        self._breakpoint_files = set()
+        self._stepped_lines = set()
+        self._pending_breakpoint_files = self._breakpoint_targets(script_abs, breakpoint_globs) if stepping == "breakpoints" else []
+        if engine not in CAPTURE_ENGINES:
+            raise ValueError(f"Unknown capture engine {engine!r}; expected one of {', '.join(CAPTURE_ENGINES)}")
+        if engine != "dap" and (manual or manual_from or manual_web or manual_audio):
+            raise ValueError(f"--engine {engine} records in auto mode only; manual stepping requires --engine dap")
+        if async_loop:
+            if engine != "dap" or manual or manual_from or manual_web or manual_audio:
+                raise ValueError("async_loop drives auto-mode --engine dap capture only")
+            if max_loop_iterations or max_memory_mb or max_disk_usage_mb or record_resources:
+                raise ValueError("async_loop does not support resource limits or resource recording")
+            return asyncio.run(self.run_async(
+                script_path, args, just_my_code=just_my_code, stop_on_entry=stop_on_entry,
+                stepping=stepping, breakpoint_globs=breakpoint_globs,
+            ))
         
         # Debug output for resource management
         if max_loop_iterations is not None:
@@ -567,23 +1285,7 @@ class AutoDebugger:
                 except Exception:
                     pass
         # Detect git provenance
-        git_root: Optional[str] = None
-        git_commit: Optional[str] = None
-        git_dirty: int = 0
-        try:
-            import subprocess as _sp
-            # Find repo root containing the script
-            probe = _sp.run(["git", "rev-parse", "--show-toplevel"], cwd=os.path.dirname(script_abs), capture_output=True, text=True)
-            if probe.returncode == 0:
-                git_root = probe.stdout.strip()
-                head = _sp.run(["git", "rev-parse", "HEAD"], cwd=git_root, capture_output=True, text=True)
-                if head.returncode == 0:
-                    git_commit = head.stdout.strip()
-                status = _sp.run(["git", "status", "--porcelain"], cwd=git_root, capture_output=True, text=True)
-                if status.returncode == 0 and status.stdout.strip():
-                    git_dirty = 1
-        except Exception:
-            pass
+        git_root, git_commit, git_dirty = self._git_provenance(script_abs)
 
         # Loop iteration tracking for resource management
         loop_iteration_counts: Dict[Tuple[str, int], int] = {}  # (file_path, line_no) -> iteration count
@@ -636,6 +1338,11 @@ class AutoDebugger:
         print(f"[DEBUG] Starting debugger for: {script_abs}", file=sys.stderr, flush=True)
         print(f"[DEBUG] Session ID: {self.session_id}", file=sys.stderr, flush=True)
 
+        if engine != "dap":
+            return self._run_inprocess(engine, script_abs, args or [], just_my_code)
+        if write_behind:
+            self.db.start_write_behind()
+
         self._start_adapter()
         try:
             # Connect DAP client with retries while adapter starts
@@ -682,72 +1389,12 @@ class AutoDebugger:
             #     else:
             #         module_name = f"{pkg}.{script_name}"
 
-            # For tests with package imports, we need the parent directory in PYTHONPATH
-            # This allows "from calculator import Calculator" to work properly
-            pythonpath_parts = []
-            
-            # Keep any existing PYTHONPATH
-            if os.environ.get("PYTHONPATH"):
-                pythonpath_parts.append(os.environ.get("PYTHONPATH"))
-            
-            # For scripts inside package structures (directories with __init__.py)
-            # We need to find the root package directory and add its parent to PYTHONPATH
-            if os.path.exists(os.path.join(script_dir, "__init__.py")):
-                # The script is in a package directory
-                # Walk up to find the topmost package directory
-                current_dir = script_dir
-                package_root = script_dir
-                
-                while True:
-                    parent = os.path.dirname(current_dir)
-                    if os.path.exists(os.path.join(parent, "__init__.py")):
-                        # Parent is also a package, keep going up
-                        package_root = parent
-                        current_dir = parent
-                    else:
-                        # Parent is not a package, we found the root
-                        break
-                
-                # Add the parent of the package root to PYTHONPATH
-                package_parent = os.path.dirname(package_root)
-                if package_parent and package_parent not in pythonpath_parts:
-                    pythonpath_parts.append(package_parent)
-            
-            # Always add parent directory as fallback
-            if parent_dir not in pythonpath_parts:
-                pythonpath_parts.append(parent_dir)
-            
-            # Build final PYTHONPATH
-            final_pythonpath = os.pathsep.join(filter(None, pythonpath_parts))
-            
-            # Copy current environment and update PYTHONPATH
-            env_vars = os.environ.copy()
-            env_vars["PYTHONPATH"] = final_pythonpath
+            working_dir, env_vars = self._launch_environment(script_abs)
 
             # Send launch but do not block waiting for response yet
             # Don't stop on entry if using --manual-from (we want to run to breakpoint)
             effective_stop_on_entry = stop_on_entry and not manual_from
             
-            # Set working directory based on package structure
-            # If script is in a package, use the package parent as working directory
-            if os.path.exists(os.path.join(script_dir, "__init__.py")):
-                # Find the root package directory (same logic as above)
-                current_dir = script_dir
-                package_root = script_dir
-                
-                while True:
-                    parent = os.path.dirname(current_dir)
-                    if os.path.exists(os.path.join(parent, "__init__.py")):
-                        package_root = parent
-                        current_dir = parent
-                    else:
-                        break
-                
-                # Use parent of package root as working directory
-                working_dir = os.path.dirname(package_root) or os.getcwd()
-            else:
-                working_dir = os.path.dirname(script_abs) or os.getcwd()
-            
             launch_args = {
                 "name": "Python: AutoDebug",
                 "type": "python",
@@ -771,58 +1418,41 @@ class AutoDebugger:
             start_wait = time.time()
             initialized_seen = False
             while time.time() - start_wait < 15.0 and not initialized_seen:
-                for ev in client.pop_events():
+                for ev in client.wait_events(timeout=max(0.0, 15.0 - (time.time() - start_wait))):
                     if ev.event == "initialized":
                         initialized_seen = True
                         break
-                if not initialized_seen:
-                    time.sleep(0.05)
 
             # Set default exception breakpoints (common filters)
             try:
                 client.request("setExceptionBreakpoints", {"filters": ["uncaught"], "filterOptions": []}, wait=10.0)
             except Exception:
                 pass
-            # Set breakpoints to ensure we stop at the right place
-            try:
-                breakpoints: List[Dict[str, int]] = []
+            if stepping == "breakpoints":
+                # Only the script up front; glob matches follow at the first stop.
+                # A failure ends the run instead of recording a session without stops.
+                self._set_breakpoints(client, self._breakpoint_requests([script_abs]))
+            else:
+                # Set breakpoints to ensure we stop at the right place
+                try:
+                    breakpoints: List[Dict[str, int]] = []
                 
-                if manual_from and manual_trigger_file and manual_trigger_line:
-                    # Set a breakpoint at the trigger line for --manual-from
-                    breakpoints = [{"line": manual_trigger_line}]
-                    client.request("setBreakpoints", {
-                        "source": {"path": manual_trigger_file},
-                        "breakpoints": breakpoints
-                    }, wait=10.0)
-                elif manual_mode_active or stop_on_entry:
-                    # Set dense breakpoints on all likely executable lines
-                    try:
-                        with open(script_abs, "r", encoding="utf-8") as _sf:
-                            _lines = _sf.readlines()
-                        for idx, text in enumerate(_lines, start=1):
-                            stripped = text.strip()
-                            # Skip empty lines and comments
-                            if not stripped or stripped.startswith('#'):
-                                continue
-                            # Skip docstrings and multiline strings
-                            if '"""' in stripped or "'''" in stripped:
-                                continue
-                            # Add breakpoint for likely executable lines
-                            if any(kw in text for kw in ['=', 'if ', 'for ', 'while ', 'def ', 'class ', 'return', 'print', 'import']):
-                                breakpoints.append({"line": idx})
-                            # Also add for lines that don't start with whitespace (top-level)
-                            elif not text.startswith(' ') and not text.startswith('\t'):
-                                breakpoints.append({"line": idx})
-                    except Exception:
-                        # Fallback to line 1
-                        breakpoints = [{"line": 1}]
-                    
-                    client.request("setBreakpoints", {
-                        "source": {"path": script_abs},
-                        "breakpoints": breakpoints
-                    }, wait=10.0)
-            except Exception:
-                pass
+                    if manual_from and manual_trigger_file and manual_trigger_line:
+                        # Set a breakpoint at the trigger line for --manual-from
+                        breakpoints = [{"line": manual_trigger_line}]
+                        client.request("setBreakpoints", {
+                            "source": {"path": manual_trigger_file},
+                            "breakpoints": breakpoints
+                        }, wait=10.0)
+                    elif manual_mode_active or stop_on_entry:
+                        # Set dense breakpoints on all likely executable lines
+                        breakpoints = self._dense_breakpoints(script_abs)
+                        client.request("setBreakpoints", {
+                            "source": {"path": script_abs},
+                            "breakpoints": breakpoints
+                        }, wait=10.0)
+                except Exception:
+                    pass
             # Send configurationDone to start execution
             client.request("configurationDone", {}, wait=15.0)
             
@@ -854,8 +1484,11 @@ class AutoDebugger:
             threads: Dict[int, None] = {}
             running = True
             prev_vars: Dict[str, Any] = {}
-            # Snapshot each source file once per session so UI can render exact code for dirty/no-git runs
-            snapshotted_files: Set[str] = set()
+            # Snapshot each source file once per session so UI can render exact code for dirty/no-git runs.
+            # Files known up front are stored before the first stop; others when first seen.
+            snapshotted_files: Set[str] = {script_abs}
+            for _path in snapshotted_files:
+                self._snapshot_file(_path)
             
             def _check_for_action(timeout: float = 0.0) -> Optional[str]:
                 """Check for user action from web or stdin."""
@@ -896,11 +1529,12 @@ class AutoDebugger:
                         manual_mode_active = False
                         if self._controller:
                             self._controller.update_state(mode='auto')
-                events = client.pop_events()
-                # If nothing arrived, small sleep to avoid spin
+                # Block until the adapter sends something; wake periodically only to poll the controller
+                events = client.wait_events(timeout=0.05 if self._controller is not None else 1.0)
                 if not events:
-                    # Use minimal delay for faster response
-                    time.sleep(0.001)  # 1ms for faster stepping
+                    if not client.connected:
+                        # Adapter went away without a terminated event
+                        running = False
                     continue
                 for ev in events:
                     if ev.event == "initialized":
@@ -922,6 +1556,8 @@ class AutoDebugger:
                     if ev.event == "stopped":
                         thread_id = int(ev.body.get("threadId")) if ev.body else 0
                         reason = ev.body.get("reason") if ev.body else ""
+                        # References from any earlier stop are stale now
+                        self._invalidate_stop_cache()
                         
                         # Track if we should step after processing
                         should_step_after = True
@@ -963,6 +1599,12 @@ class AutoDebugger:
                         frame = frames[0]
                         file_path = frame.get("source", {}).get("path") or ""
                         line = int(frame.get("line") or 0)
+                        uncovered = self._uncovered_frame_breakpoints(frames)
+                        if uncovered:
+                            self._set_breakpoints(client, uncovered)
+                        if not self._breakpoint_stop(frames, reason or ""):
+                            self._resume(client, self._auto_resume, thread_id)
+                            continue
 
                         # Check if we've reached the goto target
                         if self._goto_mode_active and self._goto_target_line and self._goto_target_file:
@@ -1003,23 +1645,16 @@ class AutoDebugger:
                         # even when the working tree is dirty or the file changes after execution.
                         if file_path and file_path not in snapshotted_files:
                             try:
-                                with open(file_path, "rb") as _f:
-                                    _content = _f.read()
-                                self.db.add_file_snapshot(self.session_id, file_path, _content)
-                                snapshotted_files.add(file_path)
+                                _content = source_cache.get_bytes(file_path)
+                                if _content is not None:
+                                    self.db.add_file_snapshot(self.session_id, file_path, _content)
+                                    snapshotted_files.add(file_path)
                             except Exception:
                                 # Best-effort; continue even if snapshotting fails
                                 pass
 
                         # Grab code line
-                        code = ""
-                        try:
-                            with open(file_path, "r", encoding="utf-8") as f:
-                                lines = f.readlines()
-                                if 1 <= line <= len(lines):
-                                    code = lines[line - 1].rstrip("\n")
-                        except Exception:
-                            code = ""
+                        code = source_cache.get_line(file_path, line)
 
                         # Memory usage check for resource management
                         if max_memory_mb is not None and process_pid is not None:
@@ -1037,7 +1672,7 @@ class AutoDebugger:
                                         pass
                                     
                                     # Record in database
-                                    self.db.end_session(self.session_id, utc_now_iso())
+                                    self._finish_session()
                                     return self.session_id
                         
                         # Disk usage check for resource management
@@ -1057,7 +1692,7 @@ class AutoDebugger:
                                         pass
                                     
                                     # Record in database
-                                    self.db.end_session(self.session_id, utc_now_iso())
+                                    self._finish_session()
                                     return self.session_id
                         
                         # Loop iteration tracking for resource management and recording
@@ -1093,7 +1728,7 @@ class AutoDebugger:
                                             pass
                                         
                                         # Record in database
-                                        self.db.end_session(self.session_id, utc_now_iso())
+                                        self._finish_session()
                                         # TODO: Add error tracking to database if needed
                                         return self.session_id
                                 else:
@@ -1122,47 +1757,50 @@ class AutoDebugger:
                                             del loop_iteration_counts[loop_loc]
                                 loop_stack[:] = new_stack
 
+                        # Past --max-hits-per-line, only count the hit: skip scopes, variables
+                        # and the row, and resume straight away
+                        if (
+                            not manual_mode_active
+                            and reason not in {"exception", "error"}
+                            and not self._line_hits.admit(file_path, line, utc_now_iso())
+                        ):
+                            self._resume(client, "continue" if manual_from else self._auto_resume, thread_id)
+                            continue
+
                         # For dirty/no-git sessions: snapshot original file content once
+                        # (normally already done above when the file was first seen)
                         try:
-                            if not git_commit or git_dirty:
-                                with open(file_path, "rb") as sf:
-                                    content_bytes = sf.read()
-                                # Store snapshot best-effort; ignore duplicates
-                                self.db.add_file_snapshot(self.session_id, file_path, content_bytes)
+                            if (not git_commit or git_dirty) and file_path not in snapshotted_files:
+                                content_bytes = source_cache.get_bytes(file_path)
+                                if content_bytes is not None:
+                                    # Store snapshot best-effort; ignore duplicates
+                                    self.db.add_file_snapshot(self.session_id, file_path, content_bytes)
+                                    snapshotted_files.add(file_path)
                         except Exception:
                             pass
 
                         # Scopes -> variables
                         scopes = client.request("scopes", {"frameId": frame.get("id")})
-                        vars_payload: Dict[str, Any] = {}
-                        skip_names = {"special variables", "function variables", "class variables"}
-                        for sc in scopes.body.get("scopes", []) if scopes.body else []:
-                            scope_name = str(sc.get("name"))
-                            vr = sc.get("variablesReference")
-                            if not vr:
-                                continue
-                            vres = client.request("variables", {"variablesReference": vr})
-                            var_list = vres.body.get("variables", []) if vres.body else []
-                            scope_map: Dict[str, Any] = {}
-                            for v in var_list:
-                                vname = str(v.get("name"))
-                                if vname in skip_names:
-                                    continue
-                                vvalue = v.get("value")
-                                vref = v.get("variablesReference")
-                                
-                                # ALWAYS fetch complete data if there's a reference
-                                if isinstance(vref, int) and vref > 0:
-                                    complete = self._fetch_complete_value(vref)
-                                    if complete is not None:
-                                        scope_map[vname] = complete
-                                    else:
-                                        # Fallback to string value
-                                        scope_map[vname] = self._parse_string_to_object(vvalue)
-                                else:
-                                    # No reference, just parse the value
-                                    scope_map[vname] = self._parse_string_to_object(vvalue)
-                            vars_payload[scope_name] = scope_map
+                        scope_refs = self._scope_refs(scopes)
+                        # Fan out every scope's variables request at once
+                        scope_responses = client.request_batch(
+                            [("variables", {"variablesReference": vr}) for _name, vr in scope_refs]
+                        )
+                        scope_vars, globals_plan = self._select_globals(
+                            frame, self._scope_variables(scope_refs, scope_responses)
+                        )
+                        # Fetch complete data for every reference (or, in changed mode, only
+                        # those whose preview moved since this frame's last stop); one batch per tree level
+                        fetch_refs, reused_values = self._plan_capture(frame, scope_vars)
+                        complete_values = {**reused_values, **self._fetch_complete_values(
+                            fetch_refs, self._capture_budget, self._indexed_counts(scope_vars)
+                        )}
+                        self._remember_capture(frame, frames, scope_vars, complete_values)
+                        vars_payload, full_vars, globals_snapshot = self._apply_globals_policy(
+                            self._build_scope_payload(scope_vars, complete_values), globals_plan
+                        )
+                        if globals_snapshot:
+                            self.db.add_globals_snapshot(self.session_id, globals_snapshot[0], utc_now_iso(), globals_snapshot[1])
 
                         # Status/error info
                         status = "success"
@@ -1171,47 +1809,27 @@ class AutoDebugger:
                         stack_trace_text = None
                         if reason in {"exception", "error"}:
                             status = "error"
-                            # Try exceptionInfo
+                            # Request exceptionInfo and the last stack trace together
+                            einfo_fut, stre_fut = client.send_requests([
+                                ("exceptionInfo", {"threadId": thread_id}),
+                                ("stackTrace", {"threadId": thread_id}),
+                            ])
                             try:
-                                einfo = client.request("exceptionInfo", {"threadId": thread_id})
+                                einfo = einfo_fut.result(timeout=10.0)
                                 if einfo.body:
                                     error_type = einfo.body.get("exceptionId")
                                     details = einfo.body.get("details") or {}
                                     error_message = details.get("message")
                             except Exception:
                                 pass
-                            # Also try last stack trace
                             try:
-                                stre = client.request("stackTrace", {"threadId": thread_id})
-                                frames2 = stre.body.get("stackFrames", []) if stre.body else []
-                                stack_lines = []
-                                for fr in frames2:
-                                    sp = fr.get("source", {}).get("path")
-                                    sl = fr.get("line")
-                                    if sp and sl:
-                                        stack_lines.append(f"{sp}:{sl}")
-                                stack_trace_text = "\n".join(stack_lines)
+                                stack_trace_text = self._stack_trace_text(stre_fut.result(timeout=10.0))
                             except Exception:
                                 pass
 
-                        # Compute delta vs previous captured vars
-                        def compute_delta(curr: Dict[str, Any], prev: Dict[str, Any]) -> Dict[str, Any]:
-                            delta: Dict[str, Any] = {}
-                            keys = set(curr.keys()) | set(prev.keys())
-                            for k in sorted(keys):
-                                cv = curr.get(k)
-                                pv = prev.get(k)
-                                if isinstance(cv, dict) and isinstance(pv, dict):
-                                    sub = compute_delta(cv, pv)
-                                    if sub:
-                                        delta[k] = sub
-                                else:
-                                    if cv != pv:
-                                        delta[k] = cv
-                            return delta
-
-                        variables_delta = compute_delta(vars_payload, prev_vars)
-                        prev_vars = vars_payload
+                        # Compute delta vs previous captured vars (including globals not stored in this row)
+                        variables_delta = compute_delta(full_vars, prev_vars)
+                        prev_vars = full_vars
 
                         # Collect resource data if recording is enabled
                         loop_iteration_value = None
@@ -1237,7 +1855,7 @@ class AutoDebugger:
                                     disk_increase = current_disk_usage - initial_disk_usage
                                     disk_usage_increase_mb_value = disk_increase / (1024 * 1024)
 
-                        self.db.add_line_report(
+                        self._store_report(
                             LineReport(
                                 session_id=self.session_id,
                                 file=file_path,
@@ -1278,8 +1896,9 @@ class AutoDebugger:
                             # Normal manual mode with user interaction
                             # Update controller state
                             if self._controller:
-                                # Convert to display format for web view
-                                display_vars = self._extract_display_values(vars_payload)
+                                # Convert to display format for web view; full_vars, since the
+                                # stored row may hold only the globals that changed
+                                display_vars = self._extract_display_values(full_vars)
                                 display_delta = self._extract_display_values(variables_delta) if variables_delta else {}
                                 self._controller.update_state(
                                         session_id=self.session_id,
@@ -1542,7 +2161,7 @@ class AutoDebugger:
                                     should_step_after = False
                                     continue  # Don't break, just continue to re-prompt
                                 elif action == 'continue':
-                                    client.request("continue", {"threadId": thread_id})
+                                    self._resume(client, "continue", thread_id)
                                     should_step_after = False  # Don't step, we already continued
                                     # Exit action loop; do not stepIn since we continued
                                     break
@@ -1552,12 +2171,12 @@ class AutoDebugger:
                                     break
                                 elif action == 'variables':
                                     # Read ALL current variables on demand
-                                    if self._tts and vars_payload:
+                                    if self._tts and full_vars:
                                         # Find the main scope (usually Locals)
                                         read_any = False
                                         for scope_name in ("Locals", "locals", "Local", "Globals", "globals"):
-                                            if scope_name in vars_payload:
-                                                scope_vars = vars_payload[scope_name]
+                                            if scope_name in full_vars:
+                                                scope_vars = full_vars[scope_name]
                                                 if isinstance(scope_vars, dict) and scope_vars:
                                                     self._tts.speak(f"Variables in {scope_name}")
                                                     self._wait_for_speech_with_interrupt()
@@ -1784,7 +2403,7 @@ class AutoDebugger:
                                     for scope_name in ("Locals", "locals", "Local", "Globals", "globals"):
                                         scope_delta = variables_delta.get(scope_name)
                                         if isinstance(scope_delta, dict):
-                                            scope_vars = vars_payload.get(scope_name, {}) if isinstance(vars_payload.get(scope_name), dict) else {}
+                                            scope_vars = full_vars.get(scope_name, {}) if isinstance(full_vars.get(scope_name), dict) else {}
                                             for var_name in scope_delta.keys():
                                                 var_info = scope_vars.get(var_name)
                                                 if isinstance(var_info, dict) and "value" in var_info:
@@ -2010,7 +2629,7 @@ class AutoDebugger:
                                     # Explore across all variables, not just changes
                                     all_vars: List[Tuple[str, str, Any]] = []  # (scope, var_name, value)
                                     for scope_name in ("Locals", "locals", "Local", "Globals", "globals"):
-                                        scope_vars = vars_payload.get(scope_name)
+                                        scope_vars = full_vars.get(scope_name)
                                         if isinstance(scope_vars, dict):
                                             for var_name, value in scope_vars.items():
                                                 # Variables are now already parsed/fetched - use them directly
@@ -2217,22 +2836,22 @@ class AutoDebugger:
                             # In manual mode, only step if we processed an action
                             # BUT not if we just activated manual mode this iteration
                             if should_step_after and not just_activated_manual:
-                                client.request("stepIn", {"threadId": thread_id})
+                                self._resume(client, "stepIn", thread_id)
                         elif not manual_from:
                             # Not using --manual-from, always step (normal auto mode)
-                            client.request("stepIn", {"threadId": thread_id})
+                            self._resume(client, self._auto_resume, thread_id)
                         else:
                             # Using --manual-from but not yet in manual mode
                             # Continue execution to reach the trigger line
                             if not manual_trigger_activated:
-                                client.request("continue", {"threadId": thread_id})
+                                self._resume(client, "continue", thread_id)
                             else:
                                 # We've activated manual from trigger, now we should be in manual mode
                                 # This shouldn't happen - if we activated, we should be in manual_mode_active
                                 pass
 
                     elif ev.event == "continued":
-                        # ignore
+                        self._invalidate_stop_cache()
                         continue
                     elif ev.event == "terminated" or ev.event == "exited":
                         running = False
@@ -2241,7 +2860,7 @@ class AutoDebugger:
                         # optionally could store outputs; skipping for MVP
                         continue
 
-            self.db.end_session(self.session_id, utc_now_iso())
+            self._finish_session()
             return self.session_id
         finally:
             # Clean up manual control resources
@@ -2256,4 +2875,314 @@ class AutoDebugger:
                 except Exception:
                     pass
             self._stop_adapter()
+            # Normally a no-op (_finish_session flushed already); keeps what an
+            # aborted run held back
+            try:
+                self._flush_pending_capture()
+            except Exception as e:
+                print(f"[DEBUG] Failed to store held-back loop rows/hit counters: {e}", file=sys.stderr, flush=True)
             self.db.close()
+
+    async def run_async(
+        self,
+        script_path: str,
+        args: Optional[List[str]] = None,
+        just_my_code: bool = True,
+        stop_on_entry: bool = True,
+        capture_budget: Optional[CaptureBudget] = None,
+        stepping: str = "step",
+        breakpoint_globs: Optional[List[str]] = None,
+    ) -> str:
+        """Auto-mode DAP capture driven by an asyncio event loop.
+
+        Records the same rows as ``run()`` in auto mode. Each stop awaits its
+        DAP requests on an ``AsyncDapClient`` instead of blocking a thread, and
+        the SQLite write for a stop runs on a writer thread while the next
+        ``stepIn`` is already in flight. Because nothing blocks the loop,
+        several sessions can share one process, and one writer thread::
+
+            await asyncio.gather(AutoDebugger(db_path=db).run_async("a.py"),
+                                 AutoDebugger(db_path=db).run_async("b.py"))
+        """
+        script_abs = os.path.abspath(script_path)
+        if capture_budget is not None:
+            self._capture_budget = capture_budget
+        if stepping not in STEPPING_MODES:
+            raise ValueError(f"Unknown stepping mode {stepping!r}; expected one of {', '.join(STEPPING_MODES)}")
+        self._stepping = stepping
+        self._breakpoint_files = set()
+        self._stepped_lines = set()
+
+        loop = asyncio.get_running_loop()
+        # Every self.db call goes through the shared writer, including the line index reads
+        # behind breakpoints; it keeps rows in step order without blocking the event loop
+        writer = self._db_writer = _ASYNC_DB_WRITER
+        # The tree walk and the git subprocesses would stall every session on this loop
+        self._pending_breakpoint_files = (
+            await loop.run_in_executor(None, self._breakpoint_targets, script_abs, breakpoint_globs)
+            if stepping == "breakpoints" else []
+        )
+        git_root, git_commit, git_dirty = await loop.run_in_executor(None, self._git_provenance, script_abs)
+
+        summary = SessionSummary(
+            session_id=self.session_id,
+            file=script_abs,
+            language="python",
+            start_time=utc_now_iso(),
+            git_root=git_root,
+            git_commit=git_commit,
+            git_dirty=git_dirty,
+        )
+        await loop.run_in_executor(writer, self.db.open)
+        await loop.run_in_executor(writer, self.db.create_session, summary)
+        print(f"[DEBUG] Starting debugger for: {script_abs}", file=sys.stderr, flush=True)
+        print(f"[DEBUG] Session ID: {self.session_id}", file=sys.stderr, flush=True)
+
+        pending_writes: List["asyncio.Future[Any]"] = []
+        client = AsyncDapClient(self.adapter_host, self.adapter_port, timeout=10)
+        adapter, adapter_pump = await self._start_adapter_async()
+        try:
+            # Connect with retries while the adapter starts
+            start = time.time()
+            while True:
+                try:
+                    await client.connect()
+                    break
+                except ConnectionRefusedError:
+                    if time.time() - start > 15.0:
+                        print(f"[DEBUG] Failed to connect after 15 seconds", file=sys.stderr, flush=True)
+                        raise
+                    await asyncio.sleep(0.1)
+
+            await client.request("initialize", {
+                "clientID": "autodebugger",
+                "adapterID": "python",
+                "pathFormat": "path",
+                "linesStartAt1": True,
+                "columnsStartAt1": True,
+                "locale": "en-US",
+                "supportsVariableType": True,
+                "supportsVariablePaging": True,
+            }, wait=15.0)
+
+            working_dir, env_vars = self._launch_environment(script_abs)
+            launch_fut = await client.send_request("launch", {
+                "name": "Python: AutoDebug",
+                "type": "python",
+                "request": "launch",
+                "console": "internalConsole",
+                "cwd": working_dir,
+                "justMyCode": just_my_code,
+                "stopOnEntry": stop_on_entry,
+                "showReturnValue": True,
+                "redirectOutput": True,
+                "env": env_vars,
+                "args": args or [],
+                "program": script_abs,
+            })
+            # Wait for 'initialized' before sending breakpoints/configuration
+            start_wait = time.time()
+            initialized_seen = False
+            while time.time() - start_wait < 15.0 and not initialized_seen:
+                for ev in await client.wait_events(timeout=max(0.0, 15.0 - (time.time() - start_wait))):
+                    if ev.event == "initialized":
+                        initialized_seen = True
+                        break
+
+            try:
+                await client.request("setExceptionBreakpoints", {"filters": ["uncaught"], "filterOptions": []}, wait=10.0)
+            except Exception:
+                pass
+            if stepping == "breakpoints":
+                # Only the script up front; glob matches follow at the first stop
+                requests = await loop.run_in_executor(writer, self._breakpoint_requests, [script_abs])
+                await self._set_breakpoints_async(client, requests)
+            elif stop_on_entry:
+                try:
+                    await client.request("setBreakpoints", {
+                        "source": {"path": script_abs},
+                        "breakpoints": await loop.run_in_executor(writer, self._dense_breakpoints, script_abs),
+                    }, wait=10.0)
+                except Exception:
+                    pass
+            await client.request("configurationDone", {}, wait=15.0)
+            try:
+                await asyncio.wait_for(launch_fut, timeout=10.0)
+            except asyncio.TimeoutError:
+                pass
+
+            prev_vars: Dict[str, Any] = {}
+            snapshotted_files: Set[str] = {script_abs}
+            for _path in snapshotted_files:
+                pending_writes.append(loop.run_in_executor(writer, self._snapshot_file, _path))
+            running = True
+            while running:
+                events = await client.wait_events(timeout=1.0)
+                if not events:
+                    if not client.connected:
+                        running = False
+                    continue
+                for ev in events:
+                    if ev.event == "stopped":
+                        thread_id = int(ev.body.get("threadId")) if ev.body else 0
+                        reason = ev.body.get("reason") if ev.body else ""
+                        self._invalidate_stop_cache()
+                        captured = await self._capture_stop_async(client, thread_id, reason or "", prev_vars)
+                        if captured is None:
+                            self._invalidate_stop_cache()
+                            await client.request(self._auto_resume, {"threadId": thread_id}, wait=10.0)
+                            continue
+                        report, prev_vars, globals_snapshot = captured
+
+                        # Surface writer errors from earlier stops
+                        still_pending = []
+                        for fut in pending_writes:
+                            if fut.done():
+                                fut.result()
+                            else:
+                                still_pending.append(fut)
+                        pending_writes = still_pending
+
+                        # Resume the debuggee first, then write this stop while it runs
+                        self._invalidate_stop_cache()
+                        step_fut = await client.send_request(self._auto_resume, {"threadId": thread_id})
+                        if report.file and report.file not in snapshotted_files:
+                            snapshotted_files.add(report.file)
+                            pending_writes.append(loop.run_in_executor(writer, self._snapshot_file, report.file))
+                        if globals_snapshot:
+                            pending_writes.append(loop.run_in_executor(
+                                writer, self.db.add_globals_snapshot,
+                                self.session_id, globals_snapshot[0], report.timestamp, globals_snapshot[1],
+                            ))
+                        items = self._loop_summarizer.feed(report) if self._loop_summarizer else [report]
+                        if items:
+                            pending_writes.append(loop.run_in_executor(writer, store_items, self.db, items))
+                        try:
+                            await asyncio.wait_for(step_fut, timeout=10.0)
+                        except asyncio.TimeoutError:
+                            raise TimeoutError(f"Timed out waiting for DAP response ({self._auto_resume})") from None
+                    elif ev.event == "terminated" or ev.event == "exited":
+                        running = False
+                        break
+
+            await asyncio.gather(*pending_writes)
+            await loop.run_in_executor(writer, self._flush_pending_capture)
+            await loop.run_in_executor(writer, self.db.end_session, self.session_id, utc_now_iso())
+            return self.session_id
+        finally:
+            await client.close()
+            await self._stop_adapter_async(adapter, adapter_pump)
+            # Queued behind this session's pending writes on the same thread
+            await loop.run_in_executor(writer, self.db.close)
+            self._db_writer = None
+
+    async def _capture_stop_async(
+        self, client: AsyncDapClient, thread_id: int, reason: str, prev_vars: Dict[str, Any]
+    ) -> Optional[Tuple[LineReport, Dict[str, Any], Optional[Tuple[str, Dict[str, Any]]]]]:
+        """Fetch stack, scopes and variables for one stop.
+
+        Returns the row, the full variables view for the next delta and a
+        pending globals snapshot (see ``_apply_globals_policy``), or None when
+        the stop is not recorded (no frames, or past ``--max-hits-per-line``).
+        """
+        st = await client.request("stackTrace", {"threadId": thread_id})
+        frames = st.body.get("stackFrames", []) if st.body else []
+        if not frames:
+            return None
+        frame = frames[0]
+        file_path = frame.get("source", {}).get("path") or ""
+        line = int(frame.get("line") or 0)
+        if self._stepping == "breakpoints":
+            # The line index lookups share self.db with the writer thread
+            uncovered = await asyncio.get_running_loop().run_in_executor(
+                self._db_writer, self._uncovered_frame_breakpoints, frames
+            )
+            if uncovered:
+                await self._set_breakpoints_async(client, uncovered)
+            if not self._breakpoint_stop(frames, reason):
+                return None
+        if reason not in {"exception", "error"} and not self._line_hits.admit(file_path, line, utc_now_iso()):
+            return None
+
+        async def _variables() -> Tuple[Dict[str, Any], Dict[str, Any], Optional[Tuple[str, Dict[str, Any]]]]:
+            scopes = await client.request("scopes", {"frameId": frame.get("id")})
+            scope_refs = self._scope_refs(scopes)
+            scope_responses = await client.request_batch(
+                [("variables", {"variablesReference": vr}) for _name, vr in scope_refs]
+            )
+            scope_vars, globals_plan = self._select_globals(frame, self._scope_variables(scope_refs, scope_responses))
+            fetch_refs, reused_values = self._plan_capture(frame, scope_vars)
+            complete_values = {**reused_values, **await self._fetch_complete_values_async(
+                client, fetch_refs, self._capture_budget, self._indexed_counts(scope_vars)
+            )}
+            self._remember_capture(frame, frames, scope_vars, complete_values)
+            return self._apply_globals_policy(self._build_scope_payload(scope_vars, complete_values), globals_plan)
+
+        status = "success"
+        error_message = None
+        error_type = None
+        stack_trace_text = None
+        if reason in {"exception", "error"}:
+            status = "error"
+            # Exception details travel alongside the variables fetch
+            (vars_payload, full_vars, globals_snapshot), (einfo, stre) = await asyncio.gather(
+                _variables(),
+                asyncio.gather(
+                    client.request("exceptionInfo", {"threadId": thread_id}),
+                    client.request("stackTrace", {"threadId": thread_id}),
+                    return_exceptions=True,
+                ),
+            )
+            if isinstance(einfo, DapMessage) and einfo.body:
+                error_type = einfo.body.get("exceptionId")
+                details = einfo.body.get("details") or {}
+                error_message = details.get("message")
+            if isinstance(stre, DapMessage):
+                stack_trace_text = self._stack_trace_text(stre)
+        else:
+            vars_payload, full_vars, globals_snapshot = await _variables()
+
+        code = source_cache.get_line(file_path, line)
+
+        report = LineReport(
+            session_id=self.session_id,
+            file=file_path,
+            line_number=line,
+            code=code,
+            timestamp=utc_now_iso(),
+            variables=vars_payload,
+            variables_delta=compute_delta(full_vars, prev_vars),
+            stack_depth=len(frames),
+            thread_id=thread_id,
+            observations=None,
+            status=status,
+            error_message=error_message,
+            error_type=error_type,
+            stack_trace=stack_trace_text,
+        )
+        return report, full_vars, globals_snapshot
+
+    def _store_report(self, report: LineReport) -> None:
+        """Persist a captured row, or hand it to the loop summarizer when enabled."""
+        items: List[LoopItem] = self._loop_summarizer.feed(report) if self._loop_summarizer else [report]
+        store_items(self.db, items)
+
+    def _finish_session(self) -> None:
+        """Store what capture still holds back, then mark the session finished."""
+        self._flush_pending_capture()
+        self.db.end_session(self.session_id, utc_now_iso())
+
+    def _flush_pending_capture(self) -> None:
+        """Persist what is still held back at session end: open loops and overflow counters."""
+        if self._loop_summarizer is not None:
+            store_items(self.db, self._loop_summarizer.finish())
+        self.db.add_line_hits(self.session_id, self._line_hits.drain())
+
+    def _snapshot_file(self, file_path: str) -> None:
+        """Store the file's content for this session (best-effort)."""
+        try:
+            content = source_cache.get_bytes(file_path)
+            if content is not None:
+                self.db.add_file_snapshot(self.session_id, file_path, content)
+        except Exception:
+            pass
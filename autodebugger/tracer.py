@@ -0,0 +1,572 @@
+"""In-process capture engines that record line reports without a DAP adapter.
+
+The runner launches this module inside the debuggee interpreter
+(``python -m autodebugger.tracer ...``). Instead of a socket round trip per
+line, a recorder hooks the interpreter directly and writes ``LineReport`` rows
+straight into the same ``LineReportStore`` the DAP loop uses, so the UIs and
+MCP tools read the result unchanged.
+
+Only the standard library and ``autodebugger.db``/``autodebugger.common``/
+``autodebugger.loop_summary`` are imported here; the target interpreter does not need debugpy installed.
+"""
+
+from __future__ import annotations
+
+import abc
+import argparse
+import itertools
+import linecache
+import os
+import runpy
+import sys
+import sysconfig
+import threading
+import types
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from autodebugger.common import SCOPE_POLICIES, VALUE_CODECS, CaptureBudget, GlobalsTracker, LineHitCounter, compute_delta, fit_to_bytes, split_budget, truncated_value, value_codec_id
+from autodebugger.db import LineReport, LineReportStore
+from autodebugger.loop_summary import LoopSummarizer, store_items
+
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Names debugpy groups under "special/function/class variables"; the DAP loop
+# skips those groups, so the in-process snapshot skips the same kinds of values.
+_SKIPPED_VALUE_TYPES = (
+    types.ModuleType,
+    types.FunctionType,
+    types.BuiltinFunctionType,
+    types.MethodType,
+    type,
+)
+
+
+def _utc_now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _library_roots() -> List[str]:
+    """Directories holding the stdlib and installed packages (not user code)."""
+    roots: Set[str] = set()
+    for key in ("stdlib", "platstdlib", "purelib", "platlib"):
+        path = sysconfig.get_paths().get(key)
+        if path:
+            roots.add(os.path.abspath(path))
+    for prefix in (sys.prefix, sys.base_prefix, sys.exec_prefix):
+        roots.add(os.path.abspath(os.path.join(prefix, "lib")))
+    return sorted(roots)
+
+
+def snapshot_value(
+    value: Any,
+    max_depth: int = 20,
+    _seen: Optional[Set[int]] = None,
+    max_children: Optional[int] = None,
+) -> Any:
+    """Convert a live object into the JSON-friendly shape the DAP loop stores.
+
+    Mirrors ``AutoDebugger._fetch_complete_value``: containers become lists and
+    dicts, objects become a dict of their public attributes, and anything else
+    falls back to its ``repr``. Containers longer than ``max_children`` keep a
+    head/tail sample inside a ``truncated_value`` marker.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if max_depth <= 0:
+        return _safe_repr(value)
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return "<circular reference>"
+    _seen.add(id(value))
+
+    def _child(v: Any) -> Any:
+        return snapshot_value(v, max_depth - 1, _seen, max_children)
+
+    try:
+        if isinstance(value, (list, tuple, set, frozenset)):
+            if max_children is not None and len(value) > max_children:
+                head_n, tail_n = split_budget(max_children)
+                seq = value if isinstance(value, (list, tuple)) else list(value)
+                return truncated_value(
+                    "list",
+                    len(value),
+                    [_child(v) for v in seq[:head_n]],
+                    [_child(v) for v in seq[len(seq) - tail_n:]] if tail_n else [],
+                )
+            return [_child(v) for v in value]
+        if isinstance(value, dict):
+            def _key(k: Any) -> str:
+                return k if isinstance(k, str) else _safe_repr(k)
+            if max_children is not None and len(value) > max_children:
+                head_n, tail_n = split_budget(max_children)
+                tail_keys = list(itertools.islice(reversed(value.keys()), tail_n))[::-1]
+                return truncated_value(
+                    "dict",
+                    len(value),
+                    {_key(k): _child(value[k]) for k in itertools.islice(value.keys(), head_n)},
+                    {_key(k): _child(value[k]) for k in tail_keys},
+                )
+            return {_key(k): _child(v) for k, v in value.items()}
+        attrs = _public_attributes(value)
+        if attrs:
+            return {name: _child(v) for name, v in attrs.items()}
+        return _safe_repr(value)
+    finally:
+        _seen.discard(id(value))
+
+
+def _public_attributes(value: Any) -> Dict[str, Any]:
+    attrs: Dict[str, Any] = {}
+    try:
+        raw = vars(value)
+    except TypeError:
+        raw = {}
+        for name in getattr(type(value), "__slots__", ()) or ():
+            if hasattr(value, name):
+                raw[name] = getattr(value, name)
+    for name, attr in raw.items():
+        if name.startswith("__") or isinstance(attr, _SKIPPED_VALUE_TYPES):
+            continue
+        attrs[name] = attr
+    return attrs
+
+
+def _safe_repr(value: Any) -> str:
+    try:
+        return repr(value)
+    except Exception:
+        return f"<{type(value).__name__} object>"
+
+
+def snapshot_scope(namespace: Dict[str, Any], budget: Optional[CaptureBudget] = None) -> Dict[str, Any]:
+    """Snapshot one scope, skipping dunders, modules, functions and classes."""
+    budget = budget or CaptureBudget()
+    scope: Dict[str, Any] = {}
+    for name, value in list(namespace.items()):
+        if name.startswith("__") or isinstance(value, _SKIPPED_VALUE_TYPES):
+            continue
+        scope[name] = snapshot_budgeted(value, budget)
+    return scope
+
+
+def snapshot_budgeted(value: Any, budget: CaptureBudget) -> Any:
+    """Snapshot one top-level variable within ``budget``."""
+    return fit_to_bytes(snapshot_value(value, budget.depth, max_children=budget.max_children), budget.max_bytes)
+
+
+class EngineUnavailable(RuntimeError):
+    """The engine cannot run under this interpreter; nothing of the script has run."""
+
+
+class InProcessRecorder(abc.ABC):
+    """Shared bookkeeping for in-process engines.
+
+    Subclasses install an interpreter hook and call ``record_line`` with the
+    frame about to execute a line; this class turns that frame into a
+    ``LineReport`` identical in shape to the DAP loop's rows.
+    """
+
+    engine_name = "inprocess"
+
+    def __init__(
+        self,
+        store: LineReportStore,
+        session_id: str,
+        script_path: str,
+        just_my_code: bool = True,
+        budget: Optional[CaptureBudget] = None,
+        scopes: str = "all",
+        max_hits_per_line: Optional[int] = None,
+        summarize_loops_after: Optional[int] = None,
+    ) -> None:
+        self.store = store
+        self.budget = budget or CaptureBudget()
+        self.scopes = scopes
+        self._globals_tracker = GlobalsTracker()
+        self.line_hits = LineHitCounter(max_hits_per_line)
+        self.loop_summarizer = (
+            LoopSummarizer(session_id, summarize_loops_after) if summarize_loops_after is not None else None
+        )
+        self.session_id = session_id
+        self.script_path = os.path.abspath(script_path)
+        self.just_my_code = just_my_code
+        self._library_roots = _library_roots()
+        self._user_code_cache: Dict[str, bool] = {}
+        self._snapshotted_files: Set[str] = set()
+        self._prev_vars: Dict[str, Any] = {}
+        self._pending_returns: Dict[int, Dict[str, Any]] = {}
+        self._busy = threading.local()
+        self.lines_recorded = 0
+
+    @abc.abstractmethod
+    def install(self) -> None:
+        """Start calling ``record_line`` for lines run from now on."""
+
+    @abc.abstractmethod
+    def uninstall(self) -> None:
+        """Stop recording and remove the interpreter hook."""
+
+    def is_user_file(self, filename: str) -> bool:
+        """Return True if lines in ``filename`` should be recorded."""
+        cached = self._user_code_cache.get(filename)
+        if cached is not None:
+            return cached
+        result = True
+        if not filename or filename.startswith("<"):
+            result = False
+        else:
+            path = os.path.abspath(filename)
+            if path.startswith(_PACKAGE_DIR + os.sep):
+                result = False
+            elif self.just_my_code:
+                for root in self._library_roots:
+                    if path.startswith(root + os.sep):
+                        result = False
+                        break
+        self._user_code_cache[filename] = result
+        return result
+
+    def record_return(self, frame: types.FrameType, value: Any) -> None:
+        """Record the caller's line with the return value, like a DAP stepIn after ``return``."""
+        caller = frame.f_back
+        if caller is None or not self.is_user_file(caller.f_code.co_filename):
+            return
+        pending = self._pending_returns.setdefault(id(caller), {})
+        pending[f"(return) {frame.f_code.co_name}"] = value
+        self.record_line(caller, caller.f_lineno)
+
+    def record_line(self, frame: types.FrameType, line: int) -> None:
+        if getattr(self._busy, "active", False):
+            return
+        self._busy.active = True
+        try:
+            self._record(frame, line, status="success")
+        finally:
+            self._busy.active = False
+
+    def record_exception(self, exc: BaseException) -> None:
+        """Record the innermost user frame of an uncaught exception as an error row."""
+        tb = exc.__traceback__
+        user_tb = None
+        frames: List[str] = []
+        while tb is not None:
+            filename = tb.tb_frame.f_code.co_filename
+            if self.is_user_file(filename):
+                user_tb = tb
+            # Drop the runpy/tracer bootstrap frames that precede the script
+            if user_tb is not None:
+                frames.append(f"{filename}:{tb.tb_lineno}")
+            tb = tb.tb_next
+        if user_tb is None:
+            return
+        exc_type = type(exc)
+        module = exc_type.__module__
+        error_type = exc_type.__qualname__ if module == "builtins" else f"{module}.{exc_type.__qualname__}"
+        self._busy.active = True
+        try:
+            self._record(
+                user_tb.tb_frame,
+                user_tb.tb_lineno,
+                status="error",
+                error_type=error_type,
+                error_message=str(exc),
+                stack_trace="\n".join(reversed(frames)),
+            )
+        finally:
+            self._busy.active = False
+
+    def _apply_globals_policy(
+        self, module: str, locals_scope: Dict[str, Any], globals_scope: Dict[str, Any]
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Return (stored row, full view) storing only the module globals that changed.
+
+        The first line recorded in a module writes all of its globals to
+        ``globals_snapshots`` instead of the row.
+        """
+        first_sight = self._globals_tracker.changed_names(module, globals_scope) is None
+        all_globals, changes = self._globals_tracker.update(module, globals_scope, globals_scope)
+        if first_sight:
+            self.store.add_globals_snapshot(self.session_id, module, _utc_now_iso(), all_globals)
+        stored = {"Locals": locals_scope, "Globals": {} if first_sight else changes}
+        return stored, {"Locals": locals_scope, "Globals": all_globals}
+
+    def _record(
+        self,
+        frame: types.FrameType,
+        line: int,
+        status: str,
+        error_type: Optional[str] = None,
+        error_message: Optional[str] = None,
+        stack_trace: Optional[str] = None,
+    ) -> None:
+        file_path = os.path.abspath(frame.f_code.co_filename)
+        if status != "error" and not self.line_hits.admit(file_path, line, _utc_now_iso()):
+            self._pending_returns.pop(id(frame), None)
+            return
+        if file_path not in self._snapshotted_files:
+            self._snapshotted_files.add(file_path)
+            try:
+                with open(file_path, "rb") as f:
+                    self.store.add_file_snapshot(self.session_id, file_path, f.read())
+            except Exception:
+                pass
+
+        locals_scope = snapshot_scope(frame.f_locals, self.budget)
+        pending = self._pending_returns.pop(id(frame), None)
+        if pending:
+            locals_scope.update({k: snapshot_budgeted(v, self.budget) for k, v in pending.items()})
+        if self.scopes == "locals":
+            vars_payload: Dict[str, Any] = {"Locals": locals_scope}
+            full_vars = vars_payload
+        else:
+            if frame.f_globals is frame.f_locals:
+                globals_scope = dict(locals_scope)
+            else:
+                globals_scope = snapshot_scope(frame.f_globals, self.budget)
+            vars_payload = {"Locals": locals_scope, "Globals": globals_scope}
+            full_vars = vars_payload
+            if self.scopes == "locals+changed-globals":
+                vars_payload, full_vars = self._apply_globals_policy(file_path, locals_scope, globals_scope)
+
+        variables_delta = compute_delta(full_vars, self._prev_vars)
+        self._prev_vars = full_vars
+
+        depth = 0
+        f: Optional[types.FrameType] = frame
+        while f is not None:
+            if self.is_user_file(f.f_code.co_filename):
+                depth += 1
+            f = f.f_back
+
+        report = LineReport(
+            session_id=self.session_id,
+            file=file_path,
+            line_number=line,
+            code=linecache.getline(file_path, line).rstrip("\n"),
+            timestamp=_utc_now_iso(),
+            variables=vars_payload,
+            variables_delta=variables_delta,
+            stack_depth=depth,
+            thread_id=threading.get_ident(),
+            status=status,
+            error_message=error_message,
+            error_type=error_type,
+            stack_trace=stack_trace,
+        )
+        store_items(self.store, self.loop_summarizer.feed(report) if self.loop_summarizer else [report])
+        self.lines_recorded += 1
+
+
+class MonitorRecorder(InProcessRecorder):
+    """Recorder built on ``sys.monitoring`` (PEP 669, Python 3.12+).
+
+    LINE events fire before each line runs, matching the state a DAP ``stopped``
+    event reports. Events in non-user code return ``DISABLE`` so library code
+    runs at full speed after its first hit.
+    """
+
+    engine_name = "monitor"
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        monitoring = getattr(sys, "monitoring", None)
+        if monitoring is None:
+            raise EngineUnavailable("--engine monitor requires Python 3.12+ (sys.monitoring); use --engine settrace")
+        self._mon = monitoring
+        self._tool_id = monitoring.DEBUGGER_ID
+
+    def install(self) -> None:
+        mon = self._mon
+        events = mon.events
+        mon.use_tool_id(self._tool_id, "autodebugger")
+        mon.register_callback(self._tool_id, events.PY_START, self._on_start)
+        mon.register_callback(self._tool_id, events.PY_RETURN, self._on_return)
+        mon.register_callback(self._tool_id, events.LINE, self._on_line)
+        mon.set_events(self._tool_id, events.PY_START | events.PY_RETURN | events.LINE)
+
+    def uninstall(self) -> None:
+        mon = self._mon
+        mon.set_events(self._tool_id, 0)
+        for event in (mon.events.PY_START, mon.events.PY_RETURN, mon.events.LINE):
+            mon.register_callback(self._tool_id, event, None)
+        mon.free_tool_id(self._tool_id)
+
+    def _on_start(self, code: types.CodeType, instruction_offset: int) -> Any:
+        if not self.is_user_file(code.co_filename):
+            return self._mon.DISABLE
+        return None
+
+    def _on_return(self, code: types.CodeType, instruction_offset: int, retval: Any) -> Any:
+        if not self.is_user_file(code.co_filename):
+            return self._mon.DISABLE
+        self.record_return(sys._getframe(1), retval)
+        return None
+
+    def _on_line(self, code: types.CodeType, line_number: int) -> Any:
+        if not self.is_user_file(code.co_filename):
+            return self._mon.DISABLE
+        self.record_line(sys._getframe(1), line_number)
+        return None
+
+
+class SettraceRecorder(InProcessRecorder):
+    """Recorder built on ``sys.settrace`` for interpreters without ``sys.monitoring``.
+
+    The global trace function returns a local tracer only for user-code frames,
+    so library calls pay a single ``call`` event and no per-line cost.
+    """
+
+    engine_name = "settrace"
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        # Frames with an in-flight exception; their "return" event is an unwind, not a return
+        self._raising: Set[int] = set()
+
+    def install(self) -> None:
+        threading.settrace(self._global_trace)
+        sys.settrace(self._global_trace)
+
+    def uninstall(self) -> None:
+        sys.settrace(None)
+        threading.settrace(None)  # type: ignore[arg-type]
+
+    def _global_trace(self, frame: types.FrameType, event: str, arg: Any) -> Any:
+        if event != "call" or not self.is_user_file(frame.f_code.co_filename):
+            return None
+        return self._local_trace
+
+    def _local_trace(self, frame: types.FrameType, event: str, arg: Any) -> Any:
+        if event == "line":
+            self._raising.discard(id(frame))
+            self.record_line(frame, frame.f_lineno)
+        elif event == "exception":
+            self._raising.add(id(frame))
+        elif event == "return":
+            if id(frame) in self._raising:
+                self._raising.discard(id(frame))
+            else:
+                self.record_return(frame, arg)
+        return self._local_trace
+
+
+ENGINES = {
+    MonitorRecorder.engine_name: MonitorRecorder,
+    SettraceRecorder.engine_name: SettraceRecorder,
+}
+
+
+def run_script(
+    engine: str,
+    db_path: str,
+    session_id: str,
+    script_path: str,
+    script_args: List[str],
+    just_my_code: bool = True,
+    budget: Optional[CaptureBudget] = None,
+    scopes: str = "all",
+    max_hits_per_line: Optional[int] = None,
+    summarize_loops_after: Optional[int] = None,
+    write_behind: bool = False,
+    intern_values: bool = False,
+    value_codec: str = "json",
+    keyframe_interval: Optional[int] = None,
+) -> int:
+    """Run ``script_path`` as ``__main__`` under the chosen recorder. Returns an exit code."""
+    store = LineReportStore(db_path)
+    store.open()
+    store.intern_values = intern_values
+    store.value_codec = value_codec_id(value_codec)
+    store.keyframe_interval = keyframe_interval
+    if write_behind:
+        store.start_write_behind()
+    try:
+        recorder = ENGINES[engine](
+            store,
+            session_id,
+            script_path,
+            just_my_code=just_my_code,
+            budget=budget,
+            scopes=scopes,
+            max_hits_per_line=max_hits_per_line,
+            summarize_loops_after=summarize_loops_after,
+        )
+        sys.argv = [script_path, *script_args]
+        sys.path.insert(0, os.path.dirname(os.path.abspath(script_path)))
+        exit_code = 0
+        recorder.install()
+        try:
+            runpy.run_path(script_path, run_name="__main__")
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except BaseException as e:
+            recorder.record_exception(e)
+            exit_code = 1
+        finally:
+            recorder.uninstall()
+            if recorder.loop_summarizer is not None:
+                store_items(store, recorder.loop_summarizer.finish())
+            store.add_line_hits(session_id, recorder.line_hits.drain())
+        print(f"[DEBUG] {engine} engine recorded {recorder.lines_recorded} lines", file=sys.stderr, flush=True)
+        return exit_code
+    finally:
+        store.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="autodebugger.tracer", description=__doc__)
+    parser.add_argument("--engine", choices=sorted(ENGINES), required=True)
+    parser.add_argument("--db", dest="db_path", required=True)
+    parser.add_argument("--session-id", required=True)
+    parser.add_argument("--all-code", action="store_true", help="Record library code too (justMyCode off).")
+    parser.add_argument("--scopes", choices=SCOPE_POLICIES, default="all")
+    parser.add_argument("--max-hits-per-line", type=int, default=None)
+    parser.add_argument("--summarize-loops-after", type=int, default=None)
+    parser.add_argument("--write-behind", action="store_true")
+    parser.add_argument("--intern-values", action="store_true")
+    parser.add_argument("--value-codec", choices=sorted(VALUE_CODECS), default="json")
+    parser.add_argument("--keyframe-interval", type=int, default=None)
+    parser.add_argument("--capture-depth", type=int, default=20)
+    parser.add_argument("--capture-max-children", type=int, default=None)
+    parser.add_argument("--capture-max-bytes", type=int, default=None)
+    parser.add_argument(
+        "--startup-error-file",
+        default=None,
+        help="Write the reason here if the engine cannot start; the exit code alone is the script's.",
+    )
+    parser.add_argument("script")
+    parser.add_argument("script_args", nargs=argparse.REMAINDER)
+    ns = parser.parse_args(argv)
+    try:
+        return run_script(
+            ns.engine,
+            ns.db_path,
+            ns.session_id,
+            ns.script,
+            ns.script_args,
+            just_my_code=not ns.all_code,
+            budget=CaptureBudget(ns.capture_depth, ns.capture_max_children, ns.capture_max_bytes),
+            scopes=ns.scopes,
+            max_hits_per_line=ns.max_hits_per_line,
+            summarize_loops_after=ns.summarize_loops_after,
+            write_behind=ns.write_behind,
+            intern_values=ns.intern_values,
+            value_codec=ns.value_codec,
+            keyframe_interval=ns.keyframe_interval,
+        )
+    except EngineUnavailable as e:
+        print(f"[autodebugger] {e}", file=sys.stderr, flush=True)
+        if ns.startup_error_file:
+            with open(ns.startup_error_file, "w", encoding="utf-8") as f:
+                f.write(str(e))
+        return 2
+    except RuntimeError as e:
+        print(f"[autodebugger] {e}", file=sys.stderr, flush=True)
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
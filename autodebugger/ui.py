@@ -4,7 +4,7 @@ import os
 from typing import Optional, List, Dict, Any, Tuple
 from flask import Flask, render_template, request, redirect, url_for
 
-from .common import extract_function_context
+from .common import decode_scopes, extract_function_context
 from .db import LineReportStore
 
 
@@ -104,7 +104,7 @@ def create_app(db_path: Optional[str] = None) -> Flask:
     @app.route("/session/<session_id>")
     def session_detail(session_id: str):
         store = get_store(); app._req_store = store  # type: ignore[attr-defined]
-        conn = store.conn
+        conn = store.session_conn(session_id)
         assert conn is not None
         cur = conn.cursor()
         cur.execute("SELECT * FROM session_summaries WHERE session_id=?", (session_id,))
@@ -132,12 +132,11 @@ def create_app(db_path: Optional[str] = None) -> Flask:
             params.append(status)
         where = " AND ".join(parts)
         cur.execute(
-            "SELECT id, file, line_number, code, timestamp, variables, variables_delta, stack_depth, thread_id, status, error_type, error_message "
+            "SELECT id, file, line_number, code, timestamp, variables, variables_delta, stack_depth, thread_id, status, error_type, error_message, variables_codec, state_encoding "
             f"FROM line_reports WHERE {where} ORDER BY id",
             tuple(params),
         )
         rows = cur.fetchall()
-        import json as _json
         reports = []
 
         # Build a per-file function map: line -> qualified name
@@ -328,11 +327,12 @@ def create_app(db_path: Optional[str] = None) -> Flask:
 
         for r in rows:
             try:
-                vars_obj = _json.loads(r[5] or '{}')
+                # Rows stored as patches (--keyframe-interval) are replayed by the store
+                vars_obj = store.get_state_at(session_id, r[0]) if r[13] else decode_scopes(r[5], r[12], conn)
             except Exception:
                 vars_obj = {}
             try:
-                delta_obj = _json.loads(r[6] or '{}')
+                delta_obj = decode_scopes(r[6], r[12], conn)
             except Exception:
                 delta_obj = {}
             func_name = function_for_line(r[1], int(r[2]) if r[2] is not None else -1)
@@ -28,7 +28,7 @@ from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from flask import Flask, render_template, request, redirect, url_for, jsonify
 
-from .common import extract_function_context, summarize_delta, summarize_value, parse_dap_variables
+from .common import extract_function_context, summarize_delta, summarize_value, parse_dap_variables, decode_scopes, next_state, session_db_path
 from .db import DEFAULT_DB_PATH, LineReportStore
 from .nested_explorer import NestedValueExplorer
 from .syntax_to_speech import syntax_to_speech_code, syntax_to_speech_value
@@ -225,24 +225,28 @@ class UnifiedReviewInterface:
         cur.execute("""
             SELECT id, file, line_number, code, timestamp, variables, variables_delta, 
                    status, error_message, error_type, stack_depth, thread_id,
-                   loop_iteration, memory_usage_mb, disk_usage_increase_mb
+                   loop_iteration, memory_usage_mb, disk_usage_increase_mb, variables_codec, state_encoding
             FROM line_reports
             WHERE session_id=?
             ORDER BY id ASC
         """, (session_id,))
         
         columns = [d[0] for d in cur.description]
+        state: Optional[Dict[str, Any]] = None
         for row in cur.fetchall():
             rec = dict(zip(columns, row))
             # Parse JSON fields
             try:
-                rec["variables"] = json.loads(rec.get("variables") or "{}")
+                rec["variables_delta"] = decode_scopes(rec.get("variables_delta"), rec.get("variables_codec"), conn)
             except:
-                rec["variables"] = {}
+                rec["variables_delta"] = {}
+            # Rows stored as patches (--keyframe-interval) apply to the previous row's state
             try:
-                rec["variables_delta"] = json.loads(rec.get("variables_delta") or "{}")
+                variables = decode_scopes(rec.get("variables"), rec.get("variables_codec"), conn)
+                state = next_state(state, variables, rec["variables_delta"], rec.get("state_encoding"))
+                rec["variables"] = state
             except:
-                rec["variables_delta"] = {}
+                rec["variables"] = {}
             
             # Parse DAP variables to clean format
             rec["variables_parsed"] = parse_dap_variables(rec["variables"])
@@ -256,7 +260,7 @@ class UnifiedReviewInterface:
         
         try:
             self.store.open()
-            conn = self.store.conn
+            conn = self.store.session_conn(session_id)
             
             # Get git provenance for the session
             cur = conn.cursor()
@@ -537,7 +541,9 @@ class UnifiedReviewInterface:
                 idx = int(selection)
                 if 0 <= idx < len(sessions):
                     self.current_session = sessions[idx]
-                    self.playback_audio_session(conn, self.current_session, mode=mode, delay_s=delay_s)
+                    # A --shard-sessions session keeps its rows in its own file
+                    with sqlite3.connect(session_db_path(self.db_path, self.current_session.session_id)) as session_conn:
+                        self.playback_audio_session(session_conn, self.current_session, mode=mode, delay_s=delay_s)
         
         if self.tts:
             self.tts.stop()
@@ -658,7 +664,7 @@ def create_unified_app(db_path: Optional[str] = None) -> Flask:
     @app.route("/session/<session_id>")
     def session_detail(session_id: str):
         interface.store.open()
-        conn = interface.store.conn
+        conn = interface.store.session_conn(session_id)
         assert conn is not None
         
         # Get session summary
@@ -695,7 +701,7 @@ def create_unified_app(db_path: Optional[str] = None) -> Flask:
     def explore_session(session_id: str):
         """API endpoint for interactive exploration."""
         interface.store.open()
-        conn = interface.store.conn
+        conn = interface.store.session_conn(session_id)
         assert conn is not None
         
         line_id = request.args.get("line_id")
@@ -705,7 +711,7 @@ def create_unified_app(db_path: Optional[str] = None) -> Flask:
         # Get the specific line report
         cur = conn.cursor()
         cur.execute("""
-            SELECT variables, variables_delta 
+            SELECT variables, variables_delta, variables_codec
             FROM line_reports 
             WHERE session_id=? AND id=?
         """, (session_id, line_id))
@@ -714,8 +720,8 @@ def create_unified_app(db_path: Optional[str] = None) -> Flask:
         if not row:
             return jsonify({"error": "Line not found"}), 404
         
-        variables = json.loads(row[0] or "{}")
-        delta = json.loads(row[1] or "{}")
+        variables = interface.store.get_state_at(session_id, int(line_id)) or {}
+        delta = decode_scopes(row[1], row[2], conn)
         
         # Parse to clean format
         variables_parsed = parse_dap_variables(variables)
@@ -743,15 +749,7 @@ def create_unified_app(db_path: Optional[str] = None) -> Flask:
     def delete_session(session_id: str):
         """Delete a single session."""
         interface.store.open()
-        conn = interface.store.conn
-        assert conn is not None
-        
-        cur = conn.cursor()
-        # Delete line reports first (foreign key constraint)
-        cur.execute("DELETE FROM line_reports WHERE session_id = ?", (session_id,))
-        # Delete session summary
-        cur.execute("DELETE FROM session_summaries WHERE session_id = ?", (session_id,))
-        conn.commit()
+        interface.store.delete_session(session_id)
         
         return redirect(url_for("sessions"))
     
@@ -759,20 +757,12 @@ def create_unified_app(db_path: Optional[str] = None) -> Flask:
     def delete_sessions():
         """Delete multiple sessions."""
         interface.store.open()
-        conn = interface.store.conn
-        assert conn is not None
         
         session_ids = request.form.getlist("session_ids[]")
         if not session_ids:
             return jsonify({"error": "No sessions selected"}), 400
         
-        cur = conn.cursor()
-        for session_id in session_ids:
-            # Delete line reports first
-            cur.execute("DELETE FROM line_reports WHERE session_id = ?", (session_id,))
-            # Delete session summary
-            cur.execute("DELETE FROM session_summaries WHERE session_id = ?", (session_id,))
-        conn.commit()
+        interface.store.delete_sessions(session_ids)
         
         return jsonify({"deleted": len(session_ids), "ids": session_ids})
     
@@ -846,7 +836,7 @@ def create_unified_app(db_path: Optional[str] = None) -> Flask:
     def speak_line(session_id: str, line_id: str):
         """Speak a specific line's content and changes."""
         interface.store.open()
-        conn = interface.store.conn
+        conn = interface.store.session_conn(session_id)
         assert conn is not None
         
         # Initialize TTS if needed
@@ -855,7 +845,7 @@ def create_unified_app(db_path: Optional[str] = None) -> Flask:
         
         cur = conn.cursor()
         cur.execute("""
-            SELECT code, line_number, variables, variables_delta, status, error_message
+            SELECT code, line_number, variables, variables_delta, status, error_message, variables_codec
             FROM line_reports 
             WHERE session_id=? AND id=?
         """, (session_id, line_id))
@@ -864,11 +854,11 @@ def create_unified_app(db_path: Optional[str] = None) -> Flask:
         if not row:
             return jsonify({"error": "Line not found"}), 404
         
-        code, line_no, vars_json, delta_json, status, error = row
+        code, line_no, vars_json, delta_json, status, error, codec = row
         
         # Parse variables
-        variables = json.loads(vars_json or "{}")
-        delta = json.loads(delta_json or "{}")
+        variables = interface.store.get_state_at(session_id, int(line_id)) or {}
+        delta = decode_scopes(delta_json, codec, conn)
         variables_parsed = parse_dap_variables(variables)
         delta_parsed = parse_dap_variables(delta)
         
@@ -897,7 +887,7 @@ def create_unified_app(db_path: Optional[str] = None) -> Flask:
     def get_function_context_api(session_id: str, line_id: str):
         """Get function context for a line."""
         interface.store.open()
-        conn = interface.store.conn
+        conn = interface.store.session_conn(session_id)
         assert conn is not None
         
         cur = conn.cursor()
@@ -926,7 +916,7 @@ def create_unified_app(db_path: Optional[str] = None) -> Flask:
     def explore_function_blocks(session_id: str, line_id: str):
         """Explore function blocks with pagination and numbered selection."""
         interface.store.open()
-        conn = interface.store.conn
+        conn = interface.store.session_conn(session_id)
         assert conn is not None
         
         cur = conn.cursor()
@@ -1070,18 +1060,18 @@ def create_unified_app(db_path: Optional[str] = None) -> Flask:
     def get_variables_detailed(session_id: str, line_id: str):
         """Get detailed variables for exploration."""
         interface.store.open()
-        conn = interface.store.conn
+        conn = interface.store.session_conn(session_id)
         assert conn is not None
         
         cur = conn.cursor()
-        cur.execute("SELECT variables, variables_delta FROM line_reports WHERE session_id=? AND id=?",
+        cur.execute("SELECT variables, variables_delta, variables_codec FROM line_reports WHERE session_id=? AND id=?",
                    (session_id, line_id))
         row = cur.fetchone()
         if not row:
             return jsonify({"error": "Line not found"}), 404
         
-        variables = json.loads(row[0] or "{}")
-        delta = json.loads(row[1] or "{}")
+        variables = interface.store.get_state_at(session_id, int(line_id)) or {}
+        delta = decode_scopes(row[1], row[2], conn)
         
         variables_parsed = parse_dap_variables(variables)
         delta_parsed = parse_dap_variables(delta)
@@ -1109,7 +1099,7 @@ def create_unified_app(db_path: Optional[str] = None) -> Flask:
     def explore_variable(session_id: str, line_id: str):
         """Explore a variable using the same logic as manual mode - read complete structure."""
         interface.store.open()
-        conn = interface.store.conn
+        conn = interface.store.session_conn(session_id)
         assert conn is not None
         
         var_name = request.json.get("variable")
@@ -1117,7 +1107,7 @@ def create_unified_app(db_path: Optional[str] = None) -> Flask:
         mode = request.json.get("mode", "summary")  # "summary" or "detailed"
         
         cur = conn.cursor()
-        cur.execute("SELECT variables, variables_delta FROM line_reports WHERE session_id=? AND id=?",
+        cur.execute("SELECT variables, variables_delta, variables_codec FROM line_reports WHERE session_id=? AND id=?",
                    (session_id, line_id))
         row = cur.fetchone()
         if not row:
@@ -1128,11 +1118,11 @@ def create_unified_app(db_path: Optional[str] = None) -> Flask:
         
         if is_changes:
             # Get changes
-            delta = json.loads(row[1] or "{}")
+            delta = decode_scopes(row[1], row[2], conn)
             target = parse_dap_variables(delta)
         else:
             # Get variables
-            variables = json.loads(row[0] or "{}")
+            variables = interface.store.get_state_at(session_id, int(line_id)) or {}
             target = parse_dap_variables(variables)
         
         # Navigate to the scope if path provided
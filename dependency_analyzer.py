@@ -10,6 +10,8 @@ import sqlite3
 from typing import Dict, List, Set, Tuple
 from pathlib import Path
 
+from autodebugger.common import STATE_PATCH_IS_DELTA, decode_scopes, next_state, session_db_path
+
 class DependencyAnalyzer:
     """Analyze variable dependencies from line reports."""
     
@@ -36,7 +38,7 @@ class DependencyAnalyzer:
             
             # Get all line reports for the session
             rows = cursor.execute("""
-                SELECT line_number, code, variables, variables_delta
+                SELECT line_number, code, variables, variables_delta, variables_codec, state_encoding
                 FROM line_reports
                 WHERE session_id = ?
                 ORDER BY id
@@ -48,9 +50,13 @@ class DependencyAnalyzer:
             variable_last_modified = {}  # Track last modification
             dependency_lines = {}  # Track where dependencies occur
             
-            for line_num, code, vars_json, delta_json in rows:
-                if vars_json:
-                    vars_dict = json.loads(vars_json)
+            state = None
+            for line_num, code, vars_json, delta_json, codec, encoding in rows:
+                # Rows stored as patches (--keyframe-interval) apply to the previous row's state
+                delta_for_state = decode_scopes(delta_json, codec, conn) if encoding == STATE_PATCH_IS_DELTA else None
+                state = next_state(state, decode_scopes(vars_json, codec, conn), delta_for_state, encoding)
+                if state:
+                    vars_dict = state
                     
                     # Update current variables
                     if 'Locals' in vars_dict:
@@ -61,7 +67,7 @@ class DependencyAnalyzer:
                             if var not in variable_first_seen:
                                 variable_first_seen[var] = line_num
                             if delta_json:
-                                delta = json.loads(delta_json)
+                                delta = decode_scopes(delta_json, codec, conn)
                                 if 'Locals' in delta and var in delta['Locals']:
                                     variable_last_modified[var] = line_num
                 
@@ -315,7 +321,7 @@ def main():
         sys.exit(1)
     
     session_id = sys.argv[1]
-    db_path = ".autodebug/line_reports.db"
+    db_path = session_db_path(".autodebug/line_reports.db", session_id)
     
     analyzer = DependencyAnalyzer(db_path)
     report = analyzer.analyze_session(session_id)
@@ -27,22 +27,53 @@ def get_db_path(db_path: Optional[str] = None) -> Path:
     path.parent.mkdir(parents=True, exist_ok=True)
     return path
 
-def parse_json_fields(row: Dict[str, Any]) -> Dict[str, Any]:
+def _common():
+    """Import autodebugger/common.py without requiring the package to be installed."""
+    import sys
+    autodebugger_path = Path(__file__).parent.parent / "autodebugger"
+    if str(autodebugger_path) not in sys.path:
+        sys.path.insert(0, str(autodebugger_path))
+    import common
+    return common
+
+def get_session_db_path(session_id: Optional[str], db: Optional[str] = None) -> Path:
+    """Database holding a session's rows: its `run --shard-sessions` file, else the main database."""
+    db_path = get_db_path(db)
+    if not session_id:
+        return db_path
+    return Path(_common().session_db_path(db_path, session_id))
+
+def load_scopes(conn: sqlite3.Connection, raw: Any, codec: Optional[int] = None) -> Any:
+    """Decode a variables/variables_delta column stored under `codec` (the row's variables_codec).
+
+    Values interned by `run --intern-values` are resolved as well.
+    """
+    if not isinstance(raw, (str, bytes)):
+        return raw
+    return _common().decode_scopes(raw, codec, conn)
+
+def load_state(conn: sqlite3.Connection, session_id: str, row: Any, states: Any) -> Any:
+    """Variables of a line_reports row; rows stored as patches by `run --keyframe-interval` are replayed.
+
+    `states` is a common.StateCache shared by the rows of one tool call.
+    """
+    if row['state_encoding']:
+        return states.get(conn, session_id, row['id'])
+    return load_scopes(conn, row['variables'], row['variables_codec'])
+
+def parse_json_fields(row: Dict[str, Any], conn: Optional[sqlite3.Connection] = None) -> Dict[str, Any]:
     """Parse JSON fields in database rows."""
     if not row:
         return row
     
-    if isinstance(row.get('variables'), str):
-        try:
-            row['variables'] = json.loads(row['variables'])
-        except (json.JSONDecodeError, TypeError):
-            pass
-    
-    if isinstance(row.get('variables_delta'), str):
-        try:
-            row['variables_delta'] = json.loads(row['variables_delta'])
-        except (json.JSONDecodeError, TypeError):
-            pass
+    codec = row.pop('variables_codec', None)
+    row.pop('state_encoding', None)
+    for key in ('variables', 'variables_delta'):
+        if isinstance(row.get(key), (str, bytes)):
+            try:
+                row[key] = _common().decode_scopes(row[key], codec, conn)
+            except Exception:
+                pass
     
     return row
 
@@ -101,7 +132,7 @@ def list_line_reports(
         file: Filter by source file path
         db: Optional database path
     """
-    db_path = get_db_path(db)
+    db_path = get_session_db_path(session_id, db)
     
     with sqlite3.connect(db_path) as conn:
         conn.row_factory = sqlite3.Row
@@ -124,7 +155,7 @@ def list_line_reports(
         query = f"""
             SELECT id, file, line_number, code, timestamp, variables, 
                    variables_delta, stack_depth, thread_id, status, 
-                   error_type, error_message, observations
+                   error_type, error_message, observations, variables_codec, state_encoding
             FROM line_reports 
             WHERE {where_clause}
             ORDER BY id 
@@ -134,12 +165,22 @@ def list_line_reports(
         params.extend([limit, offset])
         rows = cursor.execute(query, params).fetchall()
         
-        return [parse_json_fields(dict(row)) for row in rows]
+        states = _common().StateCache()
+        reports = []
+        for row in rows:
+            report = parse_json_fields(dict(row), conn)
+            if row['state_encoding']:
+                report['variables'] = load_state(conn, session_id, row, states)
+            reports.append(report)
+        return reports
 
 @mcp.tool
-def get_line_report(line_id: int, db: Optional[str] = None) -> Dict[str, Any]:
-    """Get detailed information about a specific line report."""
-    db_path = get_db_path(db)
+def get_line_report(line_id: int, db: Optional[str] = None, session_id: Optional[str] = None) -> Dict[str, Any]:
+    """Get detailed information about a specific line report.
+
+    Pass `session_id` for sessions recorded with `run --shard-sessions`.
+    """
+    db_path = get_session_db_path(session_id, db)
     
     with sqlite3.connect(db_path) as conn:
         conn.row_factory = sqlite3.Row
@@ -148,17 +189,22 @@ def get_line_report(line_id: int, db: Optional[str] = None) -> Dict[str, Any]:
         row = cursor.execute("""
             SELECT id, session_id, file, line_number, code, timestamp, 
                    variables, variables_delta, stack_depth, thread_id, 
-                   status, error_type, error_message, observations, stack_trace
+                   status, error_type, error_message, observations, stack_trace, variables_codec, state_encoding
             FROM line_reports 
             WHERE id = ?
         """, (line_id,)).fetchone()
+        if not row:
+            return {}
         
-        return parse_json_fields(dict(row)) if row else {}
+        report = parse_json_fields(dict(row), conn)
+        if row['state_encoding']:
+            report['variables'] = _common().reconstruct_state(conn, row['session_id'], row['id'])
+        return report
 
 @mcp.tool
 def get_crashes(session_id: str, db: Optional[str] = None) -> List[Dict[str, Any]]:
     """List all error/crash line reports for a session."""
-    db_path = get_db_path(db)
+    db_path = get_session_db_path(session_id, db)
     
     with sqlite3.connect(db_path) as conn:
         conn.row_factory = sqlite3.Row
@@ -179,7 +225,8 @@ def add_note(
     line_report_id: int,
     note: str,
     source: str = "llm",
-    db: Optional[str] = None
+    db: Optional[str] = None,
+    session_id: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Add a note/observation to a specific line report.
@@ -189,11 +236,12 @@ def add_note(
         note: The note/observation to add
         source: Source identifier (e.g., 'llm', 'agent', 'human')
         db: Optional database path
+        session_id: The report's session; needed for sessions recorded with `run --shard-sessions`
     
     Returns:
         Success status and the formatted note that was added
     """
-    db_path = get_db_path(db)
+    db_path = get_session_db_path(session_id, db)
     
     with sqlite3.connect(db_path) as conn:
         cursor = conn.cursor()
@@ -306,14 +354,14 @@ def find_variable_mutations(
     Returns:
         List of line reports where the variable changed, with before/after values
     """
-    db_path = get_db_path(db)
+    db_path = get_session_db_path(session_id, db)
     
     with sqlite3.connect(db_path) as conn:
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
         rows = cursor.execute("""
-            SELECT id, line_number, code, variables_delta, timestamp
+            SELECT id, line_number, code, variables_delta, timestamp, variables_codec
             FROM line_reports
             WHERE session_id = ? AND variables_delta IS NOT NULL
             ORDER BY id
@@ -323,7 +371,7 @@ def find_variable_mutations(
         previous_value = None
         
         for row in rows:
-            delta = json.loads(row['variables_delta']) if isinstance(row['variables_delta'], str) else row['variables_delta']
+            delta = load_scopes(conn, row['variables_delta'], row['variables_codec'])
             if not delta or scope not in delta:
                 continue
             
@@ -361,14 +409,14 @@ def find_precision_loss(
     Returns:
         Lines where precision loss was detected
     """
-    db_path = get_db_path(db)
+    db_path = get_session_db_path(session_id, db)
     
     with sqlite3.connect(db_path) as conn:
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
         rows = cursor.execute("""
-            SELECT id, line_number, code, variables_delta
+            SELECT id, line_number, code, variables_delta, variables_codec
             FROM line_reports
             WHERE session_id = ? 
             AND (code LIKE '%round%' OR code LIKE '%float%')
@@ -379,7 +427,7 @@ def find_precision_loss(
         precision_issues = []
         
         for row in rows:
-            delta = json.loads(row['variables_delta']) if isinstance(row['variables_delta'], str) else row['variables_delta']
+            delta = load_scopes(conn, row['variables_delta'], row['variables_codec'])
             
             issue = {
                 'line_number': row['line_number'],
@@ -420,14 +468,14 @@ def find_calculation_divergence(
     Returns:
         Analysis of where and how the values diverged
     """
-    db_path = get_db_path(db)
+    db_path = get_session_db_path(session_id, db)
     
     with sqlite3.connect(db_path) as conn:
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
         rows = cursor.execute("""
-            SELECT id, line_number, code, variables
+            SELECT id, line_number, code, variables, variables_codec, state_encoding
             FROM line_reports
             WHERE session_id = ?
             ORDER BY id
@@ -435,8 +483,9 @@ def find_calculation_divergence(
         
         divergence_points = []
         
+        states = _common().StateCache()
         for row in rows:
-            vars_dict = json.loads(row['variables']) if isinstance(row['variables'], str) else row['variables']
+            vars_dict = load_state(conn, session_id, row, states)
             if not vars_dict:
                 continue
             
@@ -494,7 +543,7 @@ def analyze_loop_behavior(
     Returns:
         Analysis of variable changes across iterations
     """
-    db_path = get_db_path(db)
+    db_path = get_session_db_path(session_id, db)
     
     with sqlite3.connect(db_path) as conn:
         conn.row_factory = sqlite3.Row
@@ -502,7 +551,7 @@ def analyze_loop_behavior(
         
         # Get executions around the loop line
         rows = cursor.execute("""
-            SELECT id, line_number, code, variables, loop_iteration
+            SELECT id, line_number, code, variables, loop_iteration, variables_codec, state_encoding
             FROM line_reports
             WHERE session_id = ? 
             AND line_number BETWEEN ? AND ?
@@ -516,6 +565,7 @@ def analyze_loop_behavior(
         # Track variables across iterations
         iterations = {}
         current_iteration = 0
+        states = _common().StateCache()
         
         for row in rows:
             # Use loop_iteration if available, otherwise track manually
@@ -524,7 +574,7 @@ def analyze_loop_behavior(
             if row['line_number'] == loop_line:
                 current_iteration += 1
             
-            vars_dict = json.loads(row['variables']) if isinstance(row['variables'], str) else row['variables']
+            vars_dict = load_state(conn, session_id, row, states)
             
             if vars_dict and 'Locals' in vars_dict:
                 if iteration not in iterations:
@@ -599,7 +649,7 @@ def search_code_execution(
     Returns:
         Matching lines with execution context
     """
-    db_path = get_db_path(db)
+    db_path = get_session_db_path(session_id, db)
     
     with sqlite3.connect(db_path) as conn:
         conn.row_factory = sqlite3.Row
@@ -613,7 +663,7 @@ def search_code_execution(
         
         # Get all lines for the session
         all_rows = cursor.execute("""
-            SELECT id, line_number, code, variables_delta
+            SELECT id, line_number, code, variables_delta, variables_codec
             FROM line_reports
             WHERE session_id = ?
             ORDER BY id
@@ -635,7 +685,7 @@ def search_code_execution(
                         'is_match': j == i
                     })
                 
-                delta = json.loads(row['variables_delta']) if row['variables_delta'] and isinstance(row['variables_delta'], str) else row['variables_delta']
+                delta = load_scopes(conn, row['variables_delta'], row['variables_codec']) if row['variables_delta'] else row['variables_delta']
                 
                 matches.append({
                     'line_number': row['line_number'],
@@ -668,7 +718,7 @@ def analyze_call_frequency(
     Returns:
         List of functions with their call counts and line numbers
     """
-    db_path = get_db_path(db)
+    db_path = get_session_db_path(session_id, db)
     
     with sqlite3.connect(db_path) as conn:
         conn.row_factory = sqlite3.Row
@@ -742,14 +792,14 @@ def find_string_mutations(
     """
     import difflib
     
-    db_path = get_db_path(db)
+    db_path = get_session_db_path(session_id, db)
     
     with sqlite3.connect(db_path) as conn:
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
         rows = cursor.execute("""
-            SELECT id, line_number, code, variables_delta, timestamp
+            SELECT id, line_number, code, variables_delta, timestamp, variables_codec
             FROM line_reports
             WHERE session_id = ? AND variables_delta IS NOT NULL
             ORDER BY id
@@ -759,7 +809,7 @@ def find_string_mutations(
         previous_value = None
         
         for row in rows:
-            delta = json.loads(row['variables_delta']) if isinstance(row['variables_delta'], str) else row['variables_delta']
+            delta = load_scopes(conn, row['variables_delta'], row['variables_codec'])
             if not delta or scope not in delta:
                 continue
             
@@ -861,14 +911,14 @@ def find_state_transitions(
     Returns:
         State transition analysis including transition graph and anomalies
     """
-    db_path = get_db_path(db)
+    db_path = get_session_db_path(session_id, db)
     
     with sqlite3.connect(db_path) as conn:
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
         rows = cursor.execute("""
-            SELECT id, line_number, code, variables_delta, timestamp
+            SELECT id, line_number, code, variables_delta, timestamp, variables_codec
             FROM line_reports
             WHERE session_id = ? AND variables_delta IS NOT NULL
             ORDER BY id
@@ -880,7 +930,7 @@ def find_state_transitions(
         previous_state = None
         
         for row in rows:
-            delta = json.loads(row['variables_delta']) if isinstance(row['variables_delta'], str) else row['variables_delta']
+            delta = load_scopes(conn, row['variables_delta'], row['variables_codec'])
             if not delta or scope not in delta:
                 continue
             
@@ -992,7 +1042,7 @@ def analyze_string_patterns(
     Returns:
         Analysis of string patterns including violations and encoding issues
     """
-    db_path = get_db_path(db)
+    db_path = get_session_db_path(session_id, db)
     
     # Predefined format patterns
     format_patterns = {
@@ -1016,7 +1066,7 @@ def analyze_string_patterns(
         cursor = conn.cursor()
         
         rows = cursor.execute("""
-            SELECT id, line_number, code, variables
+            SELECT id, line_number, code, variables, variables_codec, state_encoding
             FROM line_reports
             WHERE session_id = ?
             ORDER BY id
@@ -1028,8 +1078,9 @@ def analyze_string_patterns(
         variable_re = re.compile(variable_pattern)
         validation_re = re.compile(validation_pattern) if validation_pattern else None
         
+        states = _common().StateCache()
         for row in rows:
-            vars_dict = json.loads(row['variables']) if isinstance(row['variables'], str) else row['variables']
+            vars_dict = load_state(conn, session_id, row, states)
             if not vars_dict:
                 continue
             
@@ -1118,7 +1169,7 @@ def analyze_variable_dependencies(
     Returns:
         Dependency analysis report including graph, cycles, and key variables
     """
-    db_path = get_db_path(db)
+    db_path = get_session_db_path(session_id, db)
     
     # First ensure the dependency tables exist
     import sys
@@ -1168,7 +1219,7 @@ def _get_dependency_graph_internal(
     db: Optional[str] = None
 ) -> Dict[str, Any]:
     """Internal function to get dependency graph data."""
-    db_path = get_db_path(db)
+    db_path = get_session_db_path(session_id, db)
     
     with sqlite3.connect(db_path) as conn:
         conn.row_factory = sqlite3.Row
@@ -1333,7 +1384,7 @@ def find_variable_influence(
     Returns:
         Influence path if exists, or indication of no influence
     """
-    db_path = get_db_path(db)
+    db_path = get_session_db_path(session_id, db)
     
     with sqlite3.connect(db_path) as conn:
         conn.row_factory = sqlite3.Row  # Fix: Set row_factory
@@ -9,6 +9,7 @@ import {
 import Database from 'better-sqlite3';
 import fs from 'node:fs';
 import path from 'node:path';
+import zlib from 'node:zlib';
 
 // Simple helpers
 function openDb(dbPath?: string) {
@@ -21,13 +22,126 @@ function openDb(dbPath?: string) {
   return { db, dbPath: p };
 }
 
-function rowToJson(row: any) {
+// Mirrors session_db_path in autodebugger/common.py: a run --shard-sessions session keeps its rows
+// in its own file, named by session_summaries.shard_path relative to the catalog database.
+function openSessionDb(dbPath: string | undefined, sessionId?: string) {
+  const catalog = openDb(dbPath);
+  if (!sessionId) return catalog;
+  let row: any;
+  try {
+    row = catalog.db.prepare('SELECT shard_path FROM session_summaries WHERE session_id = ?').get(sessionId);
+  } catch {
+    return catalog;  // no shard_path column yet: nothing is sharded
+  }
+  if (!row || !row.shard_path) return catalog;
+  const p = path.join(path.dirname(path.resolve(catalog.dbPath)), row.shard_path);
+  return { db: new Database(p, { fileMustExist: true, readonly: false }), dbPath: p };
+}
+
+// Mirrors VALUE_REF_KEY / resolve_value_refs in autodebugger/common.py (run --intern-values)
+const VALUE_REF_KEY = '__value_ref__';
+
+function isValueRef(value: any): boolean {
+  return !!value && typeof value === 'object' && !Array.isArray(value)
+    && Object.keys(value).length === 1 && typeof value[VALUE_REF_KEY] === 'string';
+}
+
+function resolveValueRefs(db: Database.Database, scopes: any) {
+  if (!scopes || typeof scopes !== 'object') return scopes;
+  const refs = new Set<string>();
+  for (const vars of Object.values<any>(scopes)) {
+    if (vars && typeof vars === 'object') {
+      for (const v of Object.values<any>(vars)) if (isValueRef(v)) refs.add(v[VALUE_REF_KEY]);
+    }
+  }
+  if (refs.size === 0) return scopes;
+  const lookup = db.prepare('SELECT encoded FROM interned_values WHERE hash = ?');
+  const values = new Map<string, any>();
+  for (const h of refs) {
+    const row: any = lookup.get(h);
+    values.set(h, row ? JSON.parse(row.encoded) : null);
+  }
+  for (const vars of Object.values<any>(scopes)) {
+    if (vars && typeof vars === 'object') {
+      for (const [name, v] of Object.entries<any>(vars)) if (isValueRef(v)) vars[name] = values.get(v[VALUE_REF_KEY]);
+    }
+  }
+  return scopes;
+}
+
+// Mirrors the CODEC_* ids and decode_scopes in autodebugger/common.py (line_reports.variables_codec)
+const CODEC_ZLIB = 1;
+const CODEC_ZSTD = 2;
+
+function decodeScopes(raw: string | Buffer, codec?: number | null) {
+  if (!codec) return JSON.parse(raw.toString());
+  if (codec === CODEC_ZLIB) return JSON.parse(zlib.inflateSync(raw).toString('utf8'));
+  if (codec === CODEC_ZSTD) {
+    const zstdDecompressSync = (zlib as any).zstdDecompressSync;  // Node 22.15+
+    if (!zstdDecompressSync) throw new Error('zstd-encoded row needs Node 22.15 or newer');
+    return JSON.parse(zstdDecompressSync(raw).toString('utf8'));
+  }
+  throw new Error(`Unknown variables codec ${codec}`);
+}
+
+// Mirrors the STATE_* ids, apply_patch and reconstruct_state in autodebugger/common.py
+// (line_reports.state_encoding, written by run --keyframe-interval)
+const STATE_PATCH = 1;
+const STATE_PATCH_IS_DELTA = 2;
+const REMOVED_KEY = '__removed__';
+
+function isPlainObject(value: any): boolean {
+  return !!value && typeof value === 'object' && !Array.isArray(value) && !Buffer.isBuffer(value);
+}
+
+function applyPatch(state: any, patch: any): any {
+  const out: any = { ...state };
+  for (const [k, v] of Object.entries<any>(patch)) {
+    if (isPlainObject(v) && Object.keys(v).length === 1 && v[REMOVED_KEY] === true) delete out[k];
+    else if (isPlainObject(v) && isPlainObject(out[k])) out[k] = applyPatch(out[k], v);
+    else out[k] = v;
+  }
+  return out;
+}
+
+function reconstructState(db: Database.Database, sessionId: string, stepId: number) {
+  const keyframe: any = db.prepare(
+    `SELECT id FROM line_reports WHERE session_id = ? AND id <= ? AND COALESCE(state_encoding, 0) = 0 ORDER BY id DESC LIMIT 1`
+  ).get(sessionId, stepId);
+  if (!keyframe) return null;
+  const rows: any[] = db.prepare(
+    `SELECT variables, variables_delta, variables_codec, state_encoding FROM line_reports
+     WHERE session_id = ? AND id >= ? AND id <= ? ORDER BY id`
+  ).all(sessionId, keyframe.id, stepId);
+  let state: any = {};
+  for (const r of rows) {
+    const variables = resolveValueRefs(db, decodeScopes(r.variables ?? '{}', r.variables_codec));
+    if (!r.state_encoding) state = variables;
+    else if (r.state_encoding === STATE_PATCH) state = applyPatch(state, variables);
+    else if (r.state_encoding === STATE_PATCH_IS_DELTA) {
+      state = applyPatch(state, resolveValueRefs(db, decodeScopes(r.variables_delta ?? '{}', r.variables_codec)));
+    }
+  }
+  return state;
+}
+
+function rowToJson(row: any, db?: Database.Database, sessionId?: string) {
   if (!row) return row;
-  if (typeof row.variables === 'string') {
-    try { row.variables = JSON.parse(row.variables); } catch {}
+  const codec = row.variables_codec;
+  const stateEncoding = row.state_encoding;
+  delete row.variables_codec;
+  delete row.state_encoding;
+  for (const key of ['variables', 'variables_delta']) {
+    if (typeof row[key] === 'string' || Buffer.isBuffer(row[key])) {
+      try { row[key] = decodeScopes(row[key], codec); } catch {}
+    }
   }
-  if (typeof row.variables_delta === 'string') {
-    try { row.variables_delta = JSON.parse(row.variables_delta); } catch {}
+  if (db) {
+    row.variables = resolveValueRefs(db, row.variables);
+    row.variables_delta = resolveValueRefs(db, row.variables_delta);
+    if (stateEncoding) {
+      try { row.variables = reconstructState(db, sessionId ?? row.session_id, row.id); } catch {}
+    }
   }
   return row;
 }
@@ -75,7 +189,11 @@ const tools: Record<string, Tool> = {
     inputSchema: {
       type: 'object',
       required: ['id'],
-      properties: { db: { type: 'string', nullable: true }, id: { type: 'integer' } },
+      properties: {
+        db: { type: 'string', nullable: true },
+        id: { type: 'integer' },
+        sessionId: { type: 'string', nullable: true, description: 'Needed for sessions recorded with run --shard-sessions' },
+      },
     },
   },
   getCrashes: {
@@ -97,7 +215,8 @@ const tools: Record<string, Tool> = {
         db: { type: 'string', nullable: true },
         lineReportId: { type: 'integer', description: 'The line report ID to add a note to' },
         note: { type: 'string', description: 'The note/observation to add' },
-        source: { type: 'string', default: 'llm', description: 'Source identifier (e.g., llm, agent, human)' }
+        source: { type: 'string', default: 'llm', description: 'Source identifier (e.g., llm, agent, human)' },
+        sessionId: { type: 'string', nullable: true, description: 'Needed for sessions recorded with run --shard-sessions' }
       },
     },
   },
@@ -130,30 +249,30 @@ async function main() {
         }
         case 'listLineReports': {
           const { db: dbPath, sessionId, offset = 0, limit = 200, status, file } = (args as any) || {};
-          const { db } = openDb(dbPath);
+          const { db } = openSessionDb(dbPath, sessionId);
           const filters: string[] = ['session_id = ?'];
           const params: any[] = [sessionId];
           if (status) { filters.push('status = ?'); params.push(status); }
           if (file) { filters.push('file = ?'); params.push(file); }
           const where = filters.join(' AND ');
           const rows = db.prepare(
-            `SELECT id, file, line_number, code, timestamp, variables, variables_delta, stack_depth, thread_id, status, error_type, error_message
+            `SELECT id, file, line_number, code, timestamp, variables, variables_delta, stack_depth, thread_id, status, error_type, error_message, variables_codec, state_encoding
              FROM line_reports WHERE ${where} ORDER BY id LIMIT ? OFFSET ?`
-          ).all(...params, limit, offset).map(rowToJson);
+          ).all(...params, limit, offset).map((row) => rowToJson(row, db, sessionId));
           return { content: [{ type: 'json', json: rows }] };
         }
         case 'getLineReport': {
-          const { db: dbPath, id } = (args as any) || {};
-          const { db } = openDb(dbPath);
+          const { db: dbPath, id, sessionId } = (args as any) || {};
+          const { db } = openSessionDb(dbPath, sessionId);
           const row = db.prepare(
-            `SELECT id, session_id, file, line_number, code, timestamp, variables, variables_delta, stack_depth, thread_id, status, error_type, error_message
+            `SELECT id, session_id, file, line_number, code, timestamp, variables, variables_delta, stack_depth, thread_id, status, error_type, error_message, variables_codec, state_encoding
              FROM line_reports WHERE id = ?`
           ).get(id);
-          return { content: [{ type: 'json', json: rowToJson(row) }] };
+          return { content: [{ type: 'json', json: rowToJson(row, db) }] };
         }
         case 'getCrashes': {
           const { db: dbPath, sessionId } = (args as any) || {};
-          const { db } = openDb(dbPath);
+          const { db } = openSessionDb(dbPath, sessionId);
           const rows = db.prepare(
             `SELECT id, file, line_number, code, timestamp, error_type, error_message
              FROM line_reports WHERE session_id = ? AND status = 'error' ORDER BY id`
@@ -161,8 +280,8 @@ async function main() {
           return { content: [{ type: 'json', json: rows }] };
         }
         case 'addNote': {
-          const { db: dbPath, lineReportId, note, source = 'llm' } = (args as any) || {};
-          const { db } = openDb(dbPath);
+          const { db: dbPath, lineReportId, note, source = 'llm', sessionId } = (args as any) || {};
+          const { db } = openSessionDb(dbPath, sessionId);
           
           // Get current observations
           const current = db.prepare('SELECT observations FROM line_reports WHERE id = ?').get(lineReportId) as any;
@@ -0,0 +1,63 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from autodebugger.db import LineReport, LineReportStore, SessionSummary  # noqa: E402
+
+
+def make_report(session_id, line_number, variables, delta=None, code=None, file="/tmp/script.py", **kwargs):
+    """A line report with a fixed timestamp per line, for comparing exports."""
+    return LineReport(
+        session_id=session_id,
+        file=file,
+        line_number=line_number,
+        code=code or f"line_{line_number} = {line_number}",
+        timestamp=f"2026-01-01T00:00:{line_number % 60:02d}.000000Z",
+        variables=variables,
+        stack_depth=1,
+        thread_id=1,
+        variables_delta=delta,
+        **kwargs,
+    )
+
+
+def start_session(store, session_id, start_time="2026-01-01T00:00:00Z"):
+    store.create_session(SessionSummary(session_id, "/tmp/script.py", "python", start_time))
+
+
+def keyframe_states():
+    """Session states where ``tmp`` appears and then disappears, so patches mark a removed key."""
+    return [
+        {"Locals": {"i": 0}},
+        {"Locals": {"i": 1, "tmp": [1]}},
+        {"Locals": {"i": 2, "tmp": [1, 2]}},
+        {"Locals": {"i": 3}},
+        {"Locals": {"i": 4, "d": {"a": 1, "b": 2}}},
+        {"Locals": {"i": 5, "d": {"a": 1}}},
+        {"Locals": {"i": 6}},
+    ]
+
+
+def record_states(store, session_id, states):
+    """Store one line report per state, each with its delta from the previous one."""
+    prev = {}
+    for n, state in enumerate(states):
+        delta = {scope: {k: v for k, v in vars_.items() if prev.get(scope, {}).get(k) != v} for scope, vars_ in state.items()}
+        store.add_line_report(make_report(session_id, n + 1, state, delta))
+        prev = state
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "line_reports.db")
+
+
+@pytest.fixture
+def store(db_path):
+    s = LineReportStore(db_path)
+    s.open()
+    yield s
+    s.close()
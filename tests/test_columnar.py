@@ -0,0 +1,73 @@
+import pytest
+
+from autodebugger.columnar import export_session_npz
+
+from conftest import make_report, start_session
+
+np = pytest.importorskip("numpy")
+
+STEPS = [
+    {"Locals": {"n": 0, "x": 0.5, "name": "a"}},
+    {"Locals": {"n": 1, "x": 1.5, "name": "b", "flag": True}},
+    {"Locals": {"n": 2, "name": "c", "big": 2**70}},
+    {"Locals": {"n": 3, "x": 3.5}, "Globals": {"g": 10}},
+]
+
+
+@pytest.fixture
+def session(store):
+    start_session(store, "s1")
+    for i, state in enumerate(STEPS):
+        store.add_line_report(make_report("s1", i + 1, state, memory_usage_mb=None if i == 1 else 10.0 + i))
+    store.flush()
+    return store
+
+
+def test_npz_arrays(session, tmp_path):
+    out = tmp_path / "s1.npz"
+    assert export_session_npz(session, "s1", str(out)) == len(STEPS)
+    with np.load(out) as data:
+        arrays = dict(data)
+
+    assert set(arrays) == {
+        "step_id", "line_number", "memory_usage_mb",
+        "Locals/n", "Locals/n/mask",
+        "Locals/x", "Locals/x/mask",
+        "Locals/big", "Locals/big/mask",
+        "Globals/g", "Globals/g/mask",
+    }
+    assert all(len(a) == len(STEPS) for a in arrays.values())
+    assert arrays["step_id"].dtype == np.int64 and arrays["line_number"].tolist() == [1, 2, 3, 4]
+    assert np.isnan(arrays["memory_usage_mb"][1]) and arrays["memory_usage_mb"][0] == 10.0
+
+    assert arrays["Locals/n"].dtype == np.int64
+    assert arrays["Locals/n"].tolist() == [0, 1, 2, 3]
+    assert arrays["Locals/x"].dtype == np.float64
+    assert arrays["Locals/x/mask"].tolist() == [False, False, True, False]
+    assert np.isnan(arrays["Locals/x"][2])
+    # Ints beyond int64 fall back to float64
+    assert arrays["Locals/big"].dtype == np.float64
+    assert arrays["Globals/g/mask"].tolist() == [True, True, True, False]
+    assert all(arrays[f"{k}/mask"].dtype == np.bool_ for k in ("Locals/n", "Locals/x", "Locals/big", "Globals/g"))
+
+
+def test_npz_step_range(session, tmp_path):
+    ids = [r["id"] for r in session.iter_session_reports("s1", ["id"])]
+    out = tmp_path / "range.npz"
+    assert export_session_npz(session, "s1", str(out), from_step=ids[1], to_step=ids[2]) == 2
+    with np.load(out) as data:
+        assert data["step_id"].tolist() == ids[1:3]
+        assert data["Locals/n"].tolist() == [1, 2]
+
+
+def test_export_command_writes_npz(session, db_path, tmp_path):
+    testing = pytest.importorskip("click.testing")
+    cli = pytest.importorskip("autodebugger.cli")
+    session.close()
+    out = tmp_path / "cli.npz"
+    result = testing.CliRunner().invoke(
+        cli.main, ["export", "--db", db_path, "--session", "s1", "--format", "npz", "--out", str(out)]
+    )
+    assert result.exit_code == 0, result.output
+    with np.load(out) as data:
+        assert data["Locals/n"].tolist() == [0, 1, 2, 3]
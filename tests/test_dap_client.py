@@ -0,0 +1,90 @@
+import asyncio
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from autodebugger.dap_client import AsyncDapClient, DapClient
+
+
+class FakeAdapter:
+    """Answers ``ping`` at once, ``slow`` after a delay and never answers ``silent``."""
+
+    def __init__(self, delay=0.3):
+        self.delay = delay
+        self.server = socket.create_server(("127.0.0.1", 0))
+        self.port = self.server.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        conn, _ = self.server.accept()
+        buf = b""
+        while True:
+            data = conn.recv(65536)
+            if not data:
+                return
+            buf += data
+            while b"\r\n\r\n" in buf:
+                header, rest = buf.split(b"\r\n\r\n", 1)
+                length = int(header.split(b":")[1])
+                if len(rest) < length:
+                    break
+                msg, buf = json.loads(rest[:length]), rest[length:]
+                if msg["command"] == "ping":
+                    self._respond(conn, msg)
+                elif msg["command"] == "slow":
+                    threading.Timer(self.delay, self._respond, (conn, msg)).start()
+
+    @staticmethod
+    def _respond(conn, msg):
+        raw = json.dumps({"type": "response", "request_seq": msg["seq"], "command": msg["command"], "success": True}).encode()
+        conn.sendall(b"Content-Length: %d\r\n\r\n" % len(raw) + raw)
+
+    def close(self):
+        self.server.close()
+
+
+@pytest.fixture
+def adapter():
+    a = FakeAdapter()
+    yield a
+    a.close()
+
+
+def test_timed_out_requests_are_forgotten(adapter):
+    client = DapClient("127.0.0.1", adapter.port)
+    client.connect()
+    try:
+        with pytest.raises(TimeoutError):
+            client.request("silent", wait=0.05)
+        with pytest.raises(TimeoutError):
+            client.request_batch([("ping", None), ("silent", None), ("slow", None)], wait=0.1)
+        assert client._futures == {} and client._unclaimed == {}
+        # A response arriving after its waiter gave up is dropped and the client keeps working
+        time.sleep(adapter.delay + 0.1)
+        assert client.request("ping", wait=2.0).success
+        assert client._futures == {} and client._unclaimed == {}
+    finally:
+        client.close()
+
+
+def test_async_timed_out_requests_are_forgotten(adapter):
+    async def scenario():
+        client = AsyncDapClient("127.0.0.1", adapter.port)
+        await client.connect()
+        try:
+            with pytest.raises(TimeoutError):
+                await client.request("silent", wait=0.05)
+            with pytest.raises(TimeoutError):
+                await client.request_batch([("ping", None), ("silent", None), ("slow", None)], wait=0.1)
+            await asyncio.sleep(0)
+            assert client._futures == {}
+            await asyncio.sleep(adapter.delay + 0.1)
+            assert (await client.request("ping", wait=2.0)).success
+            assert client._futures == {}
+        finally:
+            await client.close()
+
+    asyncio.run(scenario())
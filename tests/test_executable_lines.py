@@ -0,0 +1,89 @@
+import dis
+import os
+
+import pytest
+
+from autodebugger import executable_lines
+from autodebugger.executable_lines import ExecutableLineIndex, get_line_index
+
+SOURCE = (
+    "import os\n"          # 1
+    "\n"                   # 2
+    "# comment\n"          # 3
+    "total = (1 +\n"       # 4
+    "         2)\n"        # 5
+    "def f(x):\n"          # 6
+    "    return x * 2\n"   # 7
+    "print(f(total))\n"    # 8
+)
+
+
+@pytest.fixture(autouse=True)
+def empty_index_cache(monkeypatch):
+    monkeypatch.setattr(executable_lines, "_INDEX_CACHE", {})
+
+
+@pytest.fixture
+def script(tmp_path):
+    path = tmp_path / "script.py"
+    path.write_text(SOURCE)
+    return str(path)
+
+
+def test_index_holds_the_lines_a_debugger_can_stop_on():
+    index = ExecutableLineIndex.from_source(SOURCE)
+    # Blank lines, comments and the continuation line are left out; the function body is in
+    assert {2, 3, 5} & set(index.lines) == set()
+    assert {1, 4, 6, 7, 8} <= set(index.lines)
+    assert 7 in index and 3 not in index
+    assert (index.before(4), index.after(4)) == (1, 6)
+    assert index.before(index.lines[0]) is None and index.after(index.lines[-1]) is None
+    assert (index.nearest(3), index.nearest(7), index.nearest(100)) == (4, 7, index.lines[-1])
+
+
+class _Py39Code:
+    """A code object as Python 3.9 shows it: no ``co_lines``, so line starts come from ``dis``."""
+
+    def __init__(self, code):
+        self.code = code
+        self.co_consts = code.co_consts
+
+
+def test_findlinestarts_path_gives_the_same_lines(monkeypatch):
+    code = compile(SOURCE, "<string>", "exec")
+    real_findlinestarts = dis.findlinestarts
+    monkeypatch.setattr(executable_lines.dis, "findlinestarts", lambda c: real_findlinestarts(c.code))
+    assert sorted(set(executable_lines._code_lines(_Py39Code(code)))) == ExecutableLineIndex.from_source(SOURCE).lines
+
+
+def test_index_is_persisted_by_content_hash(store, script, tmp_path, monkeypatch):
+    lines = get_line_index(script, store).lines
+
+    # Same content under another path, with compiling ruled out: served from the store
+    copy = tmp_path / "copy.py"
+    copy.write_text(SOURCE)
+
+    def no_compile(*args, **kwargs):
+        raise AssertionError("compiled again")
+
+    monkeypatch.setattr(ExecutableLineIndex, "from_source", no_compile)
+    assert get_line_index(str(copy), store).lines == lines
+
+
+def test_index_is_rebuilt_when_the_file_changes(script):
+    first = get_line_index(script)
+    assert get_line_index(script) is first
+    with open(script, "a") as f:
+        f.write("extra = 1\n")
+    st = os.stat(script)
+    os.utime(script, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    second = get_line_index(script)
+    assert second is not first
+    assert second.lines[-1] == 9
+
+
+def test_unreadable_or_invalid_files_have_no_index(tmp_path):
+    broken = tmp_path / "broken.py"
+    broken.write_text("def f(:\n")
+    assert get_line_index(str(broken)) is None
+    assert get_line_index(str(tmp_path / "missing.py")) is None
@@ -0,0 +1,35 @@
+import json
+
+from conftest import make_report, start_session
+
+
+def _states(n, tag):
+    """Scopes for n steps; ``gone`` disappears at step 2 so patches carry removed-key markers."""
+    states = []
+    for i in range(n):
+        local = {"i": i, "tag": tag}
+        if i < 2:
+            local["gone"] = i
+        states.append({"Locals": local})
+    return states
+
+
+def test_ranged_export_with_interleaved_sessions(store):
+    store.keyframe_interval = 4
+    start_session(store, "a")
+    start_session(store, "b")
+    states = {"a": _states(10, "a"), "b": _states(10, "b")}
+    for i in range(10):
+        for sid in ("a", "b"):
+            store.add_line_report(make_report(sid, i + 1, states[sid][i]))
+
+    full = list(store.iter_session_reports("a", ["id", "variables"]))
+    assert [r["variables"] for r in full] == states["a"]
+    # Every start step inside a run of patches must still yield the full state
+    for k, start in enumerate(full):
+        ranged = list(store.iter_session_reports("a", ["id", "variables"], from_step=start["id"]))
+        assert ranged == full[k:]
+        assert "__removed__" not in json.dumps(ranged)
+    # A from_step that falls on the other session's row starts at a's next row
+    ranged = list(store.iter_session_reports("a", ["id", "variables"], from_step=full[5]["id"] - 1))
+    assert ranged == full[5:]
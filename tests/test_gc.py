@@ -0,0 +1,214 @@
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+import pytest
+
+from autodebugger import db as db_module
+from autodebugger.common import session_db_path
+from autodebugger.db import LineReportStore
+from autodebugger.schema_migrations import migrate_add_dependency_tables
+from dependency_analyzer import DependencyAnalyzer
+
+from conftest import make_report, start_session
+
+DAY = 24 * 3600
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _session(store, session_id, start_time, finished=True, rows=2):
+    start_session(store, session_id, start_time)
+    for i in range(rows):
+        store.add_line_report(make_report(session_id, i + 1, {"Locals": {"a": i, "b": i + 1}}, code="b = a + 1"))
+    if finished:
+        store.end_session(session_id, start_time)
+
+
+def _session_ids(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return sorted(r[0] for r in conn.execute("SELECT session_id FROM session_summaries"))
+
+
+def test_keep_last_deletes_all_other_finished_sessions(store, db_path):
+    for n in range(4):
+        _session(store, f"s{n}", f"2026-01-0{n + 1}T00:00:00Z")
+    result = store.collect_garbage(keep_last=2)
+    assert result["deleted_sessions"] == 2
+    assert _session_ids(db_path) == ["s2", "s3"]
+    with sqlite3.connect(db_path) as conn:
+        assert {r[0] for r in conn.execute("SELECT session_id FROM line_reports")} == {"s2", "s3"}
+
+
+def test_older_than_deletes_only_old_sessions(store, db_path):
+    _session(store, "old1", "2020-01-01T00:00:00Z")
+    _session(store, "old2", "2020-01-02T00:00:00Z")
+    _session(store, "new", _now())
+    assert store.collect_garbage(older_than=7 * DAY)["deleted_sessions"] == 2
+    assert _session_ids(db_path) == ["new"]
+
+    # keep_last protects the newest sessions even when they are old
+    _session(store, "old3", "2020-01-03T00:00:00Z")
+    _session(store, "old4", "2020-01-04T00:00:00Z")
+    store.collect_garbage(keep_last=2, older_than=7 * DAY)
+    assert _session_ids(db_path) == ["new", "old4"]
+
+
+def test_unfinished_sessions_are_never_collected(store, db_path):
+    _session(store, "done", "2020-01-01T00:00:00Z")
+    _session(store, "live", "2020-01-02T00:00:00Z", finished=False)
+    store.collect_garbage(keep_last=0, max_db_size=0)
+    assert _session_ids(db_path) == ["live"]
+
+
+def test_deletes_cascade_to_dependency_tables(store, db_path):
+    _session(store, "gone", "2020-01-01T00:00:00Z")
+    _session(store, "kept", _now())
+    store.flush()
+    migrate_add_dependency_tables(db_path)
+    for sid in ("gone", "kept"):
+        DependencyAnalyzer(db_path).analyze_session(sid)
+    store.collect_garbage(older_than=DAY)
+    with sqlite3.connect(db_path) as conn:
+        for table in ("dependency_summaries", "variable_dependencies", "variable_metadata"):
+            assert {r[0] for r in conn.execute(f"SELECT session_id FROM {table}")} == {"kept"}, table
+
+
+def _interned_sessions(store):
+    store.intern_values = True
+    big = "x" * 200
+    start_session(store, "gone", "2020-01-01T00:00:00Z")
+    store.add_line_report(make_report("gone", 1, {"Locals": {"only_gone": big + "gone", "shared": big}}))
+    store.end_session("gone", "2020-01-01T00:00:00Z")
+    start_session(store, "kept", _now())
+    store.add_line_report(make_report("kept", 1, {"Locals": {"shared": big}}))
+    store.end_session("kept", _now())
+    return big
+
+
+def test_unreferenced_interned_values_are_dropped(store, db_path, monkeypatch):
+    big = _interned_sessions(store)
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM interned_values").fetchone() == (2,)
+
+    def no_decoding(*args, **kwargs):
+        raise AssertionError("gc decoded a row")
+
+    # References come from interned_value_refs, never from decoding rows
+    with monkeypatch.context() as m:
+        m.setattr(db_module, "decode_scopes", no_decoding)
+        store.collect_garbage(older_than=DAY)
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM interned_values").fetchone() == (1,)
+    [row] = store.iter_session_reports("kept", ["variables"])
+    assert row["variables"] == {"Locals": {"shared": big}}
+
+
+def test_value_refs_are_rebuilt_for_older_databases(store, db_path):
+    big = _interned_sessions(store)
+    store.close()
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DROP TABLE interned_value_refs")
+
+    store.open()
+    with sqlite3.connect(db_path) as conn:
+        assert {r[0] for r in conn.execute("SELECT session_id FROM interned_value_refs")} == {"gone", "kept"}
+    store.collect_garbage(older_than=DAY)
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM interned_values").fetchone() == (1,)
+    [row] = store.iter_session_reports("kept", ["variables"])
+    assert row["variables"] == {"Locals": {"shared": big}}
+
+
+def test_gc_removes_shard_files(store, db_path):
+    store.shard_sessions = True
+    _session(store, "old", "2020-01-01T00:00:00Z")
+    _session(store, "new", _now())
+    old_path = session_db_path(db_path, "old")
+    stray = os.path.join(os.path.dirname(old_path), "stray.db")
+    open(stray, "wb").close()
+
+    store.collect_garbage(older_than=DAY)
+    assert not os.path.exists(old_path)
+    assert not os.path.exists(stray)
+    assert os.path.exists(session_db_path(db_path, "new"))
+    assert _session_ids(db_path) == ["new"]
+
+
+def test_gc_during_a_capture_keeps_the_values_it_refers_to(store, db_path):
+    big = _interned_sessions(store)
+    # The capturing store has written `shared` before; gc in another process drops it
+    gc_store = LineReportStore(db_path)
+    gc_store.open()
+    try:
+        gc_store.collect_garbage(keep_last=0)
+    finally:
+        gc_store.close()
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM interned_values").fetchone() == (0,)
+
+    start_session(store, "live", _now())
+    store.add_line_report(make_report("live", 1, {"Locals": {"shared": big}}))
+    store.flush()
+    [row] = store.iter_session_reports("live", ["variables"])
+    assert row["variables"] == {"Locals": {"shared": big}}
+
+
+def _legacy_vacuum_db(db_path):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE filler (x)")
+    store = LineReportStore(db_path)
+    store.open()
+    _session(store, "old", "2020-01-01T00:00:00Z")
+    return store
+
+
+def test_gc_leaves_older_databases_unconverted_by_default(db_path):
+    store = _legacy_vacuum_db(db_path)
+    try:
+        assert store.collect_garbage(keep_last=0)["incremental"] == 0
+        assert store.conn.execute("PRAGMA auto_vacuum").fetchone() == (0,)
+        assert store.collect_garbage(keep_last=0, convert_auto_vacuum=True)["incremental"] == 1
+        assert store.conn.execute("PRAGMA auto_vacuum").fetchone() == (2,)
+    finally:
+        store.close()
+
+
+def test_gc_command_warns_about_unconverted_databases(db_path):
+    testing = pytest.importorskip("click.testing")
+    cli = pytest.importorskip("autodebugger.cli")
+    _legacy_vacuum_db(db_path).close()
+    result = testing.CliRunner().invoke(cli.main, ["gc", "--db", db_path, "--keep-last", "0"])
+    assert result.exit_code == 0, result.output
+    assert "Warning:" in result.output
+    result = testing.CliRunner().invoke(cli.main, ["gc", "--db", db_path, "--keep-last", "0", "--convert-auto-vacuum"])
+    assert result.exit_code == 0, result.output
+    assert "Warning:" not in result.output
+
+
+def test_deletes_prune_files_and_source_lines_no_step_uses(store, db_path):
+    start_session(store, "gone", "2020-01-01T00:00:00Z")
+    store.add_line_report(make_report("gone", 1, {}, code="shared = 1"))
+    store.add_line_report(make_report("gone", 2, {}, code="only_gone = 2", file="/tmp/gone.py"))
+    store.end_session("gone", "2020-01-01T00:00:00Z")
+    start_session(store, "kept", _now())
+    store.add_line_report(make_report("kept", 1, {}, code="shared = 1"))
+    store.end_session("kept", _now())
+
+    store.collect_garbage(older_than=DAY)
+    with sqlite3.connect(db_path) as conn:
+        assert [r[0] for r in conn.execute("SELECT path FROM files")] == ["/tmp/script.py"]
+        assert [r[0] for r in conn.execute("SELECT code FROM source_lines")] == ["shared = 1"]
+    assert [(r["file"], r["code"]) for r in store.iter_session_reports("kept", ["file", "code"])] == [
+        ("/tmp/script.py", "shared = 1")
+    ]
+
+    # The same store writing a pruned path again gets a fresh key for it
+    start_session(store, "again", _now())
+    store.add_line_report(make_report("again", 2, {}, code="only_gone = 2", file="/tmp/gone.py"))
+    store.flush()
+    assert [(r["file"], r["code"]) for r in store.iter_session_reports("again", ["file", "code"])] == [
+        ("/tmp/gone.py", "only_gone = 2")
+    ]
@@ -0,0 +1,102 @@
+import pytest
+
+from autodebugger import common
+from autodebugger.common import (
+    CODEC_JSON,
+    CODEC_ZLIB,
+    REMOVED_KEY,
+    STATE_FULL,
+    STATE_PATCH,
+    STATE_PATCH_IS_DELTA,
+    apply_patch,
+    compute_patch,
+    decode_scopes,
+    reconstruct_state,
+)
+
+from conftest import keyframe_states, make_report, record_states, start_session
+
+
+def test_patch_marks_removed_keys():
+    prev = {"Locals": {"a": 1, "gone": 2, "d": {"x": 1, "y": 2}}}
+    curr = {"Locals": {"a": 1, "d": {"x": 1}}}
+    patch = compute_patch(curr, prev)
+    assert patch == {"Locals": {"gone": {REMOVED_KEY: True}, "d": {"y": {REMOVED_KEY: True}}}}
+    assert apply_patch(prev, patch) == curr
+    # None is a real value, not a removal
+    assert apply_patch(prev, compute_patch({"Locals": {**curr["Locals"], "gone": None}}, prev))["Locals"]["gone"] is None
+
+
+@pytest.mark.parametrize("codec", [CODEC_JSON, CODEC_ZLIB])
+def test_reconstruction_at_keyframe_and_patch_rows(store, codec):
+    store.keyframe_interval = 3
+    store.value_codec = codec
+    start_session(store, "s1")
+    states = keyframe_states()
+    record_states(store, "s1", states)
+
+    rows = store.conn.execute("SELECT id, state_encoding FROM line_reports WHERE session_id='s1' ORDER BY id").fetchall()
+    encodings = [e for _, e in rows]
+    assert encodings[0] == STATE_FULL and encodings[3] == STATE_FULL and encodings[6] == STATE_FULL
+    assert all(e in (STATE_PATCH, STATE_PATCH_IS_DELTA) for i, e in enumerate(encodings) if i % 3)
+    for (row_id, _), state in zip(rows, states):
+        assert store.get_state_at("s1", row_id) == state
+        assert reconstruct_state(store.conn, "s1", row_id) == state
+    # Row 5 drops d["b"]: its stored patch carries the marker, the rebuilt state does not
+    raw, row_codec = store.conn.execute("SELECT variables, variables_codec FROM line_reports WHERE id=?", (rows[5][0],)).fetchone()
+    assert decode_scopes(raw, row_codec) == {"Locals": {"i": 5, "d": {"b": {REMOVED_KEY: True}}}}
+    assert [r["variables"] for r in store.iter_session_reports("s1", ["variables"])] == states
+
+
+def test_without_an_interval_every_row_is_a_keyframe(store):
+    start_session(store, "s1")
+    record_states(store, "s1", keyframe_states())
+    encodings = {r[0] for r in store.conn.execute("SELECT state_encoding FROM line_reports")}
+    assert encodings <= {None, STATE_FULL}
+
+
+def test_each_session_starts_on_a_keyframe(store):
+    store.keyframe_interval = 4
+    start_session(store, "a")
+    start_session(store, "b")
+    states = keyframe_states()
+    for n in range(3):
+        for session_id in ("a", "b"):
+            store.add_line_report(make_report(session_id, n + 1, states[n]))
+    rows = store.conn.execute("SELECT session_id, state_encoding FROM line_reports ORDER BY id").fetchall()
+    assert [e for sid, e in rows if sid == "a"][0] == STATE_FULL
+    assert [e for sid, e in rows if sid == "b"][0] == STATE_FULL
+    assert all(e != STATE_FULL for sid, e in rows[2:])
+    for session_id in ("a", "b"):
+        ids = [r[0] for r in store.conn.execute("SELECT id FROM line_reports WHERE session_id=? ORDER BY id", (session_id,))]
+        assert [store.get_state_at(session_id, i) for i in ids] == states[:3]
+
+
+def test_get_state_at_replays_from_the_nearest_cached_row(store, monkeypatch):
+    store.keyframe_interval = 10
+    start_session(store, "s1")
+    states = keyframe_states()
+    record_states(store, "s1", states)
+    ids = [r[0] for r in store.conn.execute("SELECT id FROM line_reports ORDER BY id")]
+    bases = []
+    real_reconstruct = common.reconstruct_state
+
+    def reconstruct(conn, session_id, step_id, base=None):
+        bases.append(base[0] if base else None)
+        return real_reconstruct(conn, session_id, step_id, base)
+
+    monkeypatch.setattr(common, "reconstruct_state", reconstruct)
+    assert store.get_state_at("s1", ids[2]) == states[2]
+    assert store.get_state_at("s1", ids[5]) == states[5]
+    # A hit is served from the cache without replaying anything
+    assert store.get_state_at("s1", ids[2]) == states[2]
+    assert bases == [None, ids[2]]
+
+
+def test_get_state_at_an_unknown_row_is_none(store):
+    store.keyframe_interval = 3
+    start_session(store, "s1")
+    record_states(store, "s1", keyframe_states())
+    last_id = store.conn.execute("SELECT MAX(id) FROM line_reports").fetchone()[0]
+    assert store.get_state_at("s1", last_id + 1) is None
+    assert store.get_state_at("other", last_id) is None
@@ -0,0 +1,71 @@
+import sqlite3
+import sys
+
+import pytest
+
+from autodebugger import tracer
+from autodebugger.common import LineHitCounter
+
+from conftest import start_session
+
+
+def test_without_a_budget_every_hit_is_admitted():
+    counter = LineHitCounter()
+    assert all(counter.admit("/p/a.py", 1, f"t{n}") for n in range(100))
+    assert counter.drain() == []
+
+
+def test_hits_past_the_budget_are_counted_per_line():
+    counter = LineHitCounter(2)
+    admitted = [counter.admit("/p/a.py", 1, f"t{n}") for n in range(5)]
+    assert admitted == [True, True, False, False, False]
+    # Every (file, line) has its own budget
+    assert counter.admit("/p/a.py", 2, "t5") and counter.admit("/p/b.py", 1, "t6")
+    assert counter.drain() == [("/p/a.py", 1, 3, "t2", "t4")]
+
+    # Draining hands the counters over but does not reset the budget
+    assert counter.drain() == []
+    assert not counter.admit("/p/a.py", 1, "t7")
+    assert counter.drain() == [("/p/a.py", 1, 1, "t7", "t7")]
+
+
+def test_errors_bypass_the_budget_and_counters_are_stored_at_session_end(store, db_path, tmp_path):
+    start_session(store, "s1")
+    store.close()
+    script = tmp_path / "script.py"
+    script.write_text("def f(i):\n    return 10 // (4 - i)\nfor i in range(5):\n    f(i)\n")
+    saved_argv, saved_path = sys.argv[:], sys.path[:]
+    try:
+        code = tracer.main([
+            "--engine", "settrace", "--db", db_path, "--session-id", "s1",
+            "--max-hits-per-line", "2", str(script),
+        ])
+    finally:
+        sys.argv[:], sys.path[:] = saved_argv, saved_path
+    assert code == 1
+
+    store.open()
+    rows = store.conn.execute("SELECT line_number, status FROM line_reports ORDER BY id").fetchall()
+    # Line 2 is over its budget when the division fails, but the error row is kept
+    assert [status for line, status in rows if line == 2] == ["success", "success", "error"]
+    assert {(h["line_number"], h["hits"]) for h in store.get_line_hits("s1")} == {(2, 3), (3, 3), (4, 7)}
+
+
+def test_runner_stores_counters_when_the_session_ends(db_path):
+    runner = pytest.importorskip("autodebugger.runner")
+    debugger = runner.AutoDebugger(db_path=db_path)
+    debugger._line_hits = LineHitCounter(1)
+    for n in range(4):
+        debugger._line_hits.admit("/p/a.py", 7, f"2026-01-01T00:00:0{n}Z")
+    debugger.db.open()
+    try:
+        start_session(debugger.db, debugger.session_id)
+        debugger._finish_session()
+        assert debugger.db.get_line_hits(debugger.session_id) == [{
+            "file": "/p/a.py", "line_number": 7, "hits": 3,
+            "first_timestamp": "2026-01-01T00:00:01Z", "last_timestamp": "2026-01-01T00:00:03Z",
+        }]
+    finally:
+        debugger.db.close()
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT end_time FROM session_summaries").fetchone()[0] is not None
@@ -0,0 +1,156 @@
+import itertools
+
+import pytest
+
+from autodebugger.db import LineReport, LoopSummary
+from autodebugger.loop_summary import LoopSummarizer
+
+
+@pytest.fixture
+def script(tmp_path):
+    """Writes ``source`` to a file and returns its path; the summarizer finds loops by parsing it."""
+    def write(source):
+        path = tmp_path / "script.py"
+        path.write_text(source)
+        return str(path)
+    return write
+
+
+def _summarize(path, stops, keep_iterations):
+    """Feed (line, depth, locals) stops through a summarizer; return the released items, compacted."""
+    summarizer = LoopSummarizer("s1", keep_iterations)
+    clock = itertools.count()
+    items = []
+    for line, depth, local_vars in stops:
+        items += summarizer.feed(LineReport(
+            session_id="s1",
+            file=path,
+            line_number=line,
+            code="",
+            timestamp=f"2026-01-01T00:00:{next(clock):02d}.000000Z",
+            variables={"Locals": local_vars},
+            stack_depth=depth,
+            thread_id=1,
+        ))
+    items += summarizer.finish()
+    compact = [
+        ("summary", item.line_number, item.first_iteration, item.iterations, item.rows)
+        if isinstance(item, LoopSummary) else (item.line_number, item.stack_depth)
+        for item in items
+    ]
+    return compact, [item for item in items if isinstance(item, LoopSummary)]
+
+
+def test_for_loop_keeps_first_and_last_iterations(script):
+    path = script("total = 0\nfor i in range(5):\n    total += i\nprint(total)\n")
+    stops = [(1, 1, {})]
+    for i in range(5):
+        stops += [(2, 1, {"total": sum(range(i))}), (3, 1, {"i": i, "total": sum(range(i))})]
+    stops += [(2, 1, {"i": 4, "total": 10}), (4, 1, {"i": 4, "total": 10})]
+
+    compact, summaries = _summarize(path, stops, keep_iterations=2)
+
+    assert compact == [
+        (1, 1), (2, 1), (3, 1), (2, 1), (3, 1),
+        ("summary", 2, 3, 2, 4),
+        # The last iteration ends on the header stop of the exhausted iterator
+        (2, 1), (3, 1), (2, 1),
+        (4, 1),
+    ]
+    assert summaries[0].variables["Locals"]["i"] == {"min": 2, "max": 3, "first": 2, "last": 3}
+    assert summaries[0].variables["Locals"]["total"] == {"min": 1, "max": 3, "first": 1, "last": 3}
+
+
+def test_while_loop_ends_on_the_failed_condition(script):
+    path = script("n = 0\nwhile n < 4:\n    n += 1\ndone = n\n")
+    stops = [(1, 1, {})]
+    for n in range(4):
+        stops += [(2, 1, {"n": n}), (3, 1, {"n": n})]
+    stops += [(2, 1, {"n": 4}), (4, 1, {"n": 4})]
+
+    compact, summaries = _summarize(path, stops, keep_iterations=1)
+
+    assert compact == [
+        (1, 1), (2, 1), (3, 1),
+        ("summary", 2, 2, 2, 4),
+        (2, 1), (3, 1), (2, 1),
+        (4, 1),
+    ]
+    assert summaries[0].variables["Locals"]["n"] == {"min": 1, "max": 2, "first": 1, "last": 2}
+
+
+def test_nested_loop_summaries_fold_into_the_outer_loop(script):
+    path = script("for i in range(3):\n    for j in range(3):\n        pass\nend = 1\n")
+    stops = []
+    for i in range(3):
+        stops.append((1, 1, {"i": i}))
+        for j in range(3):
+            stops += [(2, 1, {"i": i, "j": j}), (3, 1, {"i": i, "j": j})]
+        stops.append((2, 1, {"i": i, "j": 2}))
+    stops += [(1, 1, {"i": 2, "j": 2}), (4, 1, {"i": 2, "j": 2})]
+
+    compact, summaries = _summarize(path, stops, keep_iterations=1)
+
+    inner_run = [(2, 1), (3, 1), ("summary", 2, 2, 1, 2), (2, 1), (3, 1), (2, 1)]
+    assert compact == [
+        (1, 1), *inner_run,
+        # Outer iteration 2, inner loop summary included, collapses into one summary
+        ("summary", 1, 2, 1, 8),
+        (1, 1), *inner_run, (1, 1),
+        (4, 1),
+    ]
+    outer = summaries[1]
+    assert outer.variables["Locals"]["i"] == {"min": 1, "max": 1, "first": 1, "last": 1}
+    assert outer.variables["Locals"]["j"] == {"min": 0, "max": 2, "first": 0, "last": 2}
+
+
+def test_break_makes_the_partial_iteration_the_last(script):
+    path = script("for i in range(10):\n    if i == 3:\n        break\nafter = i\n")
+    stops = []
+    for i in range(4):
+        stops += [(1, 1, {"i": i - 1} if i else {}), (2, 1, {"i": i})]
+    stops += [(3, 1, {"i": 3}), (4, 1, {"i": 3})]
+
+    compact, _ = _summarize(path, stops, keep_iterations=1)
+
+    assert compact == [
+        (1, 1), (2, 1),
+        ("summary", 1, 2, 2, 4),
+        (1, 1), (2, 1), (3, 1),
+        (4, 1),
+    ]
+
+
+def test_return_closes_the_loop_on_the_callers_stop(script):
+    path = script(
+        "def find(xs):\n"
+        "    for x in xs:\n"
+        "        if x > 2:\n"
+        "            return x\n"
+        "    return None\n"
+        "\n"
+        "found = find([1, 2, 3, 4])\n"
+    )
+    stops = [(7, 1, {})]
+    for x in (1, 2, 3):
+        stops += [(2, 2, {"x": x}), (3, 2, {"x": x})]
+    stops += [(4, 2, {"x": 3}), (7, 1, {})]
+
+    compact, summaries = _summarize(path, stops, keep_iterations=1)
+
+    assert compact == [
+        (7, 1), (2, 2), (3, 2),
+        ("summary", 2, 2, 1, 2),
+        (2, 2), (3, 2), (4, 2),
+        (7, 1),
+    ]
+    assert summaries[0].variables["Locals"]["x"] == {"min": 2, "max": 2, "first": 2, "last": 2}
+
+
+def test_finish_closes_loops_still_open(script):
+    path = script("while True:\n    pass\n")
+    stops = [(1, 1, {}), (2, 1, {})] * 4
+
+    compact, _ = _summarize(path, stops, keep_iterations=1)
+
+    assert compact == [(1, 1), (2, 1), ("summary", 1, 2, 2, 4), (1, 1), (2, 1)]
@@ -0,0 +1,121 @@
+import json
+import sqlite3
+
+from autodebugger.db import LineReportStore
+
+# line_reports as databases created before the normalized layout have it
+LEGACY_LINE_REPORTS = """
+    CREATE TABLE line_reports (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      session_id TEXT NOT NULL,
+      file TEXT NOT NULL,
+      line_number INTEGER NOT NULL,
+      code TEXT NOT NULL,
+      timestamp TEXT NOT NULL,
+      variables TEXT,
+      variables_delta TEXT,
+      stack_depth INTEGER,
+      thread_id INTEGER,
+      observations TEXT,
+      status TEXT CHECK(status IN ('success','error','warning')),
+      error_message TEXT,
+      error_type TEXT,
+      stack_trace TEXT,
+      created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+COLUMNS = (
+    "id, session_id, file, line_number, code, timestamp, variables, variables_delta, stack_depth, thread_id, "
+    "observations, status, error_message, error_type, stack_trace"
+)
+
+
+def _legacy_db(db_path):
+    rows = []
+    for n in range(12):
+        session = "a" if n % 3 else "b"
+        status = ("success", "error", "warning")[n % 3]
+        rows.append((
+            session,
+            f"/src/mod{n % 2}.py",
+            n + 1,
+            f"x = {n}",
+            f"2026-01-01T00:00:{n:02d}.{n * 1111:06d}+00:00",
+            json.dumps({"Locals": {"x": n}}),
+            json.dumps({"Locals": {"x": n}}) if n else None,
+            n % 4,
+            1,
+            "note" if n == 5 else None,
+            status,
+            "boom" if status == "error" else None,
+            "ValueError" if status == "error" else None,
+            "Traceback..." if status == "error" else None,
+        ))
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(LEGACY_LINE_REPORTS)
+        conn.executemany(
+            "INSERT INTO line_reports(session_id, file, line_number, code, timestamp, variables, variables_delta, "
+            "stack_depth, thread_id, observations, status, error_message, error_type, stack_trace) "
+            "VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+            rows,
+        )
+        # Leave a gap in the ids, as deletes do
+        conn.execute("DELETE FROM line_reports WHERE id = 4")
+
+
+def _rows(conn):
+    return conn.execute(f"SELECT {COLUMNS} FROM line_reports ORDER BY id").fetchall()
+
+
+def test_normalize_moves_rows_unchanged(db_path):
+    _legacy_db(db_path)
+    store = LineReportStore(db_path)
+    store.open()
+    try:
+        assert not store.normalized
+        before = _rows(store.conn)
+        assert store.normalize_line_reports() == len(before) == 11
+        assert store.normalized
+        assert store.conn.execute("SELECT type FROM sqlite_master WHERE name='line_reports'").fetchone() == ("view",)
+        assert _rows(store.conn) == before
+        assert store.normalize_line_reports() == 0
+    finally:
+        store.close()
+
+    # Reopening keeps the normalized layout
+    store = LineReportStore(db_path)
+    store.open()
+    try:
+        assert store.normalized
+        assert _rows(store.conn) == before
+    finally:
+        store.close()
+
+
+def test_update_insert_and_delete_through_the_view(db_path):
+    _legacy_db(db_path)
+    store = LineReportStore(db_path)
+    store.open()
+    try:
+        store.normalize_line_reports()
+        conn = store.conn
+        conn.execute("UPDATE line_reports SET observations = 'checked', status = 'error' WHERE id = 2")
+        assert conn.execute("SELECT observations, status FROM line_reports WHERE id = 2").fetchone() == ("checked", "error")
+
+        conn.execute("DELETE FROM line_reports WHERE session_id = 'b'")
+        assert {r[0] for r in conn.execute("SELECT session_id FROM line_reports")} == {"a"}
+        assert conn.execute(
+            "SELECT COUNT(*) FROM step_payloads WHERE step_id NOT IN (SELECT id FROM steps)"
+        ).fetchone() == (0,)
+
+        conn.execute(
+            "INSERT INTO line_reports(session_id, file, line_number, code, timestamp, variables, status) "
+            "VALUES ('c', '/src/new.py', 7, 'y = 1', '2026-01-02T00:00:00.000000+00:00', '{}', 'warning')"
+        )
+        row = conn.execute(
+            "SELECT session_id, file, line_number, code, timestamp, status FROM line_reports WHERE session_id = 'c'"
+        ).fetchone()
+        assert row == ("c", "/src/new.py", 7, "y = 1", "2026-01-02T00:00:00.000000+00:00", "warning")
+        conn.commit()
+    finally:
+        store.close()
@@ -0,0 +1,184 @@
+import os
+import sys
+
+import pytest
+
+runner = pytest.importorskip("autodebugger.runner")
+
+
+@pytest.fixture
+def project(tmp_path):
+    for rel in (
+        "main.py", "pkg/a.py", "pkg/sub/b.py", "pkg/sub/notes.txt", "pkg/.hidden.py", "build/z.py",
+        "venv/lib/v.py", ".venv/lib/h.py", "node_modules/m/n.py", ".git/hooks/g.py", "pkg/__pycache__/a.py",
+    ):
+        path = tmp_path / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("x = 1\n")
+    return tmp_path
+
+
+def _targets(project, patterns, monkeypatch):
+    walked = []
+    real_walk = os.walk
+
+    def walk(top, *args, **kwargs):
+        for entry in real_walk(top, *args, **kwargs):
+            walked.append(entry[0])
+            yield entry
+
+    monkeypatch.setattr(runner.os, "walk", walk)
+    debugger = runner.AutoDebugger.__new__(runner.AutoDebugger)
+    files = debugger._breakpoint_targets(str(project / "main.py"), patterns)
+    return sorted(os.path.relpath(f, project) for f in files), [os.path.relpath(d, project) for d in walked]
+
+
+def test_default_covers_only_the_script(project, monkeypatch):
+    files, walked = _targets(project, None, monkeypatch)
+    assert files == ["main.py"]
+    assert walked == []
+
+
+def test_glob_walk_prunes_skipped_directories(project, monkeypatch):
+    (project / "deps" / "lib").mkdir(parents=True)
+    (project / "deps" / "lib" / "l.py").write_text("x = 1\n")
+    (project / "deps" / "lib-1.0.dist-info").mkdir()
+    files, walked = _targets(project, ["**/*.py"], monkeypatch)
+    assert files == ["build/z.py", "main.py", "pkg/a.py", "pkg/sub/b.py"]
+    assert os.path.join("pkg", "sub") in walked
+    for skipped in ("venv", ".venv", "node_modules", ".git", "pkg/__pycache__", "deps/lib"):
+        assert not any(d == skipped or d.startswith(skipped + os.sep) for d in walked), skipped
+
+
+def test_glob_matches_are_capped_nearest_first(project, monkeypatch):
+    monkeypatch.setattr(runner, "MAX_BREAKPOINT_GLOB_FILES", 2)
+    debugger = runner.AutoDebugger.__new__(runner.AutoDebugger)
+    files = debugger._breakpoint_targets(str(project / "main.py"), ["**/*.py"])
+    assert [os.path.relpath(f, project) for f in files] == ["main.py", "build/z.py", "pkg/a.py"]
+
+
+def test_patterns_follow_glob_semantics(project, monkeypatch):
+    assert _targets(project, ["pkg/*.py"], monkeypatch)[0] == ["main.py", "pkg/a.py"]
+    assert _targets(project, ["pkg/**/*.py"], monkeypatch)[0] == ["main.py", "pkg/a.py", "pkg/sub/b.py"]
+    assert _targets(project, ["**/sub/*.py"], monkeypatch)[0] == ["main.py", "pkg/sub/b.py"]
+    assert _targets(project, ["build/z.py"], monkeypatch)[0] == ["build/z.py", "main.py"]
+    assert _targets(project, [str(project / "pkg" / "sub" / "*.py")], monkeypatch)[0] == ["main.py", "pkg/sub/b.py"]
+
+
+def _frame(path, line):
+    return {"source": {"path": path}, "line": line}
+
+
+def test_breakpoints_stepping_steps_into_new_lines_once():
+    debugger = runner.AutoDebugger()
+    debugger._stepping = "breakpoints"
+    main, helper = [_frame("/p/main.py", 4)], [_frame("/p/helper.py", 3), _frame("/p/main.py", 4)]
+
+    # First time on the call line: stepIn, so the callee shows up on the stack
+    assert debugger._breakpoint_stop(main, "breakpoint") and debugger._auto_resume == "stepIn"
+    assert debugger._breakpoint_stop(helper, "step") and debugger._auto_resume == "stepIn"
+    # The caller stop right after that return is not recorded, and is left with continue
+    assert not debugger._breakpoint_stop(main, "step") and debugger._auto_resume == "continue"
+    # Lines seen before resume with continue
+    assert debugger._breakpoint_stop(main, "breakpoint") and debugger._auto_resume == "continue"
+    assert debugger._breakpoint_stop(helper, "breakpoint") and debugger._auto_resume == "continue"
+
+    debugger._stepping = "step"
+    assert debugger._breakpoint_stop(main, "step") and debugger._auto_resume == "stepIn"
+
+
+class _BatchClient:
+    def __init__(self, fail_path=None):
+        self.batches = []
+        self.fail_path = fail_path
+
+    def request_batch(self, requests, wait=10.0):
+        self.batches.append([args["source"]["path"] for _command, args in requests])
+        return [
+            runner.DapMessage(type="response", seq=0, body={}, success=args["source"]["path"] != self.fail_path)
+            for _command, args in requests
+        ]
+
+
+def test_set_breakpoints_batches_and_raises_on_rejection(monkeypatch):
+    monkeypatch.setattr(runner, "BREAKPOINT_BATCH_SIZE", 2)
+    requests = [("setBreakpoints", {"source": {"path": f"/p/{n}.py"}, "breakpoints": []}) for n in range(5)]
+    debugger = runner.AutoDebugger.__new__(runner.AutoDebugger)
+    client = _BatchClient()
+    debugger._set_breakpoints(client, requests)
+    assert [len(batch) for batch in client.batches] == [2, 2, 1]
+
+    with pytest.raises(RuntimeError, match="/p/3.py"):
+        debugger._set_breakpoints(_BatchClient(fail_path="/p/3.py"), requests)
+
+
+@pytest.mark.skipif(sys.version_info >= (3, 12), reason="sys.monitoring is available")
+def test_engine_startup_failure_raises_and_leaves_no_session(tmp_path):
+    script = tmp_path / "script.py"
+    script.write_text("x = 1\n")
+    db_path = str(tmp_path / "reports.db")
+    debugger = runner.AutoDebugger(db_path=db_path)
+    with pytest.raises(RuntimeError, match="monitor engine failed to start"):
+        debugger.run(str(script), engine="monitor")
+    debugger.db.open()
+    try:
+        assert debugger.db.conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] == 0
+    finally:
+        debugger.db.close()
+
+
+def _var(name, value, ref, type_="list"):
+    return {"name": name, "value": value, "type": type_, "variablesReference": ref}
+
+
+def _changed_mode_debugger():
+    debugger = runner.AutoDebugger()
+    debugger._capture_mode = "changed"
+    return debugger
+
+
+def test_full_capture_mode_fetches_every_reference():
+    debugger = runner.AutoDebugger()
+    frame = {"id": 1, "source": {"path": "/p/main.py"}, "name": "<module>"}
+    scope_vars = [("Locals", [_var("xs", "[1, 2]", 5), _var("n", "3", 0, "int")])]
+    debugger._remember_capture(frame, [frame], scope_vars, {5: [1, 2]})
+    assert debugger._plan_capture(frame, scope_vars) == ([5], {})
+
+
+def test_changed_capture_mode_reuses_values_with_unchanged_preview_and_type():
+    debugger = _changed_mode_debugger()
+    frame = {"id": 1, "source": {"path": "/p/main.py"}, "name": "<module>"}
+    first = [("Locals", [_var("xs", "[1, 2]", 5), _var("d", "{'a': 1}", 6, "dict"), _var("n", "3", 0, "int")])]
+    assert debugger._plan_capture(frame, first) == ([5, 6], {})
+    debugger._remember_capture(frame, [frame], first, {5: [1, 2], 6: {"a": 1}})
+
+    # debugpy hands out new references at every stop; reuse follows the name
+    second = [("Locals", [_var("xs", "[1, 2]", 15), _var("d", "{'a': 2}", 16, "dict")])]
+    assert debugger._plan_capture(frame, second) == ([16], {15: [1, 2]})
+    retyped = [("Locals", [_var("xs", "[1, 2]", 25, "tuple")])]
+    assert debugger._plan_capture(frame, retyped) == ([25], {})
+
+
+def test_changed_capture_mode_always_refetches_default_reprs():
+    debugger = _changed_mode_debugger()
+    frame = {"id": 1, "source": {"path": "/p/main.py"}, "name": "<module>"}
+    opaque = [("Locals", [_var("obj", "<Thing object at 0x7f00deadbeef>", 5, "Thing")])]
+    debugger._remember_capture(frame, [frame], opaque, {5: {"x": 1}})
+    # Same preview, but the attributes behind it may have changed
+    assert debugger._plan_capture(frame, opaque) == ([5], {})
+
+
+def test_changed_capture_mode_keeps_frames_apart():
+    debugger = _changed_mode_debugger()
+    outer = {"id": 1, "source": {"path": "/p/main.py"}, "name": "fact"}
+    inner = {"id": 2, "source": {"path": "/p/main.py"}, "name": "fact"}
+    scope_vars = [("Locals", [_var("xs", "[1]", 5)])]
+    debugger._remember_capture(outer, [outer], scope_vars, {5: [1]})
+
+    # A recursive call has the same code and names, but is a different frame
+    assert debugger._plan_capture(inner, scope_vars) == ([5], {})
+    debugger._remember_capture(inner, [inner, outer], scope_vars, {5: [1]})
+    assert debugger._plan_capture(outer, scope_vars) == ([], {5: [1]})
+    # Once the inner frame returns, its captures are dropped
+    debugger._remember_capture(outer, [outer], scope_vars, {5: [1]})
+    assert debugger._plan_capture(inner, scope_vars) == ([5], {})
@@ -0,0 +1,84 @@
+import os
+import sqlite3
+
+from autodebugger.common import session_db_path
+from autodebugger.db import LineReportStore
+
+from conftest import make_report, start_session
+
+
+def _catalog_counts(db_path, session_id):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(
+            "SELECT total_lines_executed, successful_lines, lines_with_errors, total_crashes "
+            "FROM session_summaries WHERE session_id=?",
+            (session_id,),
+        ).fetchone()
+
+
+def test_sharded_session_rows_live_in_their_own_file(store, db_path):
+    store.shard_sessions = True
+    start_session(store, "s1")
+    store.shard_sessions = False
+    start_session(store, "plain")
+    for i in range(3):
+        store.add_line_report(make_report("s1", i + 1, {"Locals": {"i": i}}))
+    store.add_line_report(make_report("plain", 1, {"Locals": {"x": 1}}))
+    store.end_session("s1", "2026-01-01T00:01:00Z")
+    store.end_session("plain", "2026-01-01T00:01:00Z")
+
+    shard_path = session_db_path(db_path, "s1")
+    assert shard_path == os.path.join(os.path.dirname(db_path), "sessions", "s1.db")
+    assert session_db_path(db_path, "plain") == db_path
+    with sqlite3.connect(shard_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM line_reports").fetchone() == (3,)
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT session_id FROM line_reports").fetchall() == [("plain",)]
+    assert [r["variables"] for r in store.iter_session_reports("s1", ["variables"])] == [
+        {"Locals": {"i": i}} for i in range(3)
+    ]
+
+
+def test_catalog_counters_after_end_session(store, db_path):
+    store.shard_sessions = True
+    start_session(store, "s1")
+    store.start_write_behind()
+    store.add_line_report(make_report("s1", 1, {"Locals": {}}))
+    store.add_line_report(make_report("s1", 2, {"Locals": {}}, status="error", error_message="boom"))
+    store.end_session("s1", "2026-01-01T00:01:00Z")
+    assert _catalog_counts(db_path, "s1") == (2, 1, 1, 1)
+
+    # Rows stored after end_session reach the catalog when the store closes
+    store.add_line_report(make_report("s1", 3, {"Locals": {}}))
+    store.close()
+    assert _catalog_counts(db_path, "s1") == (3, 2, 1, 1)
+
+
+def test_catalog_counters_when_shards_are_evicted(db_path, monkeypatch):
+    monkeypatch.setattr("autodebugger.db.MAX_OPEN_SHARDS", 1)
+    store = LineReportStore(db_path)
+    store.open()
+    store.shard_sessions = True
+    try:
+        for sid in ("a", "b"):
+            start_session(store, sid)
+            store.add_line_report(make_report(sid, 1, {"Locals": {}}))
+        # Opening b's file closed a's; a's row was counted on the way out
+        assert _catalog_counts(db_path, "a") == (1, 1, 0, 0)
+    finally:
+        store.close()
+    assert _catalog_counts(db_path, "b") == (1, 1, 0, 0)
+
+
+def test_deleting_a_sharded_session_removes_its_file(store, db_path):
+    store.shard_sessions = True
+    start_session(store, "s1")
+    store.add_line_report(make_report("s1", 1, {"Locals": {}}))
+    store.end_session("s1", "2026-01-01T00:01:00Z")
+    shard_path = session_db_path(db_path, "s1")
+    assert os.path.exists(shard_path)
+
+    store.delete_session("s1")
+    assert not os.path.exists(shard_path)
+    assert not os.path.exists(shard_path + "-wal")
+    assert _catalog_counts(db_path, "s1") is None
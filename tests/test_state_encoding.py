@@ -0,0 +1,47 @@
+import importlib.util
+import sqlite3
+
+import pytest
+
+from autodebugger.common import CODEC_JSON, CODEC_ZLIB, CODEC_ZSTD, decode_scopes, encode_scopes, value_codec_id
+
+from conftest import keyframe_states, record_states, start_session
+
+HAVE_ZSTD = importlib.util.find_spec("zstandard") is not None
+CODECS = [
+    CODEC_JSON,
+    CODEC_ZLIB,
+    pytest.param(CODEC_ZSTD, marks=pytest.mark.skipif(not HAVE_ZSTD, reason="zstandard not installed")),
+]
+SCOPES = {"Locals": {"n": 3, "s": "héllo", "xs": [1, 2.5, None, True], "d": {"k": {"deep": "v"}}}, "Globals": {}}
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_codec_round_trip(codec):
+    raw = encode_scopes(SCOPES, codec)
+    assert isinstance(raw, str if codec == CODEC_JSON else bytes)
+    assert decode_scopes(raw, codec) == SCOPES
+    assert decode_scopes(None, codec) == {}
+
+
+def test_zstd_falls_back_to_zlib_without_zstandard():
+    assert value_codec_id("zstd") == (CODEC_ZSTD if HAVE_ZSTD else CODEC_ZLIB)
+
+
+def test_recode_preserves_decoded_variables(store, db_path):
+    store.keyframe_interval = 3
+    store.intern_values = True
+    start_session(store, "s1")
+    states = keyframe_states() + [{"Locals": {"big": "x" * 200, "i": 7}}]
+    record_states(store, "s1", states)
+    before = list(store.iter_session_reports("s1", ["id", "variables", "variables_delta"]))
+
+    assert store.recode_line_reports(CODEC_ZLIB) == len(states)
+    with sqlite3.connect(db_path) as conn:
+        assert {r[0] for r in conn.execute("SELECT variables_codec FROM line_reports")} == {CODEC_ZLIB}
+    assert list(store.iter_session_reports("s1", ["id", "variables", "variables_delta"])) == before
+    # Already in the target encoding: nothing to rewrite
+    assert store.recode_line_reports(CODEC_ZLIB) == 0
+
+    assert store.recode_line_reports(CODEC_JSON) == len(states)
+    assert list(store.iter_session_reports("s1", ["id", "variables", "variables_delta"])) == before
@@ -0,0 +1,48 @@
+import sys
+
+import pytest
+
+from autodebugger import tracer
+
+from conftest import start_session
+
+
+@pytest.fixture
+def traced(store, db_path, tmp_path):
+    """Runs tracer.main on a script; returns (exit code, startup error text, rows recorded)."""
+    start_session(store, "s1")
+    store.close()
+    error_file = tmp_path / "startup_error.txt"
+    error_file.write_text("")
+    saved_argv, saved_path = sys.argv[:], sys.path[:]
+
+    def run(engine, source):
+        script = tmp_path / "script.py"
+        script.write_text(source)
+        try:
+            code = tracer.main([
+                "--engine", engine, "--db", db_path, "--session-id", "s1",
+                "--startup-error-file", str(error_file), str(script),
+            ])
+        finally:
+            sys.argv[:], sys.path[:] = saved_argv, saved_path
+        store.open()
+        rows = store.conn.execute("SELECT COUNT(*) FROM line_reports").fetchone()[0]
+        return code, error_file.read_text(), rows
+
+    return run
+
+
+def test_script_exit_code_2_is_not_a_startup_failure(traced):
+    code, startup_error, rows = traced("settrace", "import sys\nx = 1\nsys.exit(2)\n")
+    assert code == 2
+    assert startup_error == ""
+    assert rows > 0
+
+
+@pytest.mark.skipif(sys.version_info >= (3, 12), reason="sys.monitoring is available")
+def test_unavailable_engine_reports_through_the_startup_error_file(traced):
+    code, startup_error, rows = traced("monitor", "x = 1\n")
+    assert code == 2
+    assert "sys.monitoring" in startup_error
+    assert rows == 0
@@ -0,0 +1,111 @@
+import sqlite3
+import time
+
+import pytest
+
+from autodebugger import db as db_module
+from autodebugger.db import LineReportStore, LoopSummary
+
+from conftest import make_report, start_session
+
+
+@pytest.fixture
+def slow_writer(store, monkeypatch):
+    """One row per writer transaction, each slow, so rows are still queued when the test moves on."""
+    monkeypatch.setattr(db_module, "WRITE_BATCH_SIZE", 1)
+    insert = store._insert_line_reports
+
+    def slow_insert(cur, reports):
+        time.sleep(0.01)
+        return insert(cur, reports)
+
+    monkeypatch.setattr(store, "_insert_line_reports", slow_insert)
+    return store
+
+
+def _rows(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT session_id, line_number FROM line_reports ORDER BY id").fetchall()
+
+
+def test_rows_are_committed_in_the_order_they_were_queued(store, db_path, monkeypatch):
+    monkeypatch.setattr(db_module, "WRITE_BATCH_SIZE", 3)
+    start_session(store, "s1")
+    store.start_write_behind(max_pending=4)
+    for n in range(1, 21):
+        store.add_line_report(make_report("s1", n, {"Locals": {"n": n}}))
+    store.add_loop_summary(LoopSummary("s1", "/tmp/script.py", 2, first_iteration=3, iterations=5))
+    assert store.add_line_reports([make_report("s1", n, {"Locals": {"n": n}}) for n in range(21, 31)]) == 10
+    store.flush()
+
+    assert _rows(db_path) == [("s1", n) for n in range(1, 31)]
+    assert [s["last_iteration"] for s in store.get_loop_summaries("s1")] == [7]
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT total_lines_executed FROM session_summaries").fetchone() == (30,)
+
+
+def test_end_session_waits_for_queued_rows(slow_writer, db_path):
+    start_session(slow_writer, "s1")
+    slow_writer.start_write_behind()
+    for n in range(1, 11):
+        slow_writer.add_line_report(make_report("s1", n, {}))
+    slow_writer.end_session("s1", "2026-01-01T00:01:00Z")
+
+    assert _rows(db_path) == [("s1", n) for n in range(1, 11)]
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT end_time, total_lines_executed FROM session_summaries").fetchone() == (
+            "2026-01-01T00:01:00Z", 10,
+        )
+
+
+def test_close_commits_queued_rows_and_stops_the_writer(slow_writer, db_path):
+    start_session(slow_writer, "s1")
+    slow_writer.start_write_behind()
+    for n in range(1, 11):
+        slow_writer.add_line_report(make_report("s1", n, {}))
+    writer = slow_writer._writer
+    slow_writer.close()
+
+    assert not writer.is_alive()
+    assert _rows(db_path) == [("s1", n) for n in range(1, 11)]
+
+
+def test_writer_errors_surface_on_flush(store, db_path, monkeypatch):
+    start_session(store, "s1")
+    insert = store._insert_line_reports
+    calls = []
+
+    def failing_once(cur, reports):
+        calls.append(len(reports))
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("disk I/O error")
+        return insert(cur, reports)
+
+    monkeypatch.setattr(store, "_insert_line_reports", failing_once)
+    store.start_write_behind()
+    store.add_line_report(make_report("s1", 1, {}))
+    with pytest.raises(sqlite3.OperationalError, match="disk I/O error"):
+        store.flush()
+
+    # The writer keeps going after a failed batch
+    store.add_line_report(make_report("s1", 2, {}))
+    store.flush()
+    assert _rows(db_path) == [("s1", 2)]
+
+
+def test_rows_queued_in_one_store_are_readable_from_another(db_path):
+    writer_store = LineReportStore(db_path)
+    writer_store.open()
+    start_session(writer_store, "s1")
+    writer_store.start_write_behind()
+    writer_store.add_line_reports([make_report("s1", n, {"Locals": {"n": n}}) for n in range(1, 4)])
+    writer_store.close()
+
+    reader = LineReportStore(db_path)
+    reader.open()
+    try:
+        assert [r["variables"] for r in reader.iter_session_reports("s1", ["variables"])] == [
+            {"Locals": {"n": n}} for n in range(1, 4)
+        ]
+    finally:
+        reader.close()